@@ -15,6 +15,7 @@ class AppConfig:
         # Default values
         self.data_source         = "DefaultSource"
         self.show_message_boxes  = True
+        self.show_subtree_stats  = False
         self.webservice_url      = "http://127.0.0.1:3000/api/"
         self.datasource_option   = "Files"
         self.window_x            = 100
@@ -31,7 +32,7 @@ class AppConfig:
             try:
                 with open(self.path, "r", encoding="utf-8") as f:
                     data = json.load(f)
-                for key in ("data_source", "show_message_boxes", "webservice_url",
+                for key in ("data_source", "show_message_boxes", "show_subtree_stats", "webservice_url",
                             "datasource_option", "window_x", "window_y", "window_width", "window_height"):
                     if key in data:
                         setattr(self, key, data[key])
@@ -47,6 +48,7 @@ class AppConfig:
         data = {
             "data_source":        self.data_source,
             "show_message_boxes": self.show_message_boxes,
+            "show_subtree_stats": self.show_subtree_stats,
             "webservice_url":     self.webservice_url,
             "datasource_option":  self.datasource_option,
             "window_x":           self.window_x,
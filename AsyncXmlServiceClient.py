@@ -0,0 +1,149 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from RequestPolicy import RequestPolicy
+
+class AsyncXmlServiceClient:
+    """
+    asyncio client for the XML web service endpoints used by
+    WebServiceManagementStore and XmlSelectBoxDialog.
+    Requests go through open_request() (urllib), the transport of the
+    store's blocking calls and the preview prefetcher too, run in the loop's
+    default executor; the client limits the number of requests in flight and
+    gives every request a deadline. Retries, per-endpoint deadlines and hedged
+    reads come from a RequestPolicy (shared with the store's blocking calls).
+    """
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, webservice_url: str, max_concurrency: int = 4, timeout: float = 30.0,
+                 policy: RequestPolicy = None):
+        self.webservice_url = webservice_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.policy = policy if policy is not None else RequestPolicy()
+        self._semaphore = None
+
+    # -------------------------------------------------
+    # Endpoints
+    # -------------------------------------------------
+    async def get_all_xml_info(self, timeout: float = None) -> list:
+        body = await self._call("get_all_xml_info", "GET", "/get_all_xml_info", timeout=timeout)
+        return json.loads(body.decode('utf-8'))
+
+    async def get_xml_by_id(self, xml_id, timeout: float = None) -> str:
+        body = await self._call("get_xml_by_id", "GET", f"/get_xml_by_id/{xml_id}", timeout=timeout)
+        return body.decode('utf-8')
+
+    async def update_xml_by_id(self, xml_id, xml_data: str, timeout: float = None):
+        """Repeated after a failure only if the stored document is not already xml_data."""
+        payload = {"id": int(xml_id), "xmlData": xml_data}
+
+        async def reconcile():
+            return await self.get_xml_by_id(xml_id) == xml_data, None
+
+        await self._call("update_xml_by_id", "PUT", "/update_xml_by_id", payload, timeout, reconcile)
+
+    async def update_xml_name_by_id(self, xml_id, name: str, timeout: float = None):
+        payload = {"id": int(xml_id), "name": name}
+
+        async def reconcile():
+            entries = await self.get_all_xml_info()
+            return any(e["id"] == int(xml_id) and e["name"] == name for e in entries), None
+
+        await self._call("update_xml_name_by_id", "PUT", "/update_xml_name_by_id", payload, timeout, reconcile)
+
+    async def create_new_xml(self, name: str, xml_data: str, timeout: float = None):
+        """
+        Returns the ID of the new entry. The IDs are listed first, so after a
+        failure a new entry with this name counts as created and is not duplicated.
+        """
+        payload = {"name": name, "xmlData": xml_data}
+        reconcile = None
+        if self.policy.endpoints["create_new_xml"].retries:
+            try:
+                before = {entry["id"] for entry in await self.get_all_xml_info()}
+            except Exception:
+                before = None  # a failed create is then reported, not repeated
+
+            async def reconcile():
+                if before is None:
+                    raise LookupError("entries before the request are unknown")
+                return created_entry(await self.get_all_xml_info(), before, name)
+
+        body = await self._call("create_new_xml", "POST", "/create_new_xml", payload, timeout, reconcile)
+        result = json.loads(body.decode('utf-8'))
+        return result.get("id") or result.get("nextId")
+
+    async def delete_xml_by_id(self, xml_id, timeout: float = None):
+        attempts = 0
+
+        async def attempt(limit):
+            nonlocal attempts
+            attempts += 1
+            try:
+                await self._request("DELETE", f"/delete_xml_by_id/{xml_id}", timeout=limit)
+            except urllib.error.HTTPError as e:
+                if e.code != 404 or attempts == 1:
+                    raise  # 404 on a repeated request: an earlier attempt deleted it
+
+        await self.policy.call_async("delete_xml_by_id", attempt, timeout=timeout)
+
+    # -------------------------------------------------
+    # Internal: requests in the executor
+    # -------------------------------------------------
+    async def _call(self, endpoint: str, method: str, path: str, payload=None, timeout: float = None,
+                    reconcile=None) -> bytes:
+        """_request() under the policy of endpoint (timeout overrides its per-attempt timeout)."""
+        return await self.policy.call_async(
+            endpoint, lambda limit: self._request(method, path, payload, limit), reconcile, timeout)
+
+    async def _request(self, method: str, path: str, payload=None, timeout: float = None) -> bytes:
+        """
+        One request, bounded by the concurrency limit; the deadline includes
+        queueing. A cancelled request's thread ends at the latest after timeout.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+
+        async def limited():
+            async with self._semaphore:
+                return await loop.run_in_executor(None, read_request, self.webservice_url + path,
+                                                  method, payload, timeout)
+
+        return await asyncio.wait_for(limited(), timeout)
+
+
+def open_request(url: str, method: str = "GET", payload=None, timeout: float = None):
+    """
+    Sends one request to the web service (payload as JSON) and returns the
+    open urllib response. HTTP errors raise urllib.error.HTTPError, a failed
+    connection urllib.error.URLError.
+    """
+    data, headers = None, {}
+    if payload is not None:
+        data = json.dumps(payload).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    return urllib.request.urlopen(req, timeout=timeout)
+
+
+def read_request(url: str, method: str = "GET", payload=None, timeout: float = None) -> bytes:
+    """open_request() and the whole response body."""
+    with open_request(url, method, payload, timeout) as resp:
+        return resp.read()
+
+
+def created_entry(entries: list, before: set, name: str) -> tuple:
+    """
+    reconcile() result of a failed create: (True, id) if entries holds exactly
+    one new entry called name, (False, None) if there is none.
+    """
+    new = [entry["id"] for entry in entries if entry["id"] not in before and entry["name"] == name]
+    if len(new) > 1:
+        raise LookupError(f"{len(new)} new entries named {name!r}")
+    return bool(new), (new[0] if new else None)
@@ -0,0 +1,326 @@
+import re
+from LabelInterner import LabelInterner
+from TreeModel import TreeModel
+from TreeExpander import TreeExpander
+
+class BulkOperations:
+    """
+    Delete, rename and move for a whole selection of a Treeview mirrored by
+    a TreeModel. Selections are normalized first: a node inside another
+    selected subtree is dropped, it goes with its ancestor anyway. The
+    model is edited in bulk (remove_many/move_many), the Treeview in
+    batches of BATCH items (one detach per batch), and the work runs in
+    time slices on the document's TreeExpander, so its progress display
+    and Cancel apply and a selection of 50k nodes does not freeze the window.
+
+    Every operation, a cancelled one too, is one step on the undo stack.
+    undo() reverts the last step as long as nothing else has edited the
+    tree since it started (TreeModel.edits; opening a lazy clone is not an
+    edit).
+    Deleted items are only detached from the Treeview until their undo
+    step is dropped.
+    """
+
+    BATCH = 1000        # nodes per model/widget batch
+    UNDO_LIMIT = 20     # steps kept
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, treeview, model: TreeModel, labels: LabelInterner, expander: TreeExpander,
+                 expand_clone=None):
+        self.treeview = treeview
+        self.model = model
+        self.labels = labels
+        self.expander = expander
+        self.expand_clone = expand_clone  # callable(iid) inserting a lazy clone's children
+        self.on_changed = None    # callable(iids) with the parents whose subtrees changed
+        self._undo = []           # (kind, data, model.edits after the step)
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo) and self._undo[-1][2] == self.model.edits
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def normalize(self, iids) -> list:
+        """iids (in their order) without unknown ids, duplicates and nodes inside another one's subtree."""
+        nodes, root = self.model.nodes, self.model.root
+        chosen = set(iid for iid in iids if iid in nodes)
+        result = []
+        for iid in dict.fromkeys(iids):
+            if iid not in chosen:
+                continue
+            node = nodes[iid].parent
+            while node is not root and node.iid not in chosen:
+                node = node.parent
+            if node is root:
+                result.append(iid)
+        return result
+
+    def delete(self, iids) -> int:
+        """Deletes the selected subtrees; returns how many."""
+        roots = self.normalize(iids)
+        if roots:
+            self.expander.start(self._iter_delete(roots), len(roots))
+        return len(roots)
+
+    def move(self, iids, parent_iid: str, before_iid: str = None) -> int:
+        """
+        Moves the selected subtrees, in their order, below parent_iid in front
+        of its child before_iid (None = at the end); returns how many.
+        Raises ValueError if parent_iid is inside one of them.
+        """
+        roots = self.normalize(iids)
+        moved = set(roots)
+        if parent_iid and any(iid in moved for iid in self.model.path(parent_iid)):
+            raise ValueError("Nodes cannot be moved into their own subtree.")
+        if before_iid in moved:
+            # in front of the first sibling after it that stays in place
+            siblings = self.model.nodes[before_iid].parent.children
+            k = siblings.index(self.model.nodes[before_iid])
+            before_iid = next((n.iid for n in siblings[k:] if n.iid not in moved), None)
+        if roots:
+            if self.expand_clone:
+                self.expand_clone(parent_iid)
+            self.expander.start(self._iter_move(roots, parent_iid, before_iid), len(roots))
+        return len(roots)
+
+    def rename(self, iids, pattern: str, template: str) -> int:
+        """
+        Renames every selected node (see renamer()); nested selections are
+        not dropped here. Returns the number of nodes. Raises ValueError for
+        an invalid pattern or template before anything is changed.
+        """
+        rename = renamer(pattern, template)
+        targets = [iid for iid in dict.fromkeys(iids) if iid in self.model]
+        if targets:
+            self.expander.start(self._iter_rename(targets, rename), len(targets))
+        return len(targets)
+
+    def undo(self) -> bool:
+        """Reverts the last step; False if there is none or the tree was edited since."""
+        self.expander.cancel()   # a running step is recorded first
+        if not self.can_undo:
+            self.clear_undo()
+            return False
+        kind, data, _ = self._undo.pop()
+        if kind == "delete":
+            self.expander.start(self._iter_undelete(data), sum(len(positions) for positions, _ in data))
+        elif kind == "move":
+            self.expander.start(self._iter_unmove(data), sum(len(positions) for positions in data))
+        else:
+            self.expander.start(self._iter_unrename(data), len(data))
+        return True
+
+    def clear_undo(self):
+        """Drops all undo steps and deletes the items they kept detached."""
+        while self._undo:
+            self._drop(self._undo.pop(0))
+
+    # -------------------------------------------------
+    # Work generators: one yield per node
+    # -------------------------------------------------
+    def _iter_delete(self, roots: list):
+        tv, model = self.treeview, self.model
+        edits = model.edits
+        tv.selection_set(())
+        removed = []   # model.remove_many() results, one per batch
+        parents = set()
+        try:
+            for start in range(0, len(roots), self.BATCH):
+                # nodes deleted since the step started are skipped
+                batch = [iid for iid in roots[start:start + self.BATCH] if iid in model.nodes]
+                if batch:
+                    parents.update(model.nodes[iid].parent.iid for iid in batch)
+                    removed.append(model.remove_many(batch))
+                    tv.detach(*batch)
+                for _ in batch:
+                    yield
+        finally:
+            self._push("delete", removed, edits, len(removed))
+            self._changed(parents)
+
+    def _iter_move(self, roots: list, parent_iid: str, before_iid: str):
+        tv, model = self.treeview, self.model
+        edits = model.edits
+        moves = []     # model.move_many() results, one per batch
+        parents = {parent_iid}
+        try:
+            for start in range(0, len(roots), self.BATCH):
+                if parent_iid not in model.nodes:
+                    break
+                before = model.nodes.get(before_iid)
+                if before is None or before.parent.iid != parent_iid:
+                    before_iid = None   # gone or moved away: append at the end
+                batch = [iid for iid in roots[start:start + self.BATCH] if iid in model.nodes]
+                if not batch:
+                    continue
+                parents.update(model.nodes[iid].parent.iid for iid in batch)
+                moves.append(model.move_many(batch, parent_iid, before_iid))
+                index = model.index(batch[0])
+                tv.detach(*batch)
+                yield from self._reattach([(iid, parent_iid, index + k) for k, iid in enumerate(batch)])
+        finally:
+            self._push("move", moves, edits, len(moves))
+            self._changed(parents)
+            tv.selection_set([node.iid for positions in moves for node, _, _ in positions])
+
+    def _iter_rename(self, targets: list, rename):
+        tv, model, intern = self.treeview, self.model, self.labels.intern
+        edits = model.edits
+        renamed = []   # (iid, old text)
+        try:
+            for n, iid in enumerate(targets, 1):
+                node = model.nodes.get(iid)
+                if node is not None:
+                    try:
+                        text = intern(rename(node.text, n))
+                    except Exception:
+                        text = node.text   # e.g. {text[5]} on a shorter label: left as it is
+                    if text != node.text:
+                        renamed.append((iid, node.text))
+                        tv.item(iid, text=text)
+                        model.rename(iid, text)
+                yield
+        finally:
+            self._push("rename", renamed, edits, len(renamed))
+
+    # Undo runs the batches of a step backwards; if it is cancelled,
+    # the batches not reverted yet stay on the stack as a smaller step
+
+    def _iter_undelete(self, removed: list):
+        tv, model = self.treeview, self.model
+        edits = model.edits
+        done, parents, restored = 0, set(), []
+        try:
+            # later batches were cut from the tree the earlier ones left
+            for positions, clones in reversed(removed):
+                model.restore((positions, clones))
+                done += 1
+                parents.update(parent_iid for _, parent_iid, _ in positions)
+                restored.extend(node.iid for node, _, _ in positions)
+                # ascending indices per parent: the earlier siblings are back before each reattach
+                yield from self._reattach([(node.iid, parent_iid, index) for node, parent_iid, index in positions])
+        finally:
+            self._undone("delete", removed[:len(removed) - done], edits, done)
+            self._changed(parents)
+            tv.selection_set(restored)
+
+    def _iter_unmove(self, moves: list):
+        tv, model = self.treeview, self.model
+        edits = model.edits
+        done, parents, moved = 0, set(), []
+        try:
+            for positions in reversed(moves):
+                parents.update(node.parent.iid for node, _, _ in positions)
+                model.move_back(positions)
+                done += 1
+                parents.update(parent_iid for _, parent_iid, _ in positions)
+                moved.extend(node.iid for node, _, _ in positions)
+                tv.detach(*[node.iid for node, _, _ in positions])
+                yield from self._reattach([(node.iid, parent_iid, index) for node, parent_iid, index in positions])
+        finally:
+            self._undone("move", moves[:len(moves) - done], edits, done)
+            self._changed(parents)
+            tv.selection_set(moved)
+
+    def _iter_unrename(self, renamed: list):
+        tv, model = self.treeview, self.model
+        edits = model.edits
+        done = 0
+        try:
+            for iid, text in reversed(renamed):
+                tv.item(iid, text=text)
+                model.rename(iid, text)
+                done += 1
+                yield
+        finally:
+            self._undone("rename", renamed[:len(renamed) - done], edits, done)
+
+    def _reattach(self, items: list):
+        """Reattaches (iid, parent_iid, index) items in order; if closed early, the rest is done at once."""
+        tv = self.treeview
+        done = 0
+        try:
+            for iid, parent_iid, index in items:
+                tv.reattach(iid, parent_iid, index)
+                done += 1
+                yield
+        finally:
+            # the model already has the whole batch in place
+            for iid, parent_iid, index in items[done:]:
+                tv.reattach(iid, parent_iid, index)
+
+    # -------------------------------------------------
+    # Undo stack
+    # -------------------------------------------------
+    def _push(self, kind: str, data: list, edits: int, own: int):
+        """
+        Records a finished (or cancelled) step that started at model.edits ==
+        edits and made own edits itself.
+        """
+        if not data:
+            return
+        if self.model.edits != edits + own:
+            # edited by something else between its batches: the positions are stale
+            self.clear_undo()
+            self._drop((kind, data, None))
+            return
+        if self._undo and self._undo[-1][2] != edits:
+            self.clear_undo()   # something else edited the tree in between
+        self._undo.append((kind, data, self.model.edits))
+        while len(self._undo) > self.UNDO_LIMIT:
+            self._drop(self._undo.pop(0))
+
+    def _undone(self, kind: str, rest: list, edits: int, own: int):
+        """
+        After an undo that started at model.edits == edits and made own edits:
+        the step below is current again, an unfinished rest goes back on top.
+        """
+        if self.model.edits != edits + own:
+            self.clear_undo()   # as in _push()
+            self._drop((kind, rest, None))
+            return
+        if self._undo:
+            previous_kind, previous, _ = self._undo[-1]
+            self._undo[-1] = (previous_kind, previous, self.model.edits)
+        if rest:
+            self._undo.append((kind, rest, self.model.edits))
+
+    def _drop(self, step: tuple):
+        kind, data, _ = step
+        if kind == "delete":
+            iids = [node.iid for positions, _ in data for node, _, _ in positions]
+            self.treeview.delete(*[iid for iid in iids if self.treeview.exists(iid)])
+
+    def _changed(self, parents):
+        if self.on_changed:
+            self.on_changed([iid for iid in set(parents) if iid in self.model])
+
+
+def renamer(pattern: str, template: str):
+    """
+    Returns rename(text, n) -> new text for the n-th selected node. With a
+    pattern (a regular expression) every match is replaced by template
+    (\\1 or \\g<name> insert groups); without one, template is the whole new
+    text, where {text} is the old text and {n} the number (e.g. "{n:03} {text}").
+    Raises ValueError if pattern or template cannot be used; a template
+    that only fails for some labels (e.g. {text[5]}) may still raise, and
+    BulkOperations.rename() leaves those labels unchanged.
+    """
+    if pattern:
+        try:
+            regex = re.compile(pattern)
+            regex.sub(template, "")   # parses the replacement, group references included
+        except (re.error, IndexError) as e:
+            raise ValueError(f"Invalid pattern or replacement: {e}") from None
+        return lambda text, n: regex.sub(template, text)
+    try:
+        template.format(text="", n=1)
+    except IndexError:
+        pass   # {text[5]}: depends on the label, such nodes keep theirs
+    except Exception as e:   # KeyError, AttributeError ({text.foo}), ValueError, ...
+        raise ValueError(f"Invalid template (use {{text}} and {{n}}): {e!r}") from None
+    return lambda text, n: template.format(text=text, n=n)
@@ -0,0 +1,412 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from difflib import SequenceMatcher
+from itertools import accumulate
+from operator import sub
+import xml.etree.ElementTree as ET
+from LabelInterner import LabelInterner
+
+# Binary snapshot file (see CompactTree.write_snapshot), all integers little-endian:
+#   header   magic, version, count width, label width, reserved,
+#            nodes, top, distinct labels, label bytes
+#   counts   unsigned int of count width (1, 2 or 4 bytes) per node: its children
+#   labels   unsigned int of label width per node: index into the string table
+#   offsets  uint64 per distinct label + 1, into the string data
+#   strings  the distinct labels, UTF-8, concatenated
+SNAPSHOT_MAGIC = b"MPTSNAP\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".tsnap"
+SNAPSHOT_HEADER = struct.Struct("<8sHBBIQQQQ")
+SNAPSHOT_TYPECODES = {1: "B", 2: "H", 4: "I"}
+
+class CompactTree:
+    """
+    Compact, picklable form of a whole tree: the labels and child counts of
+    all nodes in document (pre-)order plus the number of top-level nodes.
+    Built without touching any widget, so it can be produced on a worker
+    thread or process. iids optionally holds the Treeview item id of each
+    node when the tree mirrors what is currently shown.
+    """
+    __slots__ = ("labels", "counts", "top", "iids", "_aggregates")
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, labels: list = None, counts: array = None, top: int = 0, iids: list = None):
+        self.labels = labels if labels is not None else []
+        self.counts = counts if counts is not None else array("I")
+        self.top = top
+        self.iids = iids
+        self._aggregates = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def from_xml(cls, source, labels=None) -> "CompactTree":
+        """
+        Streams a <TreeView> document (file name or binary file object);
+        finished elements are dropped right away. labels is an optional
+        LabelInterner for the Text attributes.
+        """
+        tree = cls()
+        texts, counts = tree.labels, tree.counts
+        intern = labels.intern if labels is not None else (lambda t: t)
+        open_nodes = []   # preorder index of the open <Node> at each depth
+        for depth, text in iter_xml(source):
+            del open_nodes[depth:]
+            if depth:
+                counts[open_nodes[-1]] += 1
+            else:
+                tree.top += 1
+            open_nodes.append(len(texts))
+            texts.append(intern(text))
+            counts.append(0)
+        return tree
+
+    @classmethod
+    def from_model(cls, model, iids: list = None) -> "CompactTree":
+        """
+        Snapshot of a TreeModel (or of the subtrees iids), including the item
+        ids. Lazy clones are copied from their CompactTree; the nodes inside
+        them have no item id (None).
+        """
+        tree = cls(iids=[])
+        labels, counts, ids = tree.labels, tree.counts, tree.iids
+        if iids is None:
+            iids = [node.iid for node in model.root.children]
+        for iid in iids:
+            for node in model.walk(iid, include_self=True):
+                labels.append(node.text)
+                ids.append(node.iid)
+                clone = model.lazy.get(node.iid)
+                if clone is None:
+                    counts.append(len(node.children))
+                    continue
+                source, index = clone
+                end = index + source.aggregates()[0][index]
+                counts.append(source.counts[index])
+                labels.extend(source.labels[index + 1:end])
+                counts.extend(source.counts[index + 1:end])
+                ids.extend([None] * (end - index - 1))
+        tree.top = len(iids)
+        return tree
+
+    # -------------------------------------------------
+    # Navigation
+    # -------------------------------------------------
+    def sizes(self) -> array:
+        """Subtree size (node plus descendants) of every node, in one reverse pass."""
+        n = len(self.labels)
+        counts = self.counts
+        sizes = array("I", [1]) * n
+        for i in range(n - 1, -1, -1):
+            size = 1
+            j = i + 1
+            for _ in range(counts[i]):
+                size += sizes[j]
+                j += sizes[j]
+            sizes[i] = size
+        return sizes
+
+    def iter_nodes(self, index: int = -1, depth: int = -1):
+        """
+        Yields (depth, label) of the nodes below index (-1 = the whole tree)
+        in document order; depth is the depth of index itself.
+        """
+        labels, counts = self.labels, self.counts
+        if index < 0:
+            start, end, remaining = 0, len(labels), [self.top]
+        else:
+            start, end, remaining = index + 1, index + self.aggregates()[0][index], [counts[index]]
+        for k in range(start, end):
+            while not remaining[-1]:
+                remaining.pop()
+            remaining[-1] -= 1
+            yield depth + len(remaining), labels[k]
+            if counts[k]:
+                remaining.append(counts[k])
+
+    def aggregates(self) -> tuple:
+        """
+        (sizes, heights, leaves) per node, as TreeNode keeps them; computed
+        once, so the tree must not change structurally afterwards.
+        """
+        if self._aggregates is None:
+            n = len(self.labels)
+            counts = self.counts
+            sizes = array("I", [1]) * n
+            heights = array("I", [0]) * n
+            leaves = array("I", [1]) * n
+            for i in range(n - 1, -1, -1):
+                if not counts[i]:
+                    continue
+                size, height, leaf = 1, 0, 0
+                j = i + 1
+                for _ in range(counts[i]):
+                    size += sizes[j]
+                    leaf += leaves[j]
+                    if heights[j] >= height:
+                        height = heights[j] + 1
+                    j += sizes[j]
+                sizes[i], heights[i], leaves[i] = size, height, leaf
+            self._aggregates = sizes, heights, leaves
+        return self._aggregates
+
+    def child_indices(self, index: int, sizes: array) -> list:
+        """Preorder indices of the children of index (-1 = the top level)."""
+        if index < 0:
+            j, count = 0, self.top
+        else:
+            j, count = index + 1, self.counts[index]
+        result = []
+        for _ in range(count):
+            result.append(j)
+            j += sizes[j]
+        return result
+
+    # -------------------------------------------------
+    # Binary snapshot
+    # -------------------------------------------------
+    def write_snapshot(self, target):
+        """Writes the tree as a binary snapshot (file name or binary file object); labels are stored once each."""
+        table = {}
+        index = [table.setdefault(label, len(table)) for label in self.labels]
+        encoded = [label.encode("utf-8") for label in table]
+        offsets = array("Q", [0]) * (len(encoded) + 1)
+        position = 0
+        for k, data in enumerate(encoded):
+            position += len(data)
+            offsets[k + 1] = position
+        counts = _packed(self.counts, max(self.counts, default=0))
+        index = _packed(index, len(table) - 1)
+        if sys.byteorder == "big":
+            for values in (counts, index, offsets):
+                values.byteswap()
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as f:
+                self._write_snapshot(f, counts, index, offsets, encoded, position)
+        else:
+            self._write_snapshot(target, counts, index, offsets, encoded, position)
+
+    def _write_snapshot(self, f, counts: array, index: array, offsets: array, encoded: list, size: int):
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, counts.itemsize, index.itemsize, 0,
+                                     len(self.labels), self.top, len(encoded), size))
+        counts.tofile(f)
+        index.tofile(f)
+        offsets.tofile(f)
+        f.write(b"".join(encoded))
+
+    @classmethod
+    def from_snapshot(cls, filename: str, labels=None) -> "CompactTree":
+        """
+        Reads a binary snapshot: the arrays are copied from the mapped file
+        as they are, only the distinct labels are decoded. labels is an
+        optional LabelInterner. Raises ValueError for damaged or unknown files.
+        """
+        with open(filename, "rb") as f:
+            # an empty file cannot be mapped
+            if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+                raise ValueError(f"{filename}: not a tree snapshot")
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with buf:
+            magic, version, count_width, label_width, _, nodes, top, strings, size = SNAPSHOT_HEADER.unpack_from(buf)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{filename}: not a tree snapshot")
+            if version > SNAPSHOT_VERSION:
+                raise ValueError(f"{filename}: snapshot version {version} is newer than this program")
+            if count_width not in SNAPSHOT_TYPECODES or label_width not in SNAPSHOT_TYPECODES:
+                raise ValueError(f"{filename}: damaged tree snapshot")
+            pos = SNAPSHOT_HEADER.size
+            if len(buf) != pos + (count_width + label_width) * nodes + 8 * (strings + 1) + size:
+                raise ValueError(f"{filename}: truncated tree snapshot")
+            # views must be released before the mapping can be closed
+            with memoryview(buf) as view:
+                counts = array(SNAPSHOT_TYPECODES[count_width])
+                index = array(SNAPSHOT_TYPECODES[label_width])
+                offsets = array("Q")
+                counts.frombytes(view[pos:pos + count_width * nodes])
+                pos += count_width * nodes
+                index.frombytes(view[pos:pos + label_width * nodes])
+                pos += label_width * nodes
+                offsets.frombytes(view[pos:pos + 8 * (strings + 1)])
+                pos += 8 * (strings + 1)
+                if sys.byteorder == "big":
+                    for values in (counts, index, offsets):
+                        values.byteswap()
+                with view[pos:] as data:
+                    table = [str(data[offsets[k]:offsets[k + 1]], "utf-8") for k in range(strings)]
+        if sum(counts) + top != nodes or (nodes and max(index) >= strings) or not _preorder(counts, top):
+            raise ValueError(f"{filename}: damaged tree snapshot")
+        if labels is not None:
+            table = [labels.intern(label) for label in table]
+        if counts.typecode != "I":
+            counts = array("I", counts)
+        return cls(list(map(table.__getitem__, index)), counts, top)
+
+    # -------------------------------------------------
+    # Treeview
+    # -------------------------------------------------
+    def iter_insert(self, treeview, model, index: int = -1, parent_iid: str = "",
+                    intern=None, opened=(), batch: int = 0):
+        """
+        Generator inserting the nodes below index (-1 = the whole tree) in
+        document order into treeview and model, appended below parent_iid
+        (the item of index). Their item ids go to self.iids, a new list for
+        the whole tree. With intern every label is replaced by intern(label)
+        first; nodes whose index is in opened are inserted open. Yields the
+        number of nodes inserted after every batch nodes (never for batch 0).
+        """
+        labels, counts = self.labels, self.counts
+        if index < 0:
+            start, end, top = 0, len(labels), self.top
+            self.iids = [None] * len(labels)
+        else:
+            start, end, top = index + 1, index + self.aggregates()[0][index], counts[index]
+        iids, insert, add = self.iids, treeview.insert, model.add
+        parents = [[parent_iid, top]]   # [iid, children still to come]
+        for k in range(start, end):
+            while not parents[-1][1]:
+                parents.pop()
+            parents[-1][1] -= 1
+            parent = parents[-1][0]
+            if intern is not None:
+                labels[k] = intern(labels[k])
+            text = labels[k]
+            iids[k] = insert(parent, "end", text=text, open=k in opened)
+            add(iids[k], parent, text)
+            if counts[k]:
+                parents.append([iids[k], counts[k]])
+            if batch and (k - start) % batch == batch - 1:
+                yield k - start + 1
+
+    def insert(self, treeview, model, index: int = -1, parent_iid: str = ""):
+        """iter_insert() in one go."""
+        for _ in self.iter_insert(treeview, model, index, parent_iid):
+            pass
+
+    # -------------------------------------------------
+    # XML
+    # -------------------------------------------------
+    def write_nodes(self, parent_elem: ET.Element):
+        """Appends all nodes as nested <Node Text> elements below parent_elem."""
+        parents = [[parent_elem, self.top]]   # [element, children still to come]
+        for text, count in zip(self.labels, self.counts):
+            while not parents[-1][1]:
+                parents.pop()
+            parents[-1][1] -= 1
+            elem = ET.SubElement(parents[-1][0], "Node", Text=text)
+            if count:
+                parents.append([elem, count])
+
+
+def iter_xml(source):
+    """
+    Streams a <TreeView> document (file name or binary file object) and
+    yields (depth, Text) of every node in document order; depth 0 is the
+    top level. Finished elements are dropped right away, so memory does
+    not grow with the document.
+    """
+    elems = []   # open elements
+    depths = []  # depth of each open <Node>, -1 for other elements
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth = -1
+            # like findall("Node") per level: only <Node> directly below the root or a <Node>
+            if elem.tag == "Node" and elems and (depths[-1] >= 0 or len(elems) == 1):
+                depth = depths[-1] + 1
+                yield depth, elem.get("Text", "")
+            elems.append(elem)
+            depths.append(depth)
+        else:
+            elems.pop()
+            depths.pop()
+            if elems:
+                del elems[-1][-1]  # a finished element is always its parent's last child
+
+
+def diff_trees(old: CompactTree, new: CompactTree) -> tuple:
+    """
+    Compares two trees level by level and returns (ops, match):
+      ops    ("delete", old_index)
+             ("rename", old_index, new_index)
+             ("insert", old_parent_index or -1, final_position, new_index)
+             inserts come in ascending position per parent and add whole subtrees
+      match  new_index -> old_index of the node it corresponds to, -1 if inserted
+    Identical subtrees are recognised by comparing their array slices and skipped.
+    """
+    osz, nsz = old.sizes(), new.sizes()
+    ops = []
+    match = array("i", [-1]) * len(new)
+    stack = [(-1, -1)]
+    while stack:
+        po, pn = stack.pop()
+        ko = old.child_indices(po, osz)
+        kn = new.child_indices(pn, nsz)
+        if len(ko) == len(kn):
+            pairs = list(zip(ko, kn))
+        else:
+            pairs = []
+            matcher = SequenceMatcher(None, [old.labels[i] for i in ko], [new.labels[j] for j in kn],
+                                      autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                common = min(i2 - i1, j2 - j1) if tag in ("equal", "replace") else 0
+                pairs.extend(zip(ko[i1:i1 + common], kn[j1:j1 + common]))
+                ops.extend(("delete", i) for i in ko[i1 + common:i2])
+                ops.extend(("insert", po, pos, kn[pos]) for pos in range(j1 + common, j2))
+        for i, j in pairs:
+            size = osz[i]
+            if (size == nsz[j]
+                    and old.labels[i:i + size] == new.labels[j:j + size]
+                    and old.counts[i:i + size] == new.counts[j:j + size]):
+                match[j:j + size] = array("i", range(i, i + size))
+                continue
+            match[j] = i
+            if old.labels[i] != new.labels[j]:
+                ops.append(("rename", i, j))
+            stack.append((i, j))
+    return ops, match
+
+
+def _preorder(counts, top: int) -> bool:
+    """
+    True if counts (with top nodes at the top level) describe one tree in
+    preorder: before every node but the first, some parent still expects a
+    child. After node k, top + counts[0] + ... + counts[k] - (k + 1) are open.
+    """
+    if not counts:
+        return top == 0
+    return top > 0 and min(map(sub, accumulate(counts), range(1, len(counts))), default=0) + top > 0
+
+
+def _packed(values, largest: int) -> array:
+    """values in the narrowest snapshot integer type that holds largest."""
+    for width, typecode in SNAPSHOT_TYPECODES.items():
+        if largest < 1 << (8 * width):
+            return array(typecode, values)
+    raise OverflowError("value too large for a tree snapshot")
+
+def is_snapshot(filename: str) -> bool:
+    """True if filename starts with the snapshot header (whatever its extension); False if unreadable."""
+    try:
+        with open(filename, "rb") as f:
+            return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+def read_file(filename: str, labels=None) -> CompactTree:
+    """A <TreeView> XML file or a binary snapshot, told apart by the header."""
+    if is_snapshot(filename):
+        return CompactTree.from_snapshot(filename, labels)
+    return CompactTree.from_xml(filename, labels)
+
+def parse_file(filename: str) -> CompactTree:
+    """
+    Worker-process entry point (ProcessPoolExecutor): reads filename (XML or
+    snapshot) into a CompactTree. Labels are interned per file, so pickling
+    sends each distinct label once.
+    """
+    return read_file(filename, LabelInterner())
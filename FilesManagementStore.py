@@ -1,34 +1,70 @@
 import os
+import queue
+import threading
 import xml.etree.ElementTree as ET
 from tkinter import filedialog, messagebox
+from LabelInterner import LabelInterner
+from TreeModel import TreeModel
+from CompactTree import CompactTree, SNAPSHOT_EXTENSION, diff_trees, is_snapshot, read_file
+from ParallelTreeParser import ParallelTreeParser
+
+# Open dialogs offer both formats; a snapshot is recognized by its header, not its name
+FILETYPES = [("Tree files", "*.xml *.tsnap"), ("XML files", "*.xml"), ("Tree snapshots", "*.tsnap"),
+             ("All files", "*.*")]
+SAVE_FILETYPES = [("XML files", "*.xml"), ("Tree snapshots", "*.tsnap"), ("All files", "*.*")]
 
 class FilesManagementStore:
     """
     Manages loading/saving of a tkinter Treeview to/from XML files,
     in a format compatible with the original C# implementation.
+    The current file is watched; external changes are merged into the
+    Treeview as insert/delete/rename patches instead of a full reload.
     """
 
+    WATCH_INTERVAL_MS = 1000
+
     # -------------------------------------------------
     # Initialization
     # -------------------------------------------------
-    def __init__(self, treeview, show_message_boxes: bool = True):
+    def __init__(self, treeview, show_message_boxes: bool = True, labels: LabelInterner = None,
+                 model: TreeModel = None):
         self.treeview = treeview
         self.show_message_boxes = show_message_boxes
+        self.labels = labels if labels is not None else LabelInterner()
+        self.model = model if model is not None else TreeModel()
+
+        # file watching
+        self.on_external_change = None  # callable(filename), before patches are applied
+        self.on_reloaded = None         # callable(filename, touched_items), afterwards
+        self.expand_clones = None       # callable() expanding all lazy clones (see TreeModel)
+        # callable(filename) loading files of ParallelTreeParser.MIN_BYTES and more in the background
+        self.load_large = None
+        self.watched = None
+        self._signature = None          # (mtime_ns, size) of the content we know
+        self._failed_signature = None
+        self._snapshot = None           # CompactTree of that content, with item ids
+        self._snapshot_version = None   # model.version the snapshot belongs to
+        self._watch_job = None
+        self._results = queue.Queue()
+        self._reloading = False
 
     # -------------------------------------------------
     # Public load/save methods
     # -------------------------------------------------
     def load_tree(self, last_used_path: str = None) -> str | None:
         """
-        Opens an Open dialog, loads the XML and fills the Treeview.
+        Opens an Open dialog, loads the XML or tree snapshot and fills the Treeview.
         Returns the selected file path (or None if cancelled).
+        Large files are handed to load_large instead, if set, and None is
+        returned: the tree is only replaced when their parse has succeeded,
+        so load_large's caller takes the file as data source then.
         """
         init_dir = last_used_path if last_used_path and os.path.isdir(last_used_path) else os.getcwd()
         try:
             filename = filedialog.askopenfilename(
                 title="Load Tree...",
                 initialdir=init_dir,
-                filetypes=[("XML files", "*.xml"), ("All files", "*.*")]
+                filetypes=FILETYPES
             )
         except Exception as e:
             messagebox.showerror("Dialog Error", f"Could not open file dialog:\n{e}")
@@ -37,6 +73,9 @@ class FilesManagementStore:
         if not filename:
             return None
 
+        if self.load_large and self._is_large(filename):
+            self.load_large(filename)
+            return None
         self._load_from_file(filename)
         return filename
 
@@ -65,7 +104,7 @@ class FilesManagementStore:
                 title="Save Tree As...",
                 initialdir=init_dir,
                 defaultextension=".xml",
-                filetypes=[("XML files", "*.xml"), ("All files", "*.*")]
+                filetypes=SAVE_FILETYPES
             )
         except Exception as e:
             if self.show_message_boxes:
@@ -85,15 +124,27 @@ class FilesManagementStore:
     # -------------------------------------------------
     def _save_to_file(self, filename: str):
         """
-        Recursively builds XML and saves it to file.
+        Builds XML and saves it to file. Files named *.tsnap, and snapshots
+        being overwritten, are saved as binary tree snapshots. Both are
+        written from the model, never from the widget: nodes hidden by a
+        filter and not yet expanded clones are saved too.
         """
-        root = ET.Element("TreeView")
-        self._write_nodes("", root)
+        if filename.lower().endswith(SNAPSHOT_EXTENSION) or is_snapshot(filename):
+            CompactTree.from_model(self.model).write_snapshot(filename)
+        else:
+            root = ET.Element("TreeView")
+            CompactTree.from_model(self.model).write_nodes(root)
+
+            # Optional: pretty-print
+            xml_str = ET.tostring(root, "utf-8")
+            tree = ET.ElementTree(ET.fromstring(xml_str))
+            tree.write(filename, encoding="utf-8", xml_declaration=True)
 
-        # Optional: pretty-print
-        xml_str = ET.tostring(root, "utf-8")
-        tree = ET.ElementTree(ET.fromstring(xml_str))
-        tree.write(filename, encoding="utf-8", xml_declaration=True)
+        # our own write is not an external change
+        if filename != self.watched:
+            self.watch(filename)
+        self._signature = self._stat(filename)
+        self._snapshot = None
 
         if self.show_message_boxes:
             messagebox.showinfo(
@@ -101,32 +152,43 @@ class FilesManagementStore:
                 f"Tree view data saved to file:\n{filename}"
             )
 
-    def _write_nodes(self, parent_iid: str, parent_elem: ET.Element):
-        """
-        Recursively write all child nodes into parent_elem.
-        """
-        for iid in self.treeview.get_children(parent_iid):
-            text = self.treeview.item(iid, "text")
-            node_elem = ET.SubElement(parent_elem, "Node", Text=text)
-            self._write_nodes(iid, node_elem)
+    @staticmethod
+    def _is_large(filename: str) -> bool:
+        try:
+            return os.path.getsize(filename) >= ParallelTreeParser.MIN_BYTES
+        except OSError:
+            return False  # _load_from_file reports it
 
     def _load_from_file(self, filename: str):
         """
-        Clears the Treeview and loads nodes from XML file.
+        Clears the Treeview and loads nodes from XML file or tree snapshot.
         """
         for iid in self.treeview.get_children():
             self.treeview.delete(iid)
+        self.model.clear()
+        self.labels.clear()
 
         try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            self._read_nodes(root, "")
+            signature = self._stat(filename)
+            if is_snapshot(filename):
+                snapshot = CompactTree.from_snapshot(filename, self.labels)
+                snapshot.insert(self.treeview, self.model)
+            else:
+                tree = ET.parse(filename)
+                root = tree.getroot()
+                snapshot = CompactTree(iids=[])
+                self._read_nodes(root, "", snapshot)
+            self.watch(filename)
+            self._signature = signature
+            self._snapshot = snapshot
+            self._snapshot_version = self.model.version
             if self.show_message_boxes:
                 messagebox.showinfo(
                     "Load Successful",
                     f"Tree view data loaded from file:\n{filename}"
                 )
         except Exception as ex:
+            self.unwatch()
             if self.show_message_boxes:
                 messagebox.showerror(
                     "Load Error",
@@ -135,11 +197,162 @@ class FilesManagementStore:
             else:
                 print(f"[Debug] Load error: {ex}")
 
-    def _read_nodes(self, xml_parent: ET.Element, parent_iid: str):
+    def _read_nodes(self, xml_parent: ET.Element, parent_iid: str, snapshot: CompactTree = None):
         """
         Recursively read all <Node> elements from xml_parent and insert them into the Treeview.
+        If given, snapshot collects the nodes in document order for the file watcher.
         """
-        for node_elem in xml_parent.findall("Node"):
-            text = node_elem.get("Text", "")
+        nodes = xml_parent.findall("Node")
+        if snapshot is not None and not parent_iid:
+            snapshot.top = len(nodes)
+        for node_elem in nodes:
+            text = self.labels.intern(node_elem.get("Text", ""))
             new_iid = self.treeview.insert(parent_iid, "end", text=text)
-            self._read_nodes(node_elem, new_iid)
+            self.model.add(new_iid, parent_iid, text)
+            children = node_elem.findall("Node")
+            if snapshot is not None:
+                snapshot.labels.append(text)
+                snapshot.counts.append(len(children))
+                snapshot.iids.append(new_iid)
+            self._read_nodes(node_elem, new_iid, snapshot)
+
+    # -------------------------------------------------
+    # Watching the current file for external changes
+    # -------------------------------------------------
+    def watch(self, filename: str):
+        """Starts polling filename (mtime/size) for changes made by other tools."""
+        self.unwatch()
+        self.watched = filename
+        self._signature = self._stat(filename)
+        self._snapshot = None
+        self._watch_job = self.treeview.after(self.WATCH_INTERVAL_MS, self._poll_watched)
+
+    def adopt(self, filename: str, snapshot: CompactTree, signature=None):
+        """
+        Starts watching filename for a tree that was filled from snapshot
+        elsewhere (e.g. parsed in another process). signature is the file's
+        (mtime_ns, size) when it was read; a later change is patched in.
+        """
+        self.watch(filename)
+        if signature is not None:
+            self._signature = signature
+        self._snapshot = snapshot
+        self._snapshot_version = self.model.version
+
+    @property
+    def signature(self):
+        """(mtime_ns, size) of the watched file as it was last loaded, patched or saved."""
+        return self._signature
+
+    def unwatch(self):
+        if self._watch_job:
+            self.treeview.after_cancel(self._watch_job)
+        self._watch_job = None
+        self.watched = None
+        self._snapshot = None
+
+    @staticmethod
+    def _stat(filename: str):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _poll_watched(self):
+        self._watch_job = self.treeview.after(self.WATCH_INTERVAL_MS, self._poll_watched)
+        if self._reloading:
+            return
+        signature = self._stat(self.watched)
+        if signature is None or signature in (self._signature, self._failed_signature):
+            return
+        self._start_reload(signature)
+
+    def _start_reload(self, signature):
+        """
+        Parses and diffs in a worker thread; the result is applied by _apply_reload.
+        The snapshot of the current tree is taken here on the Tk thread, the
+        model must not change while it is read: after an edit that is one
+        CompactTree.from_model() pass over the whole tree (about 0.4 s per
+        million nodes), plus the expansion of lazy clones if there are any.
+        Reloads without edits in between reuse the previous snapshot.
+        """
+        if self._snapshot is None or self._snapshot_version != self.model.version:
+            # edited (or saved) since the last snapshot: take a fresh one of what is shown;
+            # patches need an item id for every node, so clones are expanded first
+            if self.model.lazy and self.expand_clones:
+                self.expand_clones()
+            self._snapshot = CompactTree.from_model(self.model)
+            self._snapshot_version = self.model.version
+        old = self._snapshot
+        filename = self.watched
+        self._reloading = True
+
+        def work():
+            try:
+                new = read_file(filename, self.labels)
+                self._results.put((filename, signature, old, new, diff_trees(old, new), None))
+            except Exception as e:
+                self._results.put((filename, signature, old, None, None, e))
+
+        threading.Thread(target=work, name="tree-reload", daemon=True).start()
+        self.treeview.after(50, self._apply_reload)
+
+    def _apply_reload(self):
+        try:
+            filename, signature, old, new, diff, error = self._results.get_nowait()
+        except queue.Empty:
+            self.treeview.after(50, self._apply_reload)
+            return
+        self._reloading = False
+        if filename != self.watched:
+            return
+        if error is not None:
+            # most likely caught the other tool mid-write; retry on the next change
+            self._failed_signature = signature
+            print(f"[Debug] Reload of {filename} failed: {error}")
+            return
+        if self._snapshot is not old or self._snapshot_version != self.model.version:
+            self._start_reload(signature)  # the tree was edited meanwhile: diff again
+            return
+        if self.on_external_change:
+            self.on_external_change(filename)
+        touched = self._apply_patch(old, new, *diff)
+        self._signature = signature
+        self._snapshot = new
+        self._snapshot_version = self.model.version
+        if self.on_reloaded:
+            self.on_reloaded(filename, touched)
+
+    def _apply_patch(self, old: CompactTree, new: CompactTree, ops: list, match) -> int:
+        """
+        Applies diff_trees() ops to the Treeview and the model, fills new.iids
+        and returns the number of items touched.
+        """
+        tv, model, iids = self.treeview, self.model, old.iids
+        touched = 0
+        for op in ops:
+            if op[0] == "delete":
+                tv.delete(iids[op[1]])
+                model.remove(iids[op[1]])
+                touched += 1
+            elif op[0] == "rename":
+                text = new.labels[op[2]]
+                tv.item(iids[op[1]], text=text)
+                model.rename(iids[op[1]], text)
+                touched += 1
+
+        new_iids = new.iids = [iids[i] if i >= 0 else None for i in match]
+        sizes = new.aggregates()[0]
+        for op in ops:
+            if op[0] != "insert":
+                continue
+            _, parent_index, position, j = op
+            parent_iid = iids[parent_index] if parent_index >= 0 else ""
+            text = new.labels[j]
+            new_iids[j] = tv.insert(parent_iid, position, text=text)
+            model.add(new_iids[j], parent_iid, text, position)
+            # the rest of the inserted subtree, in document order
+            new.insert(tv, model, j, new_iids[j])
+            touched += sizes[j]
+        return touched
@@ -0,0 +1,38 @@
+class LabelInterner:
+    """
+    Table of node labels shared by the load paths. Trees repeat the same
+    labels ("New Node", category names, ...) at every level; interning maps
+    every identical label to one str object instead of one copy per node.
+
+    The shared objects are the ones Python keeps: TreeNode.text in the
+    TreeModel and the label lists of CompactTree snapshots. The Treeview
+    copies every label into its own Tcl object, so the widget's memory is
+    not reduced.
+    """
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self):
+        self._labels = {}
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def intern(self, text: str) -> str:
+        """Returns the shared instance of text, registering it on first use."""
+        try:
+            return self._labels[text]
+        except KeyError:
+            self._labels[text] = text
+            return text
+
+    def clear(self):
+        """Forgets all labels (e.g. before a tree is replaced by a full load)."""
+        self._labels.clear()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._labels
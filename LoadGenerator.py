@@ -0,0 +1,233 @@
+"""
+Headless load generator for the XML web service code paths.
+
+    python3 LoadGenerator.py --clients 16 --duration 10 --latency 0.02 --jitter 0.03
+    python3 LoadGenerator.py --url http://127.0.0.1:3000/api --clients 4
+    python3 LoadGenerator.py --policy compare --latency 0.02 --jitter 0.03 --error-rate 0.05 --stall-rate 0.02 --stall 2
+
+Every simulated client drives its own WebServiceManagementStore (on an
+in-memory Treeview stand-in) through list, load, save and create/delete
+cycles. Without --url a LocalXmlService with the given fault settings is
+started in-process. Latency percentiles are reported per operation.
+--policy compare runs the same load twice, first with single attempts and
+no timeouts (as before RequestPolicy), then with retries and hedged reads.
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import threading
+import time
+from LocalXmlService import LocalXmlService
+from RequestPolicy import RequestPolicy
+from WebServiceManagementStore import WebServiceManagementStore
+
+# -------------------------------------------------
+# In-memory Treeview stand-in
+# -------------------------------------------------
+class HeadlessTreeview:
+    """
+    The subset of ttk.Treeview the stores use, kept in plain dicts,
+    so a store can load and serialize trees without a display.
+    """
+
+    def __init__(self):
+        self._children = {"": []}
+        self._parent = {}
+        self._text = {}
+        self._ids = itertools.count(1)
+
+    def insert(self, parent: str, index, iid: str = None, text: str = "", **kw) -> str:
+        iid = iid or f"I{next(self._ids):03X}"
+        siblings = self._children[parent]
+        if index == "end":
+            siblings.append(iid)
+        else:
+            siblings.insert(int(index), iid)
+        self._children[iid] = []
+        self._parent[iid] = parent
+        self._text[iid] = text
+        return iid
+
+    def get_children(self, item: str = "") -> tuple:
+        return tuple(self._children[item])
+
+    def parent(self, item: str) -> str:
+        return self._parent[item]
+
+    def exists(self, item: str) -> bool:
+        return item in self._text
+
+    def item(self, item: str, option: str = None, **kw):
+        if "text" in kw:
+            self._text[item] = kw["text"]
+        if option == "text":
+            return self._text[item]
+        if option is None and not kw:
+            return {"text": self._text[item]}
+
+    def delete(self, *items):
+        for item in items:
+            self._children[self._parent[item]].remove(item)
+            stack = [item]
+            while stack:
+                iid = stack.pop()
+                stack.extend(self._children.pop(iid))
+                del self._parent[iid]
+                del self._text[iid]
+
+# -------------------------------------------------
+# Load generator
+# -------------------------------------------------
+class LoadGenerator:
+    """
+    Runs `clients` threads for `duration` seconds against webservice_url.
+    mix gives the relative weight of each operation. All clients share policy.
+    """
+
+    DEFAULT_MIX = {"list": 2, "load": 5, "save": 2, "create_delete": 1}
+
+    def __init__(self, webservice_url: str, clients: int = 8, duration: float = 10.0,
+                 mix: dict = None, seed: int = None, store_factory=None, policy: RequestPolicy = None):
+        self.webservice_url = webservice_url
+        self.clients = clients
+        self.duration = duration
+        self.mix = mix or self.DEFAULT_MIX
+        self.seed = seed
+        self.policy = policy if policy is not None else RequestPolicy(seed=seed)
+        self.store_factory = store_factory or (
+            lambda: WebServiceManagementStore(HeadlessTreeview(), webservice_url, show_message_boxes=False,
+                                              policy=self.policy))
+        self._lock = threading.Lock()
+        self.latencies = {op: [] for op in self.mix}
+        self.errors = {op: {} for op in self.mix}
+
+    def run(self) -> "LoadGenerator":
+        deadline = time.perf_counter() + self.duration
+        threads = [threading.Thread(target=self._client, args=(n, deadline), daemon=True)
+                   for n in range(self.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self
+
+    # -------------------------------------------------
+    # One simulated client
+    # -------------------------------------------------
+    def _client(self, number: int, deadline: float):
+        rnd = random.Random(None if self.seed is None else self.seed + number)
+        store = self.store_factory()
+        ops, weights = zip(*self.mix.items())
+        ids = []
+        loaded = None
+        while time.perf_counter() < deadline:
+            op = rnd.choices(ops, weights)[0]
+            if op != "list" and not ids:
+                op = "list"
+            start = time.perf_counter()
+            try:
+                if op == "list":
+                    # skip the short-lived entries of other clients' create/delete cycles
+                    ids = [entry["id"] for entry in store.list_xml()
+                           if not str(entry["name"]).startswith("load-")]
+                elif op == "load":
+                    xml_id = rnd.choice(ids)
+                    store.populate_tree(store.fetch_xml(xml_id))
+                    loaded = xml_id
+                elif op == "save":
+                    if loaded is None:
+                        continue
+                    store.update_xml(loaded, store._serialize_tree_to_xml())
+                elif op == "create_delete":
+                    new_id = store.create_xml(f"load-{number}", store._serialize_tree_to_xml())
+                    store.delete_xml(new_id)
+            except Exception as e:
+                self._record(op, time.perf_counter() - start, type(e).__name__)
+                continue
+            self._record(op, time.perf_counter() - start)
+
+    def _record(self, op: str, seconds: float, error: str = None):
+        with self._lock:
+            if error:
+                self.errors[op][error] = self.errors[op].get(error, 0) + 1
+            else:
+                self.latencies[op].append(seconds)
+
+    # -------------------------------------------------
+    # Reporting
+    # -------------------------------------------------
+    @staticmethod
+    def percentile(values: list, p: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        if not values:
+            return float("nan")
+        return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+    def report(self) -> str:
+        lines = [f"{'operation':<15}{'ok':>7}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}"
+                 f"{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'req/s':>8}"]
+        for op in self.mix:
+            values = sorted(self.latencies[op])
+            errors = sum(self.errors[op].values())
+            row = f"{op:<15}{len(values):>7}{errors:>8}"
+            for p in (50, 90, 95, 99, 100):
+                row += f"{self.percentile(values, p) * 1000:>9.1f}"
+            row += f"{(len(values) + errors) / self.duration:>8.1f}"
+            lines.append(row)
+        for op in self.mix:
+            if self.errors[op]:
+                details = ", ".join(f"{k}: {v}" for k, v in sorted(self.errors[op].items()))
+                lines.append(f"  {op} errors: {details}")
+        lines.append("  requests: " + ", ".join(f"{k} {v}" for k, v in self.policy.stats.items()))
+        return "\n".join(lines)
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless load generator for the XML web service")
+    parser.add_argument("--url", help="existing service (default: start a LocalXmlService in-process)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--files", nargs="*", help="XML files for the in-process service (default: Nodes*.xml)")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall", type=float, default=5.0)
+    parser.add_argument("--policy", choices=("resilient", "plain", "compare"), default="resilient",
+                        help="retries and hedged reads, single attempts as before, or both in turn")
+    args = parser.parse_args(argv)
+
+    service = None
+    url = args.url
+    if not url:
+        service = LocalXmlService(port=0, latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth,
+                                  error_rate=args.error_rate, stall_rate=args.stall_rate, stall=args.stall,
+                                  seed=args.seed)
+        files = args.files
+        if not files:
+            here = os.path.dirname(os.path.abspath(__file__))
+            files = sorted(os.path.join(here, f) for f in os.listdir(here)
+                           if f.startswith("Nodes") and f.endswith(".xml"))
+        for filename in files:
+            service.add_file(filename)
+        url = service.start().url
+
+    policies = {"plain": RequestPolicy.plain, "resilient": lambda: RequestPolicy(seed=args.seed)}
+    names = ("plain", "resilient") if args.policy == "compare" else (args.policy,)
+    for name in names:
+        if service and args.seed is not None:
+            service._random.seed(args.seed)  # the same faults for every run
+        print(f"{args.clients} clients for {args.duration:.0f}s against {url} ({name} requests)")
+        generator = LoadGenerator(url, args.clients, args.duration, seed=args.seed, policy=policies[name]()).run()
+        print(generator.report())
+    if service:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
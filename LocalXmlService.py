@@ -0,0 +1,266 @@
+"""
+Local stand-in for the Docker/PostgreSQL XML web service.
+
+    python3 LocalXmlService.py --port 3000 --latency 0.05 --error-rate 0.02 Nodes01.xml Nodes02.xml
+
+Serves the same endpoints and JSON shapes under /api/ from an in-memory
+store and can inject latency, stalls, bandwidth limits and server errors,
+so the web-service code paths can be tested and benchmarked offline.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class LocalXmlService:
+    """
+    In-memory XML web service. Use start()/stop() to run it on a background
+    thread (e.g. from LoadGenerator) or serve_forever() from the command line.
+    """
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 3000,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 bandwidth: int = 0,
+                 error_rate: float = 0.0,
+                 stall_rate: float = 0.0,
+                 stall: float = 5.0,
+                 seed: int = None):
+        # fault injection settings (may be changed while running)
+        self.latency    = latency      # seconds added to every request
+        self.jitter     = jitter       # plus uniform 0..jitter seconds
+        self.bandwidth  = bandwidth    # response bytes per second, 0 = unlimited
+        self.error_rate = error_rate   # share of requests answered with HTTP 500/503
+        self.stall_rate = stall_rate   # share of requests delayed by `stall` seconds
+        self.stall      = stall
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._entries = {}   # id -> {"name": str, "xmlData": str}
+        self._next_id = 1
+        self._thread = None
+
+        handler = type("Handler", (_Handler,), {"service": self})
+        self.server = _Server((host, port), handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    # -------------------------------------------------
+    # Data
+    # -------------------------------------------------
+    def add_entry(self, name: str, xml_data: str) -> int:
+        with self._lock:
+            xml_id = self._next_id
+            self._next_id += 1
+            self._entries[xml_id] = {"name": name, "xmlData": xml_data}
+            return xml_id
+
+    def add_file(self, filename: str) -> int:
+        with open(filename, "r", encoding="utf-8") as f:
+            return self.add_entry(os.path.splitext(os.path.basename(filename))[0], f.read())
+
+    # -------------------------------------------------
+    # Running
+    # -------------------------------------------------
+    def start(self) -> "LocalXmlService":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="local-xml-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+
+    # -------------------------------------------------
+    # Fault injection (called by the handler)
+    # -------------------------------------------------
+    def _draw_faults(self) -> tuple:
+        """Returns (delay seconds, error status or None) for one request."""
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.stall_rate and self._random.random() < self.stall_rate:
+                delay += self.stall
+            status = None
+            if self.error_rate and self._random.random() < self.error_rate:
+                status = self._random.choice((500, 503))
+        return delay, status
+
+    # -------------------------------------------------
+    # Endpoints: return (status, JSON-able body or XML text)
+    # -------------------------------------------------
+    def get_all_xml_info(self):
+        with self._lock:
+            info = [{"id": k, "name": v["name"]} for k, v in sorted(self._entries.items())]
+        return 200, info
+
+    def get_xml_by_id(self, xml_id: int):
+        with self._lock:
+            entry = self._entries.get(xml_id)
+        if entry is None:
+            return 404, {"error": f"XML with ID {xml_id} not found"}
+        return 200, entry["xmlData"]
+
+    def update_xml_by_id(self, data: dict):
+        with self._lock:
+            entry = self._entries.get(int(data.get("id", 0)))
+            if entry is None:
+                return 404, {"error": "XML not found"}
+            entry["xmlData"] = data.get("xmlData", "")
+        return 200, {"message": "XML updated"}
+
+    def update_xml_name_by_id(self, data: dict):
+        with self._lock:
+            entry = self._entries.get(int(data.get("id", 0)))
+            if entry is None:
+                return 404, {"error": "XML not found"}
+            entry["name"] = data.get("name", entry["name"])
+        return 200, {"message": "Name updated"}
+
+    def create_new_xml(self, data: dict):
+        if not data.get("name"):
+            return 400, {"error": "name is required"}
+        return 200, {"id": self.add_entry(data["name"], data.get("xmlData", ""))}
+
+    def delete_xml_by_id(self, xml_id: int):
+        with self._lock:
+            if self._entries.pop(xml_id, None) is None:
+                return 404, {"error": "XML not found"}
+        return 200, {"message": "XML deleted"}
+
+
+class _Server(ThreadingHTTPServer):
+    # a deep accept backlog keeps connection drops (and 1 s SYN retries)
+    # from showing up as latency when many clients connect at once
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Routes /api/<endpoint> to LocalXmlService (set as class attribute `service`)."""
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        svc = self.service
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "api":
+            return self._reply(404, {"error": "unknown path"})
+        endpoint, arg = parts[1], (parts[2] if len(parts) > 2 else None)
+
+        delay, status = svc._draw_faults()
+        if delay:
+            time.sleep(delay)
+        if status:
+            return self._reply(status, {"error": "injected fault"})
+
+        try:
+            data = json.loads(raw.decode("utf-8")) if raw else {}
+            routes = {
+                ("GET", "get_all_xml_info"):         lambda: svc.get_all_xml_info(),
+                ("GET", "get_xml_by_id"):            lambda: svc.get_xml_by_id(int(arg)),
+                ("PUT", "update_xml_by_id"):         lambda: svc.update_xml_by_id(data),
+                ("PUT", "update_xml_name_by_id"):    lambda: svc.update_xml_name_by_id(data),
+                ("POST", "create_new_xml"):          lambda: svc.create_new_xml(data),
+                ("DELETE", "delete_xml_by_id"):      lambda: svc.delete_xml_by_id(int(arg)),
+            }
+            route = routes.get((method, endpoint))
+            if route is None:
+                return self._reply(404, {"error": f"unknown endpoint {method} {endpoint}"})
+            status, body = route()
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(status, body)
+
+    def _reply(self, status: int, body):
+        if isinstance(body, str):
+            payload, ctype = body.encode("utf-8"), "application/xml; charset=utf-8"
+        else:
+            payload, ctype = json.dumps(body).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            bandwidth = self.service.bandwidth
+            if not bandwidth:
+                self.wfile.write(payload)
+                return
+            # throttle in ~20 slices per second
+            chunk = max(1, bandwidth // 20)
+            for i in range(0, len(payload), chunk):
+                self.wfile.write(payload[i:i + chunk])
+                self.wfile.flush()
+                time.sleep(len(payload[i:i + chunk]) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout / cancelled hedge)
+
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the XML web service")
+    parser.add_argument("files", nargs="*", help="XML files to serve initially (default: Nodes*.xml)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform 0..JITTER seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="response bytes per second (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500/503")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of requests stalled by --stall")
+    parser.add_argument("--stall", type=float, default=5.0, help="stall duration in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    service = LocalXmlService(args.host, args.port, args.latency, args.jitter, args.bandwidth,
+                              args.error_rate, args.stall_rate, args.stall, args.seed)
+    files = args.files
+    if not files:
+        here = os.path.dirname(os.path.abspath(__file__))
+        files = sorted(os.path.join(here, f) for f in os.listdir(here)
+                       if f.startswith("Nodes") and f.endswith(".xml"))
+    for filename in files:
+        service.add_file(filename)
+    print(f"Serving {len(files)} XML entries on {service.url}/ (Ctrl+C to stop)")
+    service.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
-﻿import os
+﻿import io
+import os
+import time
+import multiprocessing
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from FilesManagementStore import FilesManagementStore
-from WebServiceManagementStore import WebServiceManagementStore
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from AppConfig import AppConfig
+from CompactTree import CompactTree
+from FilesManagementStore import FILETYPES
+from ParallelTreeParser import ParallelTreeParser
+from TreeDocument import TreeDocument
+from TreeExporter import EXPORTERS, export_model
+from TkAsyncRunner import TkAsyncRunner
+
+# Optional per-node statistics columns of the main TreeView
+STATS_COLUMNS = ("Nodes", "Depth", "Leaves")
+
+# Tabs not shown for this long drop their widget items (kept as CompactTree)
+UNLOAD_IDLE_SECONDS = 300
 
 class MyPythonTreeApp(tk.Tk):
     def __init__(self):
@@ -30,20 +45,22 @@ class MyPythonTreeApp(tk.Tk):
         paned.pack(fill=tk.BOTH, expand=True)
 
         # -------------------------------------------------
-        # Left pane: TreeView
+        # Left pane: one tab (TreeDocument) per tree
         # -------------------------------------------------
         self.tree_frame = tk.Frame(paned, bd=2, relief=tk.SUNKEN)
         paned.add(self.tree_frame, stretch="always")
 
-        self.tree = ttk.Treeview(self.tree_frame)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-
-        # TreeView bindings
-        self.tree.bind("<Button-3>", self.show_tree_context_menu)
-        self.tree.bind("<Double-1>", self._on_double_click)
-        self.tree.bind("<ButtonPress-1>", self._on_drag_start)
-        self.tree.bind("<B1-Motion>", self._on_drag_motion)
-        self.tree.bind("<ButtonRelease-1>", self._on_drag_drop)
+        self.notebook = ttk.Notebook(self.tree_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self.documents = {}        # tab (frame path) -> TreeDocument
+        self._active_document = None
+        self._parse_pool = None    # ProcessPoolExecutor, created on first use
+        self._parser = None        # ParallelTreeParser on that pool
+        self._parsing = {}         # future -> (document, filename, signature, new tab?)
+        self._parse_job = None
+        self._clipboard = None     # (clipboard text, CompactTree) of the last copy/paste
+        self._menu_target = ""     # item under the pointer when the context menu was opened
 
         # -------------------------------------------------
         # Right pane: Controls & information
@@ -58,6 +75,24 @@ class MyPythonTreeApp(tk.Tk):
         self.entry_data_source = tk.Entry(top, state="disabled")
         self.entry_data_source.grid(row=0, column=1, sticky="ew", padx=(5,0))
         self.entry_data_source.insert(0, self.config_data.data_source)
+
+        # -- Filter row --
+        tk.Label(top, text="Filter:").grid(row=1, column=0, sticky="w", pady=(5,0))
+        self.entry_filter = tk.Entry(top)
+        self.entry_filter.grid(row=1, column=1, sticky="ew", padx=(5,0), pady=(5,0))
+        self.entry_filter.bind("<Return>", lambda e: self.apply_filter())
+        self.entry_filter.bind("<Escape>", lambda e: self.clear_filter())
+        tk.Button(top, text="Clear", command=self.clear_filter)\
+          .grid(row=1, column=2, padx=(5,0), pady=(5,0))
+        self.filter_status = tk.Label(top, text="", anchor="w")
+        self.filter_status.grid(row=2, column=1, sticky="w", padx=(5,0))
+
+        # -- Expand/collapse progress (shown while running) --
+        self.expand_status = tk.Label(top, text="", anchor="w")
+        self.expand_status.grid(row=3, column=1, sticky="w", padx=(5,0))
+        self.button_cancel_expand = tk.Button(top, text="Cancel", command=self.cancel_expand)
+        self.button_cancel_expand.grid(row=3, column=2, padx=(5,0))
+        self.button_cancel_expand.grid_remove()
         top.grid_columnconfigure(1, weight=1)
 
         # -- Application title --
@@ -98,6 +133,12 @@ class MyPythonTreeApp(tk.Tk):
                        variable=self.show_msg_var,
                        command=self.on_show_msg_changed)\
           .pack(anchor="w")
+        self.show_stats_var = tk.BooleanVar(value=self.config_data.show_subtree_stats)
+        tk.Checkbutton(control,
+                       text="Show Subtree Stats",
+                       variable=self.show_stats_var,
+                       command=self.on_show_stats_changed)\
+          .pack(anchor="w")
         tk.Label(control, text="Web Service URL:").pack(anchor="w", pady=(5,0))
         self.entry_ws = tk.Entry(control, width=40)
         self.entry_ws.pack(anchor="w", fill=tk.X)
@@ -133,17 +174,13 @@ class MyPythonTreeApp(tk.Tk):
               .pack(side=tk.RIGHT, padx=2)
 
         # -------------------------------------------------
-        # Initialize file & web‐service stores
+        # Initialize the first tab; every tab has its own file &
+        # web-service store (sharing one label table and one model
+        # that mirrors its TreeView), see TreeDocument
         # -------------------------------------------------
-        self.file_store = FilesManagementStore(
-            treeview=self.tree,
-            show_message_boxes=self.show_msg_var.get()
-        )
-        self.ws_store = WebServiceManagementStore(
-            treeview=self.tree,
-            webservice_url=self.config_data.webservice_url,
-            show_message_boxes=self.show_msg_var.get()
-        )
+        self.async_runner = TkAsyncRunner(self)
+        self.new_document()
+        self.after(30000, self._unload_idle_documents)
 
         # -------------------------------------------------
         # Context menu setup for TreeView
@@ -153,10 +190,24 @@ class MyPythonTreeApp(tk.Tk):
         menu_items = [
             ("Add Node",         self.add_node),
             ("Delete Node",      self.delete_node),
+            ("Rename Selected...", self.rename_nodes),
+            ("Move Selection Here", self.move_nodes_here),
+            ("Undo Bulk Operation", self.undo),
+            ("Copy",             self.copy_nodes),
+            ("Cut",              self.cut_nodes),
+            ("Paste",            self.paste_nodes),
+            ("Duplicate Subtree", self.duplicate_nodes),
             ("Delete All Nodes", self.delete_all_nodes),
             ("Load Data",        self.load_tree),
             ("Save Data",        self.save_tree),
             ("Save As Data",     self.save_as_tree),
+            ("Export...",        self.export_tree),
+            ("Expand All",       self.expand_all),
+            ("Collapse All",     self.collapse_all),
+            ("Expand to Depth...", self.expand_to_depth),
+            ("New Tab",          self.new_document),
+            ("Open in Tabs...",  self.open_files),
+            ("Close Tab",        self.close_document),
         ]
 
         for label, command in menu_items:
@@ -164,21 +215,223 @@ class MyPythonTreeApp(tk.Tk):
                 self.tree_menu.add_separator()  # separator before
                 self.tree_menu.add_command(label=label, command=command)
                 self.tree_menu.add_separator()  # separator after
+            elif label in ("Expand All", "New Tab"):
+                self.tree_menu.add_separator()
+                self.tree_menu.add_command(label=label, command=command)
             else:
                 self.tree_menu.add_command(label=label, command=command)
 
+        if self.show_stats_var.get():
+            self.on_show_stats_changed()
+
+    # -------------------------------------------------
+    # Tabs: the active TreeDocument provides tree, model and stores
+    # -------------------------------------------------
+    @property
+    def document(self) -> TreeDocument:
+        return self.documents[self.notebook.select()]
+
+    @property
+    def tree(self):
+        return self.document.tree
+
+    @property
+    def model(self):
+        return self.document.model
+
+    @property
+    def labels(self):
+        return self.document.labels
+
+    @property
+    def file_store(self):
+        return self.document.file_store
+
+    @property
+    def ws_store(self):
+        return self.document.ws_store
+
+    @property
+    def tree_filter(self):
+        return self.document.tree_filter
+
+    def new_document(self, title: str = "Untitled") -> TreeDocument:
+        doc = TreeDocument(self.notebook, STATS_COLUMNS, self.config_data.webservice_url,
+                           self.show_msg_var.get(), self.async_runner, title)
+        tree = doc.tree
+        tree.bind("<Button-3>", self.show_tree_context_menu)
+        tree.bind("<Double-1>", self._on_double_click)
+        tree.bind("<ButtonPress-1>", self._on_drag_start)
+        tree.bind("<B1-Motion>", self._on_drag_motion)
+        tree.bind("<ButtonRelease-1>", self._on_drag_drop)
+        tree.bind("<<TreeviewOpen>>", self._on_tree_open)
+        tree.bind("<Control-c>", lambda e: self.copy_nodes())
+        tree.bind("<Control-x>", lambda e: self.cut_nodes())
+        tree.bind("<Control-v>", lambda e: self.paste_nodes())
+        tree.bind("<Control-d>", lambda e: self.duplicate_nodes())
+        tree.bind("<Control-z>", lambda e: self.undo())
+        tree.bind("<Escape>", lambda e: self.cancel_expand())
+        # the loaded file is watched; external edits arrive as patches
+        doc.file_store.on_external_change = lambda filename: self._on_external_change(doc, filename)
+        doc.ws_store.on_replace = lambda: self._before_service_load(doc)
+        doc.file_store.on_reloaded = lambda filename, touched: self._on_file_reloaded(doc, filename, touched)
+        # large files are parsed in worker processes and inserted in slices
+        doc.file_store.load_large = lambda filename: self._submit_parse(doc, filename)
+        doc.on_progress = self._on_document_progress
+        doc.expander.on_opened = lambda node: self._on_expander_opened(doc, node)
+        doc.expander.on_progress = lambda done, total: self._on_expand_progress(doc, done, total)
+        doc.expander.on_done = lambda cancelled: self._on_expand_done(doc, cancelled)
+        doc.bulk.on_changed = lambda iids: self._on_bulk_changed(doc, iids)
+        self.documents[str(doc.frame)] = doc
+        self.notebook.add(doc.frame, text=title)
+        self.notebook.select(doc.frame)
+        return doc
+
+    def close_document(self):
+        doc = self.document
+        self._cancel_parsing(doc)
+        self._active_document = None
+        del self.documents[str(doc.frame)]
+        self.notebook.forget(doc.frame)
+        doc.close()
+        if not self.documents:
+            self.new_document()
+
+    def open_files(self):
+        """Opens several XML files or tree snapshots in new tabs; they are parsed in parallel worker processes."""
+        filenames = filedialog.askopenfilenames(
+            title="Open in Tabs...",
+            initialdir=self._initial_dir(),
+            filetypes=FILETYPES
+        )
+        if not filenames:
+            return
+        for filename in filenames:
+            doc = self.new_document(os.path.basename(filename))
+            doc.data_source = filename
+            self._submit_parse(doc, filename, new_tab=True)
+
+    def _submit_parse(self, doc, filename: str, new_tab: bool = False):
+        """
+        Parses filename in the worker processes (a large file in ranges, see
+        ParallelTreeParser) and fills doc with it when done.
+        """
+        self._cancel_parsing(doc)
+        if self._parse_pool is None:
+            # spawn: forking a process that runs Tk and the asyncio thread is not safe
+            workers = os.cpu_count() or 1
+            self._parse_pool = ProcessPoolExecutor(max_workers=workers,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+            self._parser = ParallelTreeParser(self._parse_pool, workers)
+        try:
+            stat = os.stat(filename)
+        except OSError as ex:
+            self._show_load_error(filename, ex)
+            return
+        self.notebook.tab(doc.frame, text=f"{os.path.basename(filename)} (parsing)")
+        future = self._parser.submit(filename)
+        self._parsing[future] = (doc, filename, (stat.st_mtime_ns, stat.st_size), new_tab)
+        if self._parse_job is None:
+            self._parse_job = self.after(50, self._poll_parsing)
+
+    def _cancel_parsing(self, doc):
+        for future, (parsing, *_) in list(self._parsing.items()):
+            if parsing is doc:
+                future.cancel()
+                del self._parsing[future]
+
+    def _initial_dir(self) -> str:
+        path = self.config_data.data_source
+        if path and os.path.isfile(path):
+            path = os.path.dirname(path)
+        return path if path and os.path.isdir(path) else os.getcwd()
+
+    def _poll_parsing(self):
+        self._parse_job = None
+        for future in [f for f in self._parsing if f.done()]:
+            doc, filename, signature, new_tab = self._parsing.pop(future)
+            try:
+                compact = future.result()
+            except Exception as ex:
+                self._show_load_error(filename, ex)
+                if new_tab:
+                    self.notebook.select(doc.frame)
+                    self.close_document()
+                else:
+                    self.notebook.tab(doc.frame, text=doc.title)
+                continue
+            if not new_tab:
+                # only now: if the parse fails, the tab keeps its tree and its data source
+                self._set_data_source(filename, doc)
+            doc.populate(compact, self._on_document_loaded, filename, signature)
+        if self._parsing:
+            self._parse_job = self.after(50, self._poll_parsing)
+
+    def _show_load_error(self, filename: str, ex: Exception):
+        if self.show_msg_var.get():
+            messagebox.showerror("Load Error", f"Error loading tree view data:\n{filename}\n{ex}")
+        else:
+            print(f"[Debug] Load error: {filename}: {ex}")
+
+    def _on_document_progress(self, doc, inserted, total):
+        self.notebook.tab(doc.frame, text=f"{doc.title} ({inserted * 100 // total}%)")
+
+    def _on_document_loaded(self, doc):
+        self.notebook.tab(doc.frame, text=doc.title)
+        if doc is self._active_document:
+            self._refresh_visible_stats()
+
+    def _on_tab_changed(self, event=None):
+        if not self.notebook.select():
+            return
+        previous, doc = self._active_document, self.document
+        if previous is doc:
+            return
+        if previous is not None and previous.tree_filter.active:
+            previous.tree_filter.clear()
+        if previous is not None:
+            previous.expander.cancel()
+        self.filter_status.config(text="")
+        self._active_document = doc
+        doc.last_active = time.monotonic()
+        doc.tree.configure(displaycolumns=STATS_COLUMNS if self.show_stats_var.get() else ())
+        if doc.unloaded:
+            doc.restore(self._on_document_loaded)
+        else:
+            self._refresh_visible_stats()
+        if doc.data_source:
+            self._show_data_source(doc.data_source)
+
+    def _unload_idle_documents(self):
+        now = time.monotonic()
+        for doc in self.documents.values():
+            if doc is self._active_document:
+                doc.last_active = now
+            elif now - doc.last_active > UNLOAD_IDLE_SECONDS and not doc.loading and not doc.unloaded:
+                doc.unload()
+        self.after(30000, self._unload_idle_documents)
+
     # -------------------------------------------------
     # Context menu action handlers
     # -------------------------------------------------
     def show_tree_context_menu(self, event):
+        if self.document.loading:
+            return
+        self._menu_target = self.tree.identify_row(event.y)
         try:
             self.tree_menu.tk_popup(event.x_root, event.y_root)
         finally:
             self.tree_menu.grab_release()
 
     def add_node(self):
+        self.clear_filter()
+        self.document.expander.cancel()   # a running bulk step must not see the tree change
         sel = self.tree.selection()
-        self.tree.insert(sel[0] if sel else '', 'end', text="New Node")
+        parent = sel[0] if sel else ''
+        self.document.expand(parent)
+        iid = self.tree.insert(parent, 'end', text="New Node")
+        self.model.add(iid, parent, "New Node")
+        self._refresh_stats(self.model.path(iid))
 
     def delete_node(self):
         sel = self.tree.selection()
@@ -188,29 +441,310 @@ class MyPythonTreeApp(tk.Tk):
             return
         if self.show_msg_var.get() and not messagebox.askyesno("Delete Node", "Are you sure?"):
             return
-        for iid in sel:
-            self.tree.delete(iid)
+        self.clear_filter()
+        self.document.bulk.delete(sel)
 
     def delete_all_nodes(self):
         if self.show_msg_var.get() and not messagebox.askyesno("Delete All Nodes", "Delete all nodes?"):
             return
+        self.clear_filter()
+        self.document.expander.cancel()   # records a running bulk step before it is dropped
+        self.document.bulk.clear_undo()
         for iid in self.tree.get_children():
             self.tree.delete(iid)
+        self.model.clear()
+
+    # -------------------------------------------------
+    # Bulk operations on the selection (time-sliced, one undo
+    # step each, see BulkOperations; Escape or Cancel stops them)
+    # -------------------------------------------------
+    def rename_nodes(self):
+        sel = [iid for iid in self.tree.selection() if iid in self.model]
+        if not sel:
+            if self.show_msg_var.get():
+                messagebox.showwarning("Select Node", "Please select the nodes to rename.")
+            return
+        pattern = simpledialog.askstring(
+            "Rename Selected", f"{len(sel)} node(s). Find (regular expression, empty = whole text):", parent=self)
+        if pattern is None:
+            return
+        template = simpledialog.askstring(
+            "Rename Selected",
+            "Replace with (\\1 = group):" if pattern else "New text ({text} = old text, {n} = number):",
+            parent=self, initialvalue="" if pattern else "{text}")
+        if template is None:
+            return
+        self.clear_filter()
+        try:
+            self.document.bulk.rename(sel, pattern, template)
+        except ValueError as ex:
+            if self.show_msg_var.get():
+                messagebox.showerror("Rename Error", str(ex))
+            else:
+                print(f"Rename Error: {ex}")
+
+    def move_nodes_here(self):
+        """Moves the selected subtrees below the node the context menu was opened on (top level if none)."""
+        target = self._menu_target if self._menu_target in self.model else ""
+        sel = self.tree.selection()
+        if not sel:
+            if self.show_msg_var.get():
+                messagebox.showwarning("Select Node", "Please select the nodes to move.")
+            return
+        self.clear_filter()
+        try:
+            self.document.bulk.move(sel, target)
+        except ValueError as ex:
+            if self.show_msg_var.get():
+                messagebox.showerror("Move Error", str(ex))
+            else:
+                print(f"Move Error: {ex}")
+
+    def undo(self):
+        if self.document.loading:
+            return
+        self.clear_filter()
+        if not self.document.bulk.undo() and self.show_msg_var.get():
+            messagebox.showinfo("Undo Bulk Operation",
+                                "Nothing to undo (only bulk delete, rename and move can be undone,\n"
+                                "and only until the tree is edited otherwise).")
+
+    def _on_bulk_changed(self, doc, iids):
+        if doc is not self._active_document or not self.show_stats_var.get():
+            return
+        paths = set()
+        for iid in iids:
+            paths.update(self.model.path(iid))
+        self._refresh_stats(paths)
+
+    # -------------------------------------------------
+    # Copy / Cut / Paste / Duplicate (lazy clones expanded on open,
+    # see TreeDocument; the clipboard holds <TreeView> XML)
+    # -------------------------------------------------
+    def _selected_subtrees(self) -> list:
+        """Selected nodes without those inside another selected subtree."""
+        return self.document.bulk.normalize(self.tree.selection())
+
+    def copy_nodes(self) -> bool:
+        sel = self._selected_subtrees()
+        if not sel:
+            if self.show_msg_var.get():
+                messagebox.showwarning("Select Node", "Please select a node to copy.")
+            return False
+        tree = self.document.copy(sel)
+        root = ET.Element("TreeView")
+        tree.write_nodes(root)
+        text = ET.tostring(root, encoding="unicode")
+        self.clipboard_clear()
+        self.clipboard_append(text)
+        self._clipboard = (text, tree)
+        return True
+
+    def cut_nodes(self):
+        if self.copy_nodes():
+            self.clear_filter()
+            self.document.bulk.delete(self._selected_subtrees())
+
+    def paste_nodes(self):
+        tree = self._clipboard_tree()
+        if tree is None:
+            if self.show_msg_var.get():
+                messagebox.showwarning("Paste", "The clipboard does not contain tree nodes.")
+            return
+        self.clear_filter()
+        self.document.expander.cancel()
+        sel = self.tree.selection()
+        parent = sel[0] if sel and sel[0] in self.model else ''
+        self._show_clones(self.document.paste(tree, parent))
+
+    def duplicate_nodes(self):
+        sel = self._selected_subtrees()
+        if not sel:
+            if self.show_msg_var.get():
+                messagebox.showwarning("Select Node", "Please select a node to duplicate.")
+            return
+        self.clear_filter()
+        self.document.expander.cancel()
+        doc, new_iids = self.document, []
+        for iid in sel:
+            node = self.model.nodes[iid]
+            # an unexpanded clone is shared as is, anything else is snapshotted once
+            tree, k = self.model.lazy.get(iid) or (doc.copy([iid]), 0)
+            new_iids.append(doc.insert_clone(node.parent.iid, self.model.index(iid) + 1, tree, k, node.text))
+        self._show_clones(new_iids)
+
+    def _clipboard_tree(self):
+        """The clipboard as CompactTree (None if it holds no <Node> XML); own copies are reused."""
+        try:
+            text = self.clipboard_get()
+        except tk.TclError:
+            return None
+        if self._clipboard and self._clipboard[0] == text:
+            return self._clipboard[1]
+        data = text.strip()
+        if data.startswith("<Node"):
+            data = f"<TreeView>{data}</TreeView>"
+        try:
+            tree = CompactTree.from_xml(io.BytesIO(data.encode("utf-8")), self.labels)
+        except ET.ParseError:
+            return None
+        if not len(tree):
+            return None
+        self._clipboard = (text, tree)
+        return tree
+
+    def _show_clones(self, iids):
+        if not iids:
+            return
+        self.tree.selection_set(iids)
+        self.tree.see(iids[0])
+        for iid in iids:
+            self._refresh_stats(self.model.path(iid))
+
+    # -------------------------------------------------
+    # Expand All / Collapse All / Expand to Depth (time-sliced,
+    # see TreeExpander; Escape or Cancel stops them)
+    # -------------------------------------------------
+    def expand_all(self):
+        self.clear_filter()
+        self.document.expander.expand_all()
+
+    def collapse_all(self):
+        self.clear_filter()
+        self.document.expander.collapse_all()
+
+    def expand_to_depth(self):
+        depth = simpledialog.askinteger("Expand to Depth", "Number of levels to show:",
+                                        parent=self, minvalue=1, initialvalue=2)
+        if depth is None:
+            return
+        self.clear_filter()
+        self.document.expander.expand_to_depth(depth)
+
+    def cancel_expand(self):
+        self.document.expander.cancel()
+
+    def _on_expander_opened(self, doc, node):
+        if doc is self._active_document:
+            self._refresh_stats(c.iid for c in node.children)
+
+    def _on_expand_progress(self, doc, done, total):
+        if doc is not self._active_document:
+            return
+        text = f"{done * 100 // total}% ({done} nodes)" if total else f"{done} nodes"
+        self.expand_status.config(text=f"Working... {text}")
+        self.button_cancel_expand.grid()
+
+    def _on_expand_done(self, doc, cancelled):
+        if doc is not self._active_document:
+            return
+        self.expand_status.config(text="Cancelled" if cancelled else "")
+        self.button_cancel_expand.grid_remove()
+
+    # -------------------------------------------------
+    # Filter view
+    # -------------------------------------------------
+    def apply_filter(self):
+        query = self.entry_filter.get()
+        # the filter searches the whole model, so clones are expanded first
+        self.document.expand_all()
+        matches = self.tree_filter.apply(query)
+        self.filter_status.config(text=f"{matches} matching node(s)" if query.strip() else "")
+
+    def clear_filter(self):
+        if self.tree_filter.active:
+            self.tree_filter.clear()
+        self.filter_status.config(text="")
+
+    # -------------------------------------------------
+    # Subtree statistics (values come from the model, only
+    # items that are visible or on an edited path get updated)
+    # -------------------------------------------------
+    def on_show_stats_changed(self):
+        if self.show_stats_var.get():
+            self.tree.configure(displaycolumns=STATS_COLUMNS)
+            self._refresh_visible_stats()
+        else:
+            self.tree.configure(displaycolumns=())
+
+    def _on_tree_open(self, event=None):
+        iid = self.tree.focus()
+        self.document.expand(iid)
+        if iid in self.model:
+            self._refresh_stats(c.iid for c in self.model.nodes[iid].children)
+
+    def _refresh_stats(self, iids):
+        if not self.show_stats_var.get():
+            return
+        for iid in iids:
+            self.tree.item(iid, values=self.model.stats(iid))
+
+    def _refresh_visible_stats(self):
+        if not self.show_stats_var.get():
+            return
+        stack = [self.model.root]
+        while stack:
+            node = stack.pop()
+            self._refresh_stats(c.iid for c in node.children)
+            stack.extend(c for c in node.children if c.children and self.tree.item(c.iid, "open"))
 
     # -------------------------------------------------
     # Load / Save methods
     # -------------------------------------------------
     def load_tree(self):
-        if self.datasource_var.get() == "Files":
-            new_ds = self.file_store.load_tree(self.config_data.data_source)
-        else:
-            new_ds = self.ws_store.load_tree(self)
+        if self.datasource_var.get() != "Files":
+            # fetched in the background, the tree is replaced when it arrives
+            doc = self.document
+            self.ws_store.load_tree(self, on_loaded=lambda new_ds: self._on_service_loaded(doc, new_ds))
+            return
+        self.clear_filter()
+        # the tree may be replaced right away: stop a running bulk step first
+        self.document.expander.cancel()
+        new_ds = self.file_store.load_tree(self.config_data.data_source)
+        self._refresh_visible_stats()
         if new_ds:
-            self.config_data.data_source = new_ds
-            self.entry_data_source.config(state="normal")
-            self.entry_data_source.delete(0, tk.END)
-            self.entry_data_source.insert(0, new_ds)
-            self.entry_data_source.config(state="disabled")
+            self.document.bulk.clear_undo()
+            self._set_data_source(new_ds)
+
+    def _before_service_load(self, doc):
+        """The tab's tree is about to be replaced by XML from the web service."""
+        doc.expander.cancel()
+        doc.bulk.clear_undo()
+        doc.file_store.unwatch()
+        if doc is self._active_document:
+            self.clear_filter()
+        elif doc.tree_filter.active:
+            doc.tree_filter.clear()
+
+    def _on_service_loaded(self, doc, new_ds: str):
+        self._set_data_source(new_ds, doc)
+        if doc is self._active_document:
+            self._refresh_visible_stats()
+
+    def _set_data_source(self, new_ds: str, doc: TreeDocument = None):
+        doc = doc or self.document
+        doc.data_source = new_ds
+        doc.title = os.path.basename(new_ds) or new_ds
+        self.notebook.tab(doc.frame, text=doc.title)
+        if doc is self.document:
+            self._show_data_source(new_ds)
+
+    def _show_data_source(self, new_ds: str):
+        self.config_data.data_source = new_ds
+        self.entry_data_source.config(state="normal")
+        self.entry_data_source.delete(0, tk.END)
+        self.entry_data_source.insert(0, new_ds)
+        self.entry_data_source.config(state="disabled")
+
+    def _on_external_change(self, doc, filename):
+        doc.expander.cancel()   # the patch must not run into a bulk step
+        if doc is self._active_document:
+            self.clear_filter()
+
+    def _on_file_reloaded(self, doc, filename, touched):
+        if doc is self._active_document:
+            self.expand_status.config(text=f"Reloaded {os.path.basename(filename)}: {touched} item(s) changed")
+            self._refresh_visible_stats()
 
     def save_tree(self):
         if self.datasource_var.get() == "Files":
@@ -222,20 +756,52 @@ class MyPythonTreeApp(tk.Tk):
         if self.datasource_var.get() == "Files":
             new_ds = self.file_store.save_as_tree(self.config_data.data_source)
         else:
-            new_ds = self.ws_store.save_as_tree(self)
+            doc = self.document
+            new_ds = self.ws_store.save_as_tree(self, on_saved=lambda ds: self._on_service_saved_as(doc, ds))
+            if new_ds:
+                self.file_store.unwatch()
         if new_ds:
-            self.config_data.data_source = new_ds
-            self.entry_data_source.config(state="normal")
-            self.entry_data_source.delete(0, tk.END)
-            self.entry_data_source.insert(0, new_ds)
-            self.entry_data_source.config(state="disabled")
+            self._set_data_source(new_ds)
+
+    def _on_service_saved_as(self, doc, new_ds: str):
+        """A Save As to the web service finished after its dialog was closed: the new entry is the data source."""
+        if str(doc.frame) not in self.documents:
+            return   # the tab was closed meanwhile
+        doc.file_store.unwatch()
+        self._set_data_source(new_ds, doc)
+
+    def export_tree(self):
+        """Writes the current tree as JSON, CSV outline, indented text, XML or tree snapshot (by file extension)."""
+        try:
+            filename = filedialog.asksaveasfilename(
+                title="Export Tree...",
+                initialdir=self._initial_dir(),
+                defaultextension=".json",
+                filetypes=[(cls.description, f"*.{name}") for name, cls in EXPORTERS.items()]
+            )
+        except Exception as e:
+            messagebox.showerror("Dialog Error", f"Could not open save dialog:\n{e}")
+            return
+        if not filename:
+            return
+        try:
+            count = export_model(self.model, filename)
+        except (OSError, ValueError) as ex:
+            if self.show_msg_var.get():
+                messagebox.showerror("Export Error", f"Error exporting tree view data:\n{ex}")
+            else:
+                print(f"Export Error: {ex}")
+            return
+        if self.show_msg_var.get():
+            messagebox.showinfo("Export Successful", f"{count} nodes exported to file:\n{filename}")
 
     # -------------------------------------------------
     # In-place editing of nodes
     # -------------------------------------------------
     def _on_double_click(self, event):
         item = self.tree.identify_row(event.y)
-        if not item:
+        # the "..." placeholder of a lazy clone is not a node
+        if not item or item not in self.model or self.document.loading:
             return
         x, y, w, h = self.tree.bbox(item, "#0")
         entry = tk.Entry(self.tree)
@@ -244,8 +810,13 @@ class MyPythonTreeApp(tk.Tk):
         entry.focus()
 
         def save(evt=None):
-            self.tree.item(item, text=entry.get())
+            text = self.labels.intern(entry.get())
             entry.destroy()
+            if item not in self.model:
+                return   # deleted while it was edited
+            self.document.expander.cancel()
+            self.tree.item(item, text=text)
+            self.model.rename(item, text)
 
         entry.bind("<Return>", save)
         entry.bind("<FocusOut>", lambda e: entry.destroy())
@@ -255,7 +826,7 @@ class MyPythonTreeApp(tk.Tk):
     # -------------------------------------------------
     def _on_drag_start(self, event):
         item = self.tree.identify_row(event.y)
-        if not item:
+        if not item or self.document.loading:
             self._drag_item = None
             return
         self._drag_item = item
@@ -317,27 +888,32 @@ class MyPythonTreeApp(tk.Tk):
         self._drag_item = None
 
     def _move_subtree(self, source, target, position="child"):
-        def recurse(iid):
-            return (self.tree.item(iid, "text"),
-                    [recurse(c) for c in self.tree.get_children(iid)])
-
-        data = recurse(source)
-        self.tree.delete(source)
-
-        def build(parent, node):
-            txt, children = node
-            if position == "before":
-                index = self.tree.index(target)
-                new_iid = self.tree.insert(self.tree.parent(target), index, text=txt)
-            elif position == "after":
-                index = self.tree.index(target) + 1
-                new_iid = self.tree.insert(self.tree.parent(target), index, text=txt)
-            else:
-                new_iid = self.tree.insert(target, "end", text=txt)
-            for c in children:
-                build(new_iid, c)
+        if source not in self.model or target not in self.model:
+            return   # a lazy clone's placeholder
+        # a node cannot be dropped into its own subtree
+        node = target
+        while node:
+            if node == source:
+                return
+            node = self.tree.parent(node)
+
+        self.clear_filter()
+        self.document.expander.cancel()
+        if position in ("before", "after"):
+            parent = self.tree.parent(target)
+            self.document.expand(parent)   # model.move() needs an expanded parent
+            index = self.tree.index(target) + (position == "after")
+        else:
+            self.document.expand(target)
+            parent, index = target, len(self.tree.get_children(target))
 
-        build(None, data)
+        # Treeview.move keeps item ids (and the whole subtree) intact
+        old_parent = self.tree.parent(source)
+        self.tree.move(source, parent, index)
+        self.model.move(source, parent, index)
+        if old_parent in self.model:
+            self._refresh_stats(self.model.path(old_parent))
+        self._refresh_stats(self.model.path(source))
 
     # -------------------------------------------------
     # Other event handlers
@@ -347,8 +923,9 @@ class MyPythonTreeApp(tk.Tk):
 
     def on_show_msg_changed(self):
         val = self.show_msg_var.get()
-        self.file_store.show_message_boxes = val
-        self.ws_store.show_message_boxes = val
+        for doc in self.documents.values():
+            doc.file_store.show_message_boxes = val
+            doc.ws_store.show_message_boxes = val
 
     def on_button1_click(self):
         print("Button1 clicked.")
@@ -363,6 +940,7 @@ class MyPythonTreeApp(tk.Tk):
         # Persist settings before closing
         self.config_data.data_source = self.entry_data_source.get()
         self.config_data.show_message_boxes = self.show_msg_var.get()
+        self.config_data.show_subtree_stats = self.show_stats_var.get()
         self.config_data.webservice_url = self.entry_ws.get().rstrip('/')
         self.config_data.datasource_option = self.datasource_var.get()
 
@@ -378,6 +956,10 @@ class MyPythonTreeApp(tk.Tk):
         self.config_data.window_height = h
 
         self.config_data.save()
+        # let background saves finish before the process goes away
+        self.async_runner.close()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False, cancel_futures=True)
         self.destroy()
 
 if __name__ == "__main__":
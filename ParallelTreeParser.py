@@ -0,0 +1,214 @@
+import mmap
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import Future
+from CompactTree import CompactTree, is_snapshot, parse_file
+from LabelInterner import LabelInterner
+
+# Root start tag after an optional BOM and XML declaration (no DOCTYPE, no comments)
+PROLOG = re.compile(rb'\A(?:\xef\xbb\xbf)?\s*(?:<\?xml([^>]*)\?>)?\s*<([A-Za-z_][\w.-]*)(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+ENCODING = re.compile(rb'encoding\s*=\s*["\']([^"\']*)["\']')
+
+# Open <Node>s a range is first assumed to be nested in (a deeper cut is retried)
+NESTING = 256
+FEED_BYTES = 16 * 1024
+
+class ParallelTreeParser:
+    """
+    Parses one large <TreeView> file in several worker processes.
+
+    A byte-level pre-scan checks the prolog and cuts the content of the
+    root element into ranges that start at a tag ('<' never occurs inside
+    attribute values or text, and files with comments, CDATA sections or
+    processing instructions in the body are parsed serially). The ranges
+    do not have to start at top-level nodes: every worker parses its range
+    as if it were nested in enough open <Node>s (parse_range), and merge()
+    attaches the children of those open ancestors to the nodes from the
+    earlier ranges. Small files, single-worker pools and anything the
+    ranges cannot be parsed from go through the serial parse_file.
+    """
+
+    MIN_BYTES = 16 * 1024 * 1024       # smaller files are parsed in one piece
+    MIN_RANGE_BYTES = 4 * 1024 * 1024
+    RANGES_PER_WORKER = 2              # some slack for ranges that parse slower
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, pool=None, workers: int = 1):
+        self.pool = pool          # ProcessPoolExecutor, None = parse in this process
+        self.workers = workers
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def submit(self, filename: str) -> Future:
+        """Starts parse(filename) in the background; small files go straight to the pool."""
+        if self.pool is not None and not self._worth_splitting(filename):
+            return self.pool.submit(parse_file, filename)
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.parse(filename))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def parse(self, filename: str) -> CompactTree:
+        """The whole file as CompactTree, parsed in ranges where that pays off."""
+        ranges = self.split(filename) if self._worth_splitting(filename) else None
+        if ranges is None or len(ranges) < 2:
+            return self._serial(filename)
+        try:
+            if self.pool is None:
+                results = [parse_range(filename, start, end) for start, end in ranges]
+            else:
+                futures = [self.pool.submit(parse_range, filename, start, end) for start, end in ranges]
+                results = [f.result() for f in futures]
+            return merge(results)
+        except (ValueError, SyntaxError):   # ET.ParseError is a SyntaxError
+            # malformed or unsupported content: the serial parser finds and reports it
+            return self._serial(filename)
+
+    def split(self, filename: str, parts: int = None) -> list | None:
+        """
+        Pre-scan: (start, end) byte ranges covering the content of the root
+        element, or None if the file has to be parsed in one piece.
+        """
+        size = os.path.getsize(filename)
+        if parts is None:
+            parts = max(1, min(self.workers * self.RANGES_PER_WORKER, size // self.MIN_RANGE_BYTES))
+        with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            body = scan_body(buf)
+            if body is None:
+                return None
+            start, end = body
+            cuts = [start]
+            for i in range(1, parts):
+                pos = buf.find(b"<", start + (end - start) * i // parts, end)
+                if pos > cuts[-1]:
+                    cuts.append(pos)
+            cuts.append(end)
+        return list(zip(cuts, cuts[1:]))
+
+    # -------------------------------------------------
+    # Private helper methods
+    # -------------------------------------------------
+    def _worth_splitting(self, filename: str) -> bool:
+        # snapshots load faster than ranges could be shipped between processes
+        return self.workers > 1 and os.path.getsize(filename) >= self.MIN_BYTES and not is_snapshot(filename)
+
+    def _serial(self, filename: str) -> CompactTree:
+        if self.pool is None:
+            return parse_file(filename)
+        return self.pool.submit(parse_file, filename).result()
+
+
+# -------------------------------------------------
+# Pre-scan, worker entry point and merge
+# -------------------------------------------------
+def scan_body(buf) -> tuple | None:
+    """
+    (start, end) of the root element's content in buf, or None if the
+    document cannot be cut at arbitrary tags: a DOCTYPE (entities), an
+    encoding other than UTF-8, an empty root, or comments, CDATA sections
+    or processing instructions anywhere in the body.
+    """
+    m = PROLOG.match(buf[:64 * 1024])
+    if m is None or m.group(0).endswith(b"/>"):
+        return None
+    declaration, root = m.group(1), m.group(2)
+    if declaration:
+        enc = ENCODING.search(declaration)
+        if enc and enc.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+            return None
+    start = m.end()
+    end = buf.rfind(b"</")
+    if end < start or not re.fullmatch(rb"</" + re.escape(root) + rb"\s*>\s*", buf[end:]):
+        return None
+    if buf.find(b"<!", start, end) >= 0 or buf.find(b"<?", start, end) >= 0:
+        return None
+    return start, end
+
+def parse_range(filename: str, start: int, end: int) -> tuple:
+    """
+    Worker-process entry point: parses bytes [start, end) of filename, a run
+    of complete tags from inside the root element, and returns
+    (labels, counts, head, tail):
+      labels, counts  the nodes starting in the range, in document order;
+                      counts only include children inside the range
+      head            children added to the nodes that were open when the range
+                      started, innermost first; len(head) - 1 of them are closed
+      tail            indices of the nodes still open at the end, outermost first
+    """
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    try:
+        return _parse_nested(data, NESTING)
+    except ET.ParseError:
+        # closes more ancestors than assumed (or is malformed): every end tag could close one
+        return _parse_nested(data, data.count(b"</"))
+
+def _parse_nested(data: bytes, nesting: int) -> tuple:
+    """parse_range() on data as if it were nested in that many open <Node>s."""
+    parser = ET.XMLPullParser(("start", "end"))
+    parser.feed(b"<TreeView>" + b"<Node>" * nesting)
+    elems = [elem for _, elem in parser.read_events()]
+    labels, counts = [], array("I")
+    head = [0]
+    open_nodes = []
+    intern = LabelInterner().intern
+    view = memoryview(data)
+    for pos in range(0, len(data), FEED_BYTES):
+        parser.feed(view[pos:pos + FEED_BYTES])
+        for event, elem in parser.read_events():
+            if event == "start":
+                if elem.tag != "Node":
+                    raise ValueError(f"<{elem.tag}> cannot be parsed in ranges")
+                if open_nodes:
+                    counts[open_nodes[-1]] += 1
+                else:
+                    head[-1] += 1
+                open_nodes.append(len(labels))
+                labels.append(intern(elem.get("Text", "")))
+                counts.append(0)
+                elems.append(elem)
+            else:
+                elems.pop()
+                del elems[-1][-1]  # a finished element is always its parent's last child
+                if open_nodes:
+                    open_nodes.pop()
+                else:
+                    head.append(0)
+    return labels, counts, head, open_nodes
+
+def merge(results) -> CompactTree:
+    """Joins parse_range() results of consecutive ranges into one CompactTree."""
+    tree = CompactTree()
+    ancestors = [-1]   # nodes open at the current range boundary, -1 = the top level
+    for labels, counts, head, tail in results:
+        if len(head) > len(ancestors):
+            raise ValueError("range closes more elements than are open")
+        for level, added in enumerate(head):
+            parent = ancestors[-1 - level]
+            if parent < 0:
+                tree.top += added
+            else:
+                tree.counts[parent] += added
+        del ancestors[len(ancestors) - len(head) + 1:]
+        base = len(tree.labels)
+        ancestors.extend(base + k for k in tail)
+        tree.labels.extend(labels)
+        tree.counts.extend(counts)
+    if len(ancestors) != 1:
+        raise ValueError("unclosed elements at the end of the document")
+    return tree
@@ -0,0 +1,270 @@
+import asyncio
+import http.client
+import random
+import socket
+import threading
+import time
+import urllib.error
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+class RequestNotSent(ConnectionError):
+    """The connection failed before any part of the request was sent; any request may be repeated."""
+
+
+class EndpointPolicy:
+    """
+    How one endpoint is called. timeout bounds a single attempt, deadline
+    the whole call including retries and backoff. Only idempotent endpoints
+    are retried after errors the server may have seen; hedge sends a second
+    request when the first takes longer than the endpoint's p95.
+    """
+
+    def __init__(self, timeout: float, deadline: float, retries: int = 0,
+                 idempotent: bool = False, hedge: bool = False):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.idempotent = idempotent
+        self.hedge = hedge
+
+
+class RequestPolicy:
+    """
+    Deadlines, retries with exponential backoff and full jitter, and hedged
+    reads for the web-service endpoints, for blocking calls (call) and for
+    coroutines (call_async). An attempt is a callable taking the timeout of
+    that attempt. Saves are not idempotent: they are repeated only when the
+    request was provably not sent, or when reconcile() shows that a failed
+    attempt did not change anything on the server.
+    One policy may be shared by several stores, threads and event loops.
+    """
+
+    BACKOFF_BASE = 0.1        # seconds before the first retry (times 2 per retry, jittered)
+    BACKOFF_MAX = 2.0
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_SAMPLES = 20    # until then HEDGE_DEFAULT_DELAY is used
+    HEDGE_DEFAULT_DELAY = 0.5
+    LATENCY_WINDOW = 200      # recent successful attempts kept per endpoint
+
+    ENDPOINTS = {
+        "get_all_xml_info":      EndpointPolicy(timeout=10, deadline=30, retries=3, idempotent=True),
+        "get_xml_by_id":         EndpointPolicy(timeout=30, deadline=60, retries=3, idempotent=True, hedge=True),
+        "delete_xml_by_id":      EndpointPolicy(timeout=10, deadline=30, retries=3, idempotent=True),
+        "update_xml_by_id":      EndpointPolicy(timeout=30, deadline=60, retries=2),
+        "update_xml_name_by_id": EndpointPolicy(timeout=10, deadline=30, retries=2),
+        "create_new_xml":        EndpointPolicy(timeout=30, deadline=60, retries=2),
+    }
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, endpoints: dict = None, hedge_reads: bool = True, seed: int = None):
+        self.endpoints = dict(self.ENDPOINTS, **(endpoints or {}))
+        self.hedge_reads = hedge_reads
+        self.stats = {"attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "reconciled": 0}
+        self._random = random.Random(seed)
+        self._latencies = {}   # endpoint -> deque of seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def plain(cls) -> "RequestPolicy":
+        """One attempt per call and practically no timeout: the behaviour before policies (for comparisons)."""
+        endpoints = {name: EndpointPolicy(timeout=3600, deadline=3600, idempotent=p.idempotent)
+                     for name, p in cls.ENDPOINTS.items()}
+        return cls(endpoints, hedge_reads=False)
+
+    # -------------------------------------------------
+    # Blocking calls
+    # -------------------------------------------------
+    def call(self, endpoint: str, attempt, reconcile=None, timeout: float = None, hedge: bool = True):
+        """
+        Runs attempt(timeout) under the endpoint's policy and returns its
+        result. reconcile() -> (applied, result) is asked after an ambiguous
+        failure of a non-idempotent call; without it such calls are not
+        repeated. Raises the last error once retries or the deadline run out.
+        hedge=False keeps the call on the calling thread (hedges start threads
+        of their own, outside any pool the caller uses to limit concurrency).
+        """
+        policy = self.endpoints[endpoint]
+        deadline = time.monotonic() + policy.deadline
+        tries = 0
+        while True:
+            limit = min(timeout or policy.timeout, deadline - time.monotonic())
+            try:
+                if policy.hedge and self.hedge_reads and hedge:
+                    return self._hedged(endpoint, attempt, limit)
+                return self._timed(endpoint, attempt, limit)
+            except Exception as error:
+                delay = self._retry_delay(error, policy, tries, deadline, reconcile is not None)
+                if delay is None:
+                    raise
+                if not policy.idempotent and not not_sent(error):
+                    applied, result = self._reconcile(error, reconcile)
+                    if applied:
+                        return result
+                self._count("retries")
+                time.sleep(delay)
+                tries += 1
+
+    def _timed(self, endpoint: str, attempt, timeout: float):
+        self._count("attempts")
+        start = time.monotonic()
+        result = attempt(timeout)
+        self._record(endpoint, time.monotonic() - start)
+        return result
+
+    def _hedged(self, endpoint: str, attempt, timeout: float):
+        """Starts a second attempt if the first one is slower than the p95; the first success wins."""
+        first = self._in_thread(self._timed, endpoint, attempt, timeout)
+        delay = self.hedge_delay(endpoint)
+        if wait([first], timeout=delay).done:
+            return first.result()
+        self._count("hedges")
+        second = self._in_thread(self._timed, endpoint, attempt, max(timeout - delay, 0.01))
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @staticmethod
+    def _in_thread(func, *args) -> Future:
+        """A daemon thread per attempt: an abandoned hedge must not keep the app from exiting."""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedged-request", daemon=True).start()
+        return future
+
+    def _reconcile(self, error, reconcile) -> tuple:
+        try:
+            applied, result = reconcile()
+        except Exception:
+            raise error from None  # state unknown: report the original failure
+        if applied:
+            self._count("reconciled")
+        return applied, result
+
+    # -------------------------------------------------
+    # Coroutines
+    # -------------------------------------------------
+    async def call_async(self, endpoint: str, attempt, reconcile=None, timeout: float = None):
+        """call() for coroutines: attempt(timeout) and reconcile() return awaitables."""
+        policy = self.endpoints[endpoint]
+        deadline = time.monotonic() + policy.deadline
+        tries = 0
+        while True:
+            limit = min(timeout or policy.timeout, deadline - time.monotonic())
+            try:
+                if policy.hedge and self.hedge_reads:
+                    return await self._hedged_async(endpoint, attempt, limit)
+                return await self._timed_async(endpoint, attempt, limit)
+            except Exception as error:
+                delay = self._retry_delay(error, policy, tries, deadline, reconcile is not None)
+                if delay is None:
+                    raise
+                if not policy.idempotent and not not_sent(error):
+                    try:
+                        applied, result = await reconcile()
+                    except Exception:
+                        raise error from None
+                    if applied:
+                        self._count("reconciled")
+                        return result
+                self._count("retries")
+                await asyncio.sleep(delay)
+                tries += 1
+
+    async def _timed_async(self, endpoint: str, attempt, timeout: float):
+        self._count("attempts")
+        start = time.monotonic()
+        result = await asyncio.wait_for(attempt(timeout), timeout)
+        self._record(endpoint, time.monotonic() - start)
+        return result
+
+    async def _hedged_async(self, endpoint: str, attempt, timeout: float):
+        first = asyncio.ensure_future(self._timed_async(endpoint, attempt, timeout))
+        tasks = {first}
+        try:
+            delay = self.hedge_delay(endpoint)
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            self._count("hedges")
+            second = asyncio.ensure_future(self._timed_async(endpoint, attempt, max(timeout - delay, 0.01)))
+            tasks.add(second)
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()  # the slower request is dropped
+
+    # -------------------------------------------------
+    # Retry decisions and statistics
+    # -------------------------------------------------
+    def _retry_delay(self, error, policy: EndpointPolicy, tries: int, deadline: float,
+                     can_reconcile: bool) -> float | None:
+        """Backoff before the next attempt, or None if the error is final."""
+        if tries >= policy.retries:
+            return None
+        if not not_sent(error):
+            if not self.retryable(error) or not (policy.idempotent or can_reconcile):
+                return None
+        delay = self._random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** tries))
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def retryable(self, error) -> bool:
+        """Transient failures: 429/5xx responses, connection problems and timeouts."""
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in self.RETRY_STATUS
+        return isinstance(error, (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                                  http.client.HTTPException))
+
+    def hedge_delay(self, endpoint: str) -> float:
+        """The p95 of recent attempts: most requests finish before a hedge is sent."""
+        with self._lock:
+            values = sorted(self._latencies.get(endpoint, ()))
+        if len(values) < self.HEDGE_MIN_SAMPLES:
+            return self.HEDGE_DEFAULT_DELAY
+        return values[max(0, -(-len(values) * self.HEDGE_PERCENTILE // 100) - 1)]
+
+    def _record(self, endpoint: str, seconds: float):
+        with self._lock:
+            window = self._latencies.get(endpoint)
+            if window is None:
+                window = self._latencies[endpoint] = deque(maxlen=self.LATENCY_WINDOW)
+            window.append(seconds)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def not_sent(error) -> bool:
+    """True if urlopen() failed before the request left (refused connection, unknown host)."""
+    if isinstance(error, RequestNotSent):
+        return True
+    return (isinstance(error, urllib.error.URLError) and not isinstance(error, urllib.error.HTTPError)
+            and isinstance(error.reason, (ConnectionRefusedError, socket.gaierror)))
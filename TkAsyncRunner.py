@@ -0,0 +1,97 @@
+import asyncio
+import queue
+import threading
+import concurrent.futures
+
+class TkAsyncRunner:
+    """
+    Runs an asyncio event loop next to Tk's mainloop. Coroutines execute on
+    a background thread; their results are handed back to the Tk thread by
+    after() polling, so callbacks may touch widgets. Requests can be grouped
+    by an owner (e.g. a dialog) and cancelled together when it closes.
+    """
+
+    POLL_MS = 20
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, widget):
+        self.widget = widget
+        self.loop = asyncio.new_event_loop()
+        self._done = queue.Queue()
+        self._owners = {}   # owner -> set of running futures
+        self._poll_job = None
+        self._thread = threading.Thread(target=self._run_loop, name="tk-asyncio", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # -------------------------------------------------
+    # Public interface (call from the Tk thread)
+    # -------------------------------------------------
+    def submit(self, coro, on_done=None, on_error=None, owner=None) -> concurrent.futures.Future:
+        """
+        Schedules coro on the loop. on_done(result) or on_error(exception) is
+        called on the Tk thread afterwards, unless the request was cancelled.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self._owners.setdefault(owner, set()).add(future)
+        future.add_done_callback(lambda f: self._done.put((f, on_done, on_error, owner)))
+        self._schedule_poll()
+        return future
+
+    def cancel(self, owner):
+        """Cancels every request submitted for owner; their callbacks never run."""
+        for future in self._owners.pop(owner, ()):
+            future.cancel()
+
+    @property
+    def busy(self) -> bool:
+        return any(self._owners.values())
+
+    def close(self, timeout: float = 5.0):
+        """Waits (up to timeout) for requests still in flight, then stops the loop."""
+        running = [f for futures in self._owners.values() for f in futures]
+        if running:
+            concurrent.futures.wait(running, timeout=timeout)
+        if self._poll_job:
+            self.widget.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    # -------------------------------------------------
+    # Delivery of results on the Tk thread
+    # -------------------------------------------------
+    def _schedule_poll(self):
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        while True:
+            try:
+                future, on_done, on_error, owner = self._done.get_nowait()
+            except queue.Empty:
+                break
+            futures = self._owners.get(owner)
+            if futures is None or future not in futures:
+                continue  # cancelled together with its owner
+            futures.discard(future)
+            if not futures:
+                del self._owners[owner]
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    on_done(future.result())
+            elif on_error:
+                on_error(error)
+            else:
+                print(f"[Debug] Async request failed: {error}")
+        if self._owners:
+            self._schedule_poll()
@@ -0,0 +1,470 @@
+"""
+Headless benchmarks for MyPythonTreeApp.
+
+    python3 TreeBenchmark.py generate big.xml --nodes 1000000
+    python3 TreeBenchmark.py memory Nodes01.xml Nodes02.xml Nodes03.xml big.xml
+    python3 TreeBenchmark.py filter big.xml "Item 12"
+    python3 TreeBenchmark.py stats big.xml
+    python3 TreeBenchmark.py parse a.xml b.xml c.xml d.xml
+    python3 TreeBenchmark.py split big.xml --workers 1 2 4 8 16
+    python3 TreeBenchmark.py expand big.xml --depth 3
+    python3 TreeBenchmark.py snapshot Nodes01.xml Nodes02.xml Nodes03.xml big.xml
+    python3 TreeBenchmark.py bulk big.xml --count 50000
+
+Benchmarks that need a Treeview are skipped when no display is available.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import quoteattr
+from BulkOperations import BulkOperations
+from CompactTree import CompactTree, parse_file
+from LabelInterner import LabelInterner
+from ParallelTreeParser import ParallelTreeParser
+from TreeModel import TreeModel
+from TreeFilter import TreeFilter
+from TreeExpander import TreeExpander
+
+# Labels that real trees repeat at every level
+VOCABULARY = ["New Node", "Settings", "Input", "Output", "Parameters", "Options",
+              "Documents", "Images", "Archive", "Misc", "Config", "Data",
+              "Reports", "Drafts", "Backup", "Users", "Groups", "Logs"]
+
+# -------------------------------------------------
+# Synthetic trees
+# -------------------------------------------------
+def generate_tree(filename: str, nodes: int, fanout: int = 8, unique: float = 0.2, seed: int = 1):
+    """
+    Writes a <TreeView> file with the given number of nodes in C# layout.
+    A fraction `unique` of the labels are unique, the rest come from VOCABULARY.
+    """
+    rnd = random.Random(seed)
+    counter = [0]
+
+    def label():
+        counter[0] += 1
+        if rnd.random() < unique:
+            return f"Item {counter[0]}"
+        return rnd.choice(VOCABULARY)
+
+    def write(out, budget):
+        # one node plus `budget - 1` descendants split evenly over up to `fanout` children
+        out.write(f"<Node Text={quoteattr(label())}")
+        rest = budget - 1
+        if not rest:
+            out.write(" />")
+            return
+        out.write(">")
+        count = min(fanout, rest)
+        for i in range(count):
+            share = rest // count + (1 if i < rest % count else 0)
+            write(out, share)
+        out.write("</Node>")
+
+    with open(filename, "w", encoding="utf-8") as out:
+        out.write("<?xml version='1.0' encoding='utf-8'?>\n<TreeView>")
+        top = min(fanout, nodes)
+        for i in range(top):
+            write(out, nodes // top + (1 if i < nodes % top else 0))
+        out.write("</TreeView>")
+
+def iter_labels(filename: str):
+    """Streams the Text attribute of every <Node> without keeping the element tree."""
+    stack = []
+    for event, elem in ET.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if elem.tag == "Node":
+                yield elem.get("Text", "")
+        else:
+            stack.pop()
+            if stack:
+                del stack[-1][-1]  # a finished element is always its parent's last child
+
+def load_model(filename: str, labels: LabelInterner = None) -> TreeModel:
+    """Builds a TreeModel straight from a file, numbering nodes like the Treeview does."""
+    labels = labels if labels is not None else LabelInterner()
+    model = TreeModel()
+    parents = [""]
+    count = 0
+    for event, elem in ET.iterparse(filename, events=("start", "end")):
+        if elem.tag != "Node":
+            continue
+        if event == "start":
+            count += 1
+            iid = f"I{count:03X}"
+            model.add(iid, parents[-1], labels.intern(elem.get("Text", "")))
+            parents.append(iid)
+        else:
+            parents.pop()
+            elem.clear()
+    return model
+
+def make_treeview(model: TreeModel):
+    """Returns (root, treeview) filled from model, or None without a display."""
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"  (widget benchmark skipped: {e}; without a display run it under xvfb-run)")
+        return None
+    root.withdraw()
+    tv = ttk.Treeview(root)
+    for node in model.walk():
+        tv.insert(node.parent.iid, "end", iid=node.iid, text=node.text)
+    return root, tv
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+# -------------------------------------------------
+# Benchmarks
+# -------------------------------------------------
+class _PlainLabels:
+    """Stand-in for LabelInterner that keeps every label as parsed (the behaviour before interning)."""
+
+    @staticmethod
+    def intern(text: str) -> str:
+        return text
+
+def bench_memory(filenames: list):
+    """
+    Bytes per node retained by the TreeModel the app keeps next to the
+    Treeview, with plain and with interned labels. Tk holds its own copy of
+    every label in Tcl objects; that part cannot be shared and is not measured.
+    """
+    print(f"{'file':<24}{'nodes':>10}{'distinct':>10}{'plain B/node':>14}{'interned B/node':>17}{'saved':>8}")
+    for filename in filenames:
+        results = []
+        for labels in (_PlainLabels(), LabelInterner()):
+            tracemalloc.start()
+            model = load_model(filename, labels)
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append((len(model), size))
+            distinct = len({node.text for node in model.walk()})
+            del model
+        (nodes, plain), (_, interned) = results
+        nodes = max(nodes, 1)
+        print(f"{filename:<24}{nodes:>10}{distinct:>10}{plain / nodes:>14.1f}"
+              f"{interned / nodes:>17.1f}{1 - interned / max(plain, 1):>8.0%}")
+
+def bench_filter(filename: str, queries: list):
+    """Filter latency: model pass alone, then detach/reattach on a real Treeview."""
+    model, secs = timed(load_model, filename)
+    print(f"{filename}: {len(model)} nodes, model built in {secs:.2f}s")
+    tree_filter = TreeFilter(None, model)
+    for query in queries:
+        (keep, _, matches), secs = timed(tree_filter.select, query)
+        print(f"  select {query!r:<16} {matches:>9} matches {len(keep):>9} kept   {secs * 1000:9.1f} ms")
+
+    widget = make_treeview(model)
+    if widget is None:
+        return
+    root, tv = widget
+    tree_filter.treeview = tv
+    for query in queries:
+        _, apply_secs = timed(tree_filter.apply, query)
+        root.update_idletasks()
+        _, clear_secs = timed(tree_filter.clear)
+        root.update_idletasks()
+        print(f"  apply  {query!r:<16} {apply_secs * 1000:9.1f} ms   clear {clear_secs * 1000:9.1f} ms")
+    root.destroy()
+
+def bench_stats(filename: str, edits: int = 10000):
+    """Cost of keeping subtree aggregates current, per edit vs. one full walk."""
+    model, secs = timed(load_model, filename)
+    print(f"{filename}: {len(model)} nodes, height {model.root.height}, loaded in {secs:.2f}s")
+    rnd = random.Random(1)
+    ids = list(model.nodes)[1:]
+
+    def adds():
+        for i in range(edits):
+            model.add(f"B{i}", rnd.choice(ids), "New Node")
+
+    def moves():
+        for i in range(edits):
+            model.move(f"B{i}", rnd.choice(ids[:1000]), 0)
+
+    def removes():
+        for i in range(edits):
+            model.remove(f"B{i}")
+
+    for name, func in (("add", adds), ("move", moves), ("remove", removes)):
+        _, secs = timed(func)
+        print(f"  {name:<7} {secs / edits * 1e6:8.1f} us/edit")
+    _, secs = timed(lambda: sum(1 for _ in model.walk()))
+    print(f"  full walk (what every query cost before) {secs * 1000:.0f} ms")
+
+def bench_parse(filenames: list, workers: int = None):
+    """Opening several files: serial parse vs. a process pool (what "Open in Tabs..." uses)."""
+    workers = workers or min(len(filenames), os.cpu_count() or 1)
+    trees, serial = timed(lambda: [parse_file(f) for f in filenames])
+    nodes = sum(len(t) for t in trees)
+    pickled = sum(len(pickle.dumps(t)) for t in trees)
+    print(f"{len(filenames)} files, {nodes} nodes, {pickled / max(nodes, 1):.1f} pickled B/node")
+    print(f"  serial            {serial:8.2f} s")
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        _, warmup = timed(lambda: list(pool.map(abs, range(workers))))
+        _, parallel = timed(lambda: list(pool.map(parse_file, filenames)))
+    print(f"  {workers} processes       {parallel:8.2f} s   (+{warmup:.2f} s pool start)   {serial / parallel:.1f}x")
+
+    # memory kept by an unloaded tab: the CompactTree instead of the TreeModel
+    model = load_model(filenames[0], LabelInterner())
+    tracemalloc.start()
+    compact = CompactTree.from_model(model)
+    compact.iids = None
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  unloaded tab keeps {size / max(len(compact), 1):.1f} B/node beyond the shared labels")
+
+def bench_split(filename: str, worker_counts: list):
+    """One large file: serial parse vs. ranges parsed by 1..n processes (ParallelTreeParser)."""
+    reference, serial = timed(parse_file, filename)
+    size = os.path.getsize(filename)
+    print(f"{filename}: {size / 2**20:.0f} MB, {len(reference)} nodes, {os.cpu_count()} cores")
+    print(f"  serial               {serial:8.2f} s")
+    for workers in worker_counts:
+        parser = ParallelTreeParser(None, workers)
+        ranges, scan = timed(parser.split, filename) if workers > 1 else (None, 0.0)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            list(pool.map(abs, range(workers)))   # start the processes outside the timing
+            parser.pool = pool
+            tree, secs = timed(parser.parse, filename)
+        assert tree.labels == reference.labels and tree.counts == reference.counts and tree.top == reference.top
+        print(f"  {workers:>2} processes {len(ranges or ()):>3} ranges {secs:8.2f} s   "
+              f"(scan {scan * 1000:.0f} ms)   {serial / secs:.1f}x")
+
+def bench_snapshot(filenames: list):
+    """File size and load/save time of XML vs. binary tree snapshots; checks the round trip."""
+    print(f"{'file':<24}{'nodes':>10}{'XML KB':>10}{'snap KB':>10}{'load XML':>10}{'load snap':>11}"
+          f"{'save XML':>10}{'save snap':>11}   (ms)")
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_copy, snapshot = os.path.join(tmp, "tree.xml"), os.path.join(tmp, "tree.tsnap")
+        for filename in filenames:
+            tree, load_xml = timed(parse_file, filename)
+
+            def save_xml():
+                root = ET.Element("TreeView")
+                tree.write_nodes(root)
+                ET.ElementTree(root).write(xml_copy, encoding="utf-8", xml_declaration=True)
+
+            _, save_xml_secs = timed(save_xml)
+            _, save_snap = timed(tree.write_snapshot, snapshot)
+            loaded, load_snap = timed(parse_file, snapshot)
+            assert loaded.labels == tree.labels and loaded.counts == tree.counts and loaded.top == tree.top
+            print(f"{os.path.basename(filename):<24}{len(tree):>10}{os.path.getsize(xml_copy) / 1024:>10.1f}"
+                  f"{os.path.getsize(snapshot) / 1024:>10.1f}{load_xml * 1000:>10.1f}{load_snap * 1000:>11.1f}"
+                  f"{save_xml_secs * 1000:>10.1f}{save_snap * 1000:>11.1f}")
+
+class _CountingTreeview:
+    """Stand-in recording item() calls, to time the Python side of TreeExpander."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def item(self, iid, option=None, **kw):
+        self.calls += 1
+
+def bench_expand(filename: str, depth: int = 3):
+    """Expand All / Expand to Depth / Collapse All: model-side cost, lazy clones, and on a Treeview."""
+    model, secs = timed(load_model, filename)
+    print(f"{filename}: {len(model)} nodes, height {model.root.height}, loaded in {secs:.2f}s")
+    for name, work in (("expand all", lambda e: e.iter_expand()),
+                       (f"expand to depth {depth}", lambda e: e.iter_expand(depth)),
+                       ("collapse all", lambda e: e.iter_collapse())):
+        stub = _CountingTreeview()
+        expander = TreeExpander(stub, model)
+        visited, secs = timed(lambda: sum(1 for _ in work(expander)))
+        print(f"  {name:<20} {visited:>9} visited {stub.calls:>9} item() calls  {secs * 1000:8.0f} ms (model side)")
+
+    # the same tree pasted as lazy clones: only the requested levels become nodes
+    tree = CompactTree.from_model(model)
+    lazy = TreeModel()
+    ids = iter(range(1, len(tree) + 1))
+    for k in tree.child_indices(-1, tree.aggregates()[0]):
+        lazy.add(f"C{next(ids)}", "", tree.labels[k], clone=(tree, k))
+
+    def expand_clone(iid):
+        source, index = lazy.lazy[iid]
+        count = source.counts[index]
+        lazy.expand(iid, [f"C{next(ids)}" for _ in range(count)])
+
+    expander = TreeExpander(_CountingTreeview(), lazy, expand_clone)
+    _, secs = timed(lambda: sum(1 for _ in expander.iter_expand(depth)))
+    print(f"  lazy clones, depth {depth}: {len(lazy)} of {lazy.root.descendants} nodes materialized in {secs * 1000:.0f} ms")
+
+    widget = make_treeview(model)
+    if widget is None:
+        return
+    root, tv = widget
+    root.update()
+    # one blocking loop, as scripted before
+    start = time.perf_counter()
+    for node in model.walk():
+        if node.children:
+            tv.item(node.iid, open=True)
+    root.update()
+    blocking = time.perf_counter() - start
+    for node in model.walk():
+        if node.children:
+            tv.item(node.iid, open=False)
+    root.update()
+    # time-sliced: the longest gap between two event-loop rounds is the UI stall
+    expander = TreeExpander(tv, model)
+    expander.expand_all()
+    start = last = time.perf_counter()
+    longest = 0.0
+    while expander.running:
+        root.update()
+        now = time.perf_counter()
+        longest = max(longest, now - last)
+        last = now
+    sliced = time.perf_counter() - start
+    print(f"  widget expand all: blocking {blocking:.2f}s in one stall; "
+          f"sliced {sliced:.2f}s total, longest stall {longest * 1000:.0f} ms")
+    root.destroy()
+
+def bench_bulk(filename: str, count: int = 50000):
+    """A large selection deleted and moved: per-node model edits vs. the bulk ones, and the UI stall."""
+    model, secs = timed(load_model, filename)
+    rnd = random.Random(1)
+    # mostly leaves, so normalizing keeps most of the selection
+    leaves = [iid for iid, node in model.nodes.items() if iid and not node.children]
+    selection = rnd.sample(leaves, min(count, len(leaves)))
+    roots, secs = timed(BulkOperations(None, model, None, None).normalize, selection)
+    print(f"{filename}: {len(model)} nodes, {len(selection)} selected, "
+          f"{len(roots)} subtrees after normalizing ({secs * 1000:.0f} ms)")
+    # move target: the last top-level node that is not selected
+    moved = set(roots)
+    target = next(n.iid for n in reversed(model.root.children) if n.iid not in moved)
+    ancestors = set(model.path(target))
+    movable = [iid for iid in roots if iid not in ancestors]
+
+    def delete_each():
+        for iid in roots:
+            model.remove(iid)
+
+    def move_each():
+        for iid in movable:
+            model.move(iid, target)
+
+    def reload():
+        fresh = load_model(filename)
+        gc.collect()   # the replaced model is full of cycles; keep its collection out of the timings
+        return fresh
+
+    gc.collect()
+    _, delete_per_node = timed(delete_each)
+    model = reload()
+    removed, delete_bulk = timed(model.remove_many, roots)
+    _, restore = timed(model.restore, removed)
+    _, move_per_node = timed(move_each)
+    model = reload()
+    positions, move_bulk = timed(model.move_many, movable, target)
+    _, move_back = timed(model.move_back, positions)
+    print(f"  delete  one by one {delete_per_node * 1000:8.0f} ms   bulk {delete_bulk * 1000:8.0f} ms"
+          f"   undo {restore * 1000:8.0f} ms   (model side)")
+    print(f"  move    one by one {move_per_node * 1000:8.0f} ms   bulk {move_bulk * 1000:8.0f} ms"
+          f"   undo {move_back * 1000:8.0f} ms   (model side)")
+
+    widget = make_treeview(model)
+    if widget is None:
+        return
+    root, tv = widget
+    root.update()
+    expander = TreeExpander(tv, model)
+    bulk = BulkOperations(tv, model, LabelInterner(), expander)
+    for name, start in (("delete", lambda: bulk.delete(roots)), ("undo delete", bulk.undo),
+                        ("rename", lambda: bulk.rename(selection, "", "{n} {text}")), ("undo rename", bulk.undo),
+                        ("move", lambda: bulk.move(movable, target)), ("undo move", bulk.undo)):
+        # the longest gap between two event-loop rounds is the UI stall
+        begin = last = time.perf_counter()
+        start()
+        longest = 0.0
+        while expander.running:
+            root.update()
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+        print(f"  widget {name:<12} {time.perf_counter() - begin:6.2f}s total, longest stall {longest * 1000:.0f} ms")
+    root.destroy()
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MyPythonTreeApp benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="write a synthetic tree file")
+    gen.add_argument("filename")
+    gen.add_argument("--nodes", type=int, default=1_000_000)
+    gen.add_argument("--fanout", type=int, default=8)
+    gen.add_argument("--unique", type=float, default=0.2)
+
+    mem = sub.add_parser("memory", help="TreeModel memory per node, plain vs. interned labels")
+    mem.add_argument("filenames", nargs="+")
+
+    flt = sub.add_parser("filter", help="filter view latency")
+    flt.add_argument("filename")
+    flt.add_argument("queries", nargs="+")
+
+    sts = sub.add_parser("stats", help="subtree aggregate update cost")
+    sts.add_argument("filename")
+
+    prs = sub.add_parser("parse", help="serial vs. process-pool parsing of several files")
+    prs.add_argument("filenames", nargs="+")
+    prs.add_argument("--workers", type=int, default=None)
+
+    spl = sub.add_parser("split", help="one large file parsed in ranges by 1..n processes")
+    spl.add_argument("filename")
+    spl.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+
+    exp = sub.add_parser("expand", help="expand/collapse cost, lazy clones, UI stalls")
+    exp.add_argument("filename")
+    exp.add_argument("--depth", type=int, default=3)
+
+    snp = sub.add_parser("snapshot", help="size and load/save time, XML vs. binary snapshot")
+    snp.add_argument("filenames", nargs="+")
+
+    blk = sub.add_parser("bulk", help="delete/rename/move of a large selection, per node vs. bulk")
+    blk.add_argument("filename")
+    blk.add_argument("--count", type=int, default=50000)
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        start = time.perf_counter()
+        generate_tree(args.filename, args.nodes, args.fanout, args.unique)
+        print(f"Wrote {args.nodes} nodes to {args.filename} in {time.perf_counter() - start:.1f}s")
+    elif args.command == "memory":
+        bench_memory(args.filenames)
+    elif args.command == "filter":
+        bench_filter(args.filename, args.queries)
+    elif args.command == "stats":
+        bench_stats(args.filename)
+    elif args.command == "parse":
+        bench_parse(args.filenames, args.workers)
+    elif args.command == "split":
+        bench_split(args.filename, args.workers)
+    elif args.command == "expand":
+        bench_expand(args.filename, args.depth)
+    elif args.command == "snapshot":
+        bench_snapshot(args.filenames)
+    elif args.command == "bulk":
+        bench_bulk(args.filename, args.count)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from BulkOperations import BulkOperations
+from CompactTree import CompactTree
+from FilesManagementStore import FilesManagementStore
+from LabelInterner import LabelInterner
+from TreeFilter import TreeFilter
+from TreeModel import TreeModel
+from TreeExpander import TreeExpander
+from WebServiceManagementStore import WebServiceManagementStore
+
+class TreeDocument:
+    """
+    One tab of the main window: its own Treeview, TreeModel, label table,
+    stores and filter view. The Treeview can be filled from a CompactTree
+    in after() slices, and an idle document can drop all its widget items
+    (unload) and keep only a CompactTree until it is shown again.
+    Pasted and duplicated subtrees are inserted as lazy clones: a clone
+    is one item plus a placeholder child, and its children are inserted
+    (and added to the model) only when it is opened (expand()). Until
+    then they exist only in the CompactTree the clone refers to; nothing
+    is copied on write. The placeholder item ("<iid>.clone") is not a node
+    of the model.
+    Deleting, renaming and moving a selection go through bulk
+    (BulkOperations), which also keeps their undo steps.
+    """
+
+    BATCH = 2000   # items inserted per after() slice
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, notebook, columns: tuple, webservice_url: str, show_message_boxes: bool = True,
+                 async_runner=None, title: str = "Untitled"):
+        self.title = title
+        self.data_source = ""
+        self.frame = tk.Frame(notebook)
+        self.tree = ttk.Treeview(self.frame, columns=columns, displaycolumns=())
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=60, anchor="e", stretch=False)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.labels = LabelInterner()
+        self.model = TreeModel()
+        self.file_store = FilesManagementStore(
+            treeview=self.tree,
+            show_message_boxes=show_message_boxes,
+            labels=self.labels,
+            model=self.model
+        )
+        self.ws_store = WebServiceManagementStore(
+            treeview=self.tree,
+            webservice_url=webservice_url,
+            show_message_boxes=show_message_boxes,
+            labels=self.labels,
+            model=self.model,
+            async_runner=async_runner
+        )
+        self.tree_filter = TreeFilter(self.tree, self.model)
+        self.async_runner = async_runner
+        self.file_store.expand_clones = self.expand_all
+        self.expander = TreeExpander(self.tree, self.model, self.expand)
+        self.bulk = BulkOperations(self.tree, self.model, self.labels, self.expander, self.expand)
+
+        self.last_active = time.monotonic()
+        self.on_progress = None    # callable(document, inserted, total) while filling
+        self.compact = None        # the whole tree while unloaded
+        self._opened = set()       # preorder indices of open items while unloaded
+        self._watched = None       # (filename, signature) while unloaded
+        self._fill = None
+        self._fill_job = None
+
+    # -------------------------------------------------
+    # State
+    # -------------------------------------------------
+    @property
+    def loading(self) -> bool:
+        return self._fill is not None
+
+    @property
+    def unloaded(self) -> bool:
+        return self.compact is not None and not self.loading
+
+    # -------------------------------------------------
+    # Incremental filling
+    # -------------------------------------------------
+    def populate(self, compact: CompactTree, on_done=None, filename: str = None, signature=None):
+        """
+        Replaces the tree with compact, BATCH items per after() slice so the
+        window stays responsive. If filename is given it is watched afterwards
+        (signature = its (mtime_ns, size) when compact was read).
+        """
+        self.cancel()
+        self.expander.cancel()
+        self.bulk.clear_undo()
+        self.file_store.unwatch()
+        if self.tree_filter.active:
+            self.tree_filter.clear()
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        self.model.clear()
+        self.compact = compact
+        self._fill = self._insert_items(compact)
+
+        def step():
+            try:
+                inserted = next(self._fill)
+            except StopIteration:
+                self._fill = self._fill_job = None
+                self.compact = None
+                self._opened = set()
+                if filename:
+                    self.file_store.adopt(filename, compact, signature)
+                if on_done:
+                    on_done(self)
+                return
+            if self.on_progress:
+                self.on_progress(self, inserted, len(compact))
+            self._fill_job = self.tree.after(1, step)
+
+        self._fill_job = self.tree.after_idle(step)
+
+    def cancel(self):
+        """Stops a running populate(); the items inserted so far stay."""
+        if self._fill_job:
+            self.tree.after_cancel(self._fill_job)
+        self._fill = self._fill_job = None
+
+    def _insert_items(self, compact: CompactTree):
+        """Generator inserting compact in preorder; yields the count after every BATCH items."""
+        return compact.iter_insert(self.tree, self.model, intern=self.labels.intern,
+                                   opened=self._opened, batch=self.BATCH)
+
+    # -------------------------------------------------
+    # Lazy clones (expanded on open)
+    # -------------------------------------------------
+    def copy(self, iids: list) -> CompactTree:
+        """The subtrees iids as one CompactTree (clones inside them are copied by slice)."""
+        return CompactTree.from_model(self.model, iids)
+
+    def paste(self, tree: CompactTree, parent_iid: str, index="end") -> list:
+        """Inserts the top-level nodes of tree below parent_iid as lazy clones; returns their ids."""
+        self.expand(parent_iid)
+        sizes = tree.aggregates()[0]
+        new_iids = []
+        for k in tree.child_indices(-1, sizes):
+            new_iids.append(self.insert_clone(parent_iid, index, tree, k))
+            if index != "end":
+                index += 1
+        return new_iids
+
+    def insert_clone(self, parent_iid: str, index, tree: CompactTree, k: int, text: str = None) -> str:
+        """Inserts node k of tree (and, lazily, its subtree) at index below parent_iid."""
+        text = self.labels.intern(tree.labels[k] if text is None else text)
+        iid = self.tree.insert(parent_iid, index, text=text)
+        self.model.add(iid, parent_iid, text, index, clone=(tree, k))
+        if iid in self.model.lazy:
+            # placeholder so the item can be opened; replaced by expand()
+            self.tree.insert(iid, "end", iid=self._placeholder(iid), text="...")
+        return iid
+
+    def expand(self, iid: str) -> bool:
+        """Inserts the children of a lazy clone; False if iid is not one."""
+        clone = self.model.lazy.get(iid)
+        if clone is None:
+            return False
+        tree, k = clone
+        self.tree.delete(self._placeholder(iid))
+        sizes = tree.aggregates()[0]
+        child_iids = [self.tree.insert(iid, "end", text=tree.labels[j]) for j in tree.child_indices(k, sizes)]
+        for node in self.model.expand(iid, child_iids):
+            if node.iid in self.model.lazy:
+                self.tree.insert(node.iid, "end", iid=self._placeholder(node.iid), text="...")
+        return True
+
+    def expand_all(self, iid: str = ""):
+        """Expands every clone below iid; whole-tree operations (filter, file patches) need real nodes."""
+        lazy = self.model.lazy
+        stack = list(lazy) if not iid else [n.iid for n in self.model.walk(iid, include_self=True) if n.iid in lazy]
+        while stack:
+            parent = stack.pop()
+            if self.expand(parent):
+                stack.extend(n.iid for n in self.model.nodes[parent].children if n.iid in lazy)
+
+    @staticmethod
+    def _placeholder(iid: str) -> str:
+        return f"{iid}.clone"
+
+    # -------------------------------------------------
+    # Unloading idle documents
+    # -------------------------------------------------
+    def unload(self):
+        """Drops all widget items and the model; keeps the tree as a CompactTree."""
+        if self.loading or self.unloaded:
+            return
+        self.expander.cancel()
+        self.bulk.clear_undo()
+        if self.tree_filter.active:
+            self.tree_filter.clear()
+        compact = CompactTree.from_model(self.model)
+        self._opened = {k for k, iid in enumerate(compact.iids)
+                        if iid is not None and self.model.nodes[iid].children and self.tree.item(iid, "open")}
+        compact.iids = None
+        if self.file_store.watched:
+            self._watched = (self.file_store.watched, self.file_store.signature)
+        self.file_store.unwatch()
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        self.model.clear()
+        self.compact = compact
+
+    def restore(self, on_done=None):
+        """Refills an unloaded document; changes to its file made meanwhile are patched in afterwards."""
+        if not self.unloaded:
+            return
+        filename, signature = self._watched or (None, None)
+        self._watched = None
+        self.populate(self.compact, on_done, filename, signature)
+
+    # -------------------------------------------------
+    # Closing
+    # -------------------------------------------------
+    def close(self):
+        self.cancel()
+        self.expander.cancel()
+        self.file_store.unwatch()
+        if self.async_runner is not None:
+            # reads only: a save still running finishes and reports its result
+            self.async_runner.cancel(self.ws_store)
+        self.frame.destroy()
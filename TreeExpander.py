@@ -0,0 +1,136 @@
+import time
+from TreeModel import TreeModel
+
+class TreeExpander:
+    """
+    Expand All / Collapse All / Expand to Depth for a Treeview mirrored by
+    a TreeModel. Nodes are opened or closed in time slices scheduled with
+    after(), so Tk keeps redrawing and handling events; progress is
+    reported after every slice and a running operation can be cancelled.
+    Lazy clones are only expanded down to the requested depth.
+    """
+
+    SLICE_MS = 30        # work per after() slice
+    CHECK_EVERY = 256    # nodes between two clock checks
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, treeview, model: TreeModel, expand_clone=None):
+        self.treeview = treeview
+        self.model = model
+        self.expand_clone = expand_clone  # callable(iid) inserting a lazy clone's children
+        self.on_opened = None     # callable(node) after a node was opened
+        self.on_progress = None   # callable(done, total or None) after every slice
+        self.on_done = None       # callable(cancelled: bool)
+        self._work = None
+        self._job = None
+        self._done = 0
+        self._total = None
+
+    @property
+    def running(self) -> bool:
+        return self._work is not None
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def expand_all(self):
+        self.start(self.iter_expand(), self.model.root.descendants)
+
+    def expand_to_depth(self, depth: int):
+        """Shows depth levels: opens the nodes above that level and closes the ones on it."""
+        self.start(self.iter_expand(depth))
+
+    def collapse_all(self):
+        self.start(self.iter_collapse(), self.model.root.descendants)
+
+    def start(self, work, total: int = None):
+        """
+        Runs the generator work (one step per node) in time slices; replaces
+        a running operation. BulkOperations runs its steps here as well.
+        """
+        self.cancel()
+        self._work = work
+        self._done = 0
+        self._total = total
+        self._job = self.treeview.after_idle(self._step)
+
+    def cancel(self):
+        """Stops the running operation; its generator is closed, so its finally blocks run."""
+        if self._work is None:
+            return
+        if self._job:
+            self.treeview.after_cancel(self._job)
+        work, self._work, self._job = self._work, None, None
+        work.close()
+        if self.on_done:
+            self.on_done(True)
+
+    # -------------------------------------------------
+    # Work generators: one yield per visited node
+    # -------------------------------------------------
+    def iter_expand(self, max_depth: int = None):
+        """Opens every node above max_depth (all if None) and closes those at max_depth."""
+        tv, model = self.treeview, self.model
+        stack = [(node, 0) for node in reversed(model.root.children)]
+        while stack:
+            node, depth = stack.pop()
+            if model.nodes.get(node.iid) is not node:
+                continue  # deleted since it was queued
+            yield
+            if max_depth is not None and depth >= max_depth:
+                if node.children or node.iid in model.lazy:
+                    tv.item(node.iid, open=False)
+                continue
+            if node.iid in model.lazy and self.expand_clone:
+                self.expand_clone(node.iid)
+            if node.children:
+                tv.item(node.iid, open=True)
+                if self.on_opened:
+                    self.on_opened(node)
+                stack.extend((child, depth + 1) for child in reversed(node.children))
+
+    def iter_collapse(self):
+        """Closes every open node (clones that were never expanded are closed already)."""
+        tv, model = self.treeview, self.model
+        stack = list(reversed(model.root.children))
+        while stack:
+            node = stack.pop()
+            if model.nodes.get(node.iid) is not node:
+                continue
+            yield
+            if node.children:
+                tv.item(node.iid, open=False)
+                stack.extend(reversed(node.children))
+
+    # -------------------------------------------------
+    # Time slicing
+    # -------------------------------------------------
+    def _step(self):
+        self._job = None
+        deadline = time.perf_counter() + self.SLICE_MS / 1000
+        work = self._work
+        try:
+            while True:
+                next(work)
+                self._done += 1
+                if not self._done % self.CHECK_EVERY and time.perf_counter() > deadline:
+                    break
+        except StopIteration:
+            self._work = None
+            if self.on_progress:
+                self.on_progress(self._done, self._done)
+            if self.on_done:
+                self.on_done(False)
+            return
+        except Exception:
+            # the operation is over either way: no progress display or Cancel left behind
+            self._work = None
+            if self.on_done:
+                self.on_done(True)
+            raise
+        if self.on_progress:
+            self.on_progress(self._done, self._total)
+        if self._work is work:  # not cancelled from a callback
+            self._job = self.treeview.after(1, self._step)
@@ -0,0 +1,274 @@
+"""
+Streaming export of trees to JSON, CSV outline, indented text, XML and
+binary tree snapshots.
+
+    python3 TreeExporter.py Nodes01.xml Nodes01.json Nodes01.csv Nodes01.txt
+    python3 TreeExporter.py big.xml csv:- | head
+    python3 TreeExporter.py big.xml big.tsnap
+    python3 TreeExporter.py big.tsnap big.xml
+
+The input is read once; every node is handed to all exporters as it is
+parsed, so several formats are written in one pass and memory does not
+grow with the tree. An output is a file name (format from its extension)
+or FORMAT:FILE, where FILE may be - for stdout. The GUI exports the
+current tree the same way (see export_model). The input may be XML or a
+snapshot (recognized by its header), so XML and snapshots convert into
+each other losslessly. A snapshot is written in one piece at the end.
+"""
+import abc
+import argparse
+import csv
+import json
+import os
+import sys
+from CompactTree import CompactTree, iter_xml, is_snapshot
+
+# -------------------------------------------------
+# Exporters
+# -------------------------------------------------
+class Exporter(abc.ABC):
+    """
+    Base class: begin(), then node() once per node in document order,
+    then end(). Subclasses implement node(). path is the list of labels from the top down to the node
+    and is only valid during the call.
+    """
+    description = ""
+    binary = False   # True: out is a binary stream
+
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self):
+        pass
+
+    @abc.abstractmethod
+    def node(self, index: int, parent: int, depth: int, text: str, path: list):
+        """Writes (or collects) one node; parent is the index of its parent, None at the top."""
+
+    def end(self):
+        pass
+
+
+class JsonExporter(Exporter):
+    """Nested JSON: a list of {"text": ..., "children": [...]} objects."""
+    description = "JSON"
+
+    def begin(self):
+        self._depth = -1      # depth of the innermost open node
+        self._first = True    # no sibling written yet at the current position
+        self.out.write("[")
+
+    def node(self, index, parent, depth, text, path):
+        self._close(depth)
+        indent = "  " * (depth + 1)
+        self.out.write(f"{'' if self._first else ','}\n{indent}{{\"text\": {json.dumps(text)}, \"children\": [")
+        self._depth = depth
+        self._first = True
+
+    def end(self):
+        self._close(0)
+        self.out.write("\n]\n")
+
+    def _close(self, depth: int):
+        """Closes the open nodes at depth and below."""
+        while self._depth >= depth:
+            self.out.write("]}" if self._first else "\n" + "  " * (self._depth + 1) + "]}")
+            self._depth -= 1
+            self._first = False
+
+
+class CsvExporter(Exporter):
+    """Flat outline: one row per node with id, parent id, depth, text and path."""
+    description = "CSV outline"
+    path_separator = " / "
+
+    def begin(self):
+        self._writer = csv.writer(self.out)
+        self._writer.writerow(["id", "parent_id", "depth", "text", "path"])
+
+    def node(self, index, parent, depth, text, path):
+        self._writer.writerow([index + 1, "" if parent is None else parent + 1, depth, text,
+                               self.path_separator.join(path)])
+
+
+class TextExporter(Exporter):
+    """Indented text, one node per line."""
+    description = "Indented text"
+    indent = "  "
+
+    def node(self, index, parent, depth, text, path):
+        self.out.write(f"{self.indent * depth}{text}\n")
+
+
+class XmlExporter(Exporter):
+    """<TreeView> XML as the stores write it (C# compatible)."""
+    description = "XML files"
+    escapes = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;",
+                             "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"})
+
+    def begin(self):
+        self._depth = -1        # depth of the innermost open node
+        self._pending = False   # its start tag is not finished yet (leaf or parent)
+        self._empty = True      # no node yet: <TreeView /> as ElementTree writes it
+        self.out.write("<?xml version='1.0' encoding='utf-8'?>\n<TreeView")
+
+    def node(self, index, parent, depth, text, path):
+        if self._empty:
+            self.out.write(">")
+            self._empty = False
+        if self._pending and depth > self._depth:
+            self.out.write(">")
+            self._pending = False
+        self._close(depth)
+        self.out.write(f'<Node Text="{text.translate(self.escapes)}"')
+        self._depth = depth
+        self._pending = True
+
+    def end(self):
+        if self._empty:
+            self.out.write(" />")
+            return
+        self._close(0)
+        self.out.write("</TreeView>")
+
+    def _close(self, depth: int):
+        while self._depth >= depth:
+            self.out.write(" />" if self._pending else "</Node>")
+            self._pending = False
+            self._depth -= 1
+
+
+class SnapshotExporter(Exporter):
+    """Binary tree snapshot (see CompactTree.write_snapshot); collects the nodes, writes at the end."""
+    description = "Tree snapshots"
+    binary = True
+
+    def begin(self):
+        self._tree = CompactTree()
+
+    def node(self, index, parent, depth, text, path):
+        tree = self._tree
+        tree.labels.append(text)
+        tree.counts.append(0)
+        if parent is None:
+            tree.top += 1
+        else:
+            tree.counts[parent] += 1
+
+    def end(self):
+        self._tree.write_snapshot(self.out)
+        self._tree = None
+
+
+# Formats by name (= file extension); add an Exporter subclass here to plug in a format
+EXPORTERS = {
+    "json": JsonExporter,
+    "csv":  CsvExporter,
+    "txt":  TextExporter,
+    "xml":  XmlExporter,
+    "tsnap": SnapshotExporter,
+}
+
+# -------------------------------------------------
+# Traversal
+# -------------------------------------------------
+def export(nodes, exporters: list) -> int:
+    """
+    Feeds nodes ((depth, text) in document order, e.g. from iter_xml or
+    iter_model) to all exporters in a single pass. Returns the node count.
+    """
+    path, ids = [], []
+    for exporter in exporters:
+        exporter.begin()
+    count = 0
+    for index, (depth, text) in enumerate(nodes):
+        del path[depth:]
+        del ids[depth:]
+        parent = ids[-1] if ids else None
+        path.append(text)
+        ids.append(index)
+        for exporter in exporters:
+            exporter.node(index, parent, depth, text, path)
+        count = index + 1
+    for exporter in exporters:
+        exporter.end()
+    return count
+
+def iter_model(model):
+    """Yields (depth, text) of a TreeModel in document order, lazy clones included."""
+    stack = [(node, 0) for node in reversed(model.root.children)]
+    while stack:
+        node, depth = stack.pop()
+        yield depth, node.text
+        clone = model.lazy.get(node.iid)
+        if clone is not None:
+            tree, index = clone
+            yield from tree.iter_nodes(index, depth)
+        else:
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+
+def format_for(filename: str) -> str:
+    """Format name from a file extension (None if there is no exporter for it)."""
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    return ext if ext in EXPORTERS else None
+
+def open_output(target: str):
+    """Returns (format, stream, close) for an output spec as described in the module docstring."""
+    fmt, sep, filename = target.partition(":")
+    if not sep or fmt not in EXPORTERS or len(fmt) == 1:  # len 1: a Windows drive letter
+        fmt, filename = format_for(target), target
+    if fmt is None:
+        raise ValueError(f"Unknown export format for {target!r} (known: {', '.join(EXPORTERS)})")
+    if EXPORTERS[fmt].binary:
+        if filename == "-":
+            return fmt, sys.stdout.buffer, False
+        return fmt, open(filename, "wb"), True
+    if filename == "-":
+        return fmt, sys.stdout, False
+    # newline="" lets the csv module write its own line endings
+    return fmt, open(filename, "w", encoding="utf-8", newline="" if fmt == "csv" else None), True
+
+def export_to(nodes, targets: list) -> int:
+    """Exports nodes to every output spec in targets in one pass."""
+    outputs = []
+    try:
+        for target in targets:
+            outputs.append(open_output(target))
+        return export(nodes, [EXPORTERS[fmt](stream) for fmt, stream, _ in outputs])
+    finally:
+        for _, stream, close in outputs:
+            if close:
+                stream.close()
+            else:
+                stream.flush()
+
+def export_model(model, filename: str) -> int:
+    """GUI entry point: writes the whole model to filename, format from its extension."""
+    return export_to(iter_model(model), [filename])
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export <TreeView> XML or tree snapshots to other formats in one pass")
+    parser.add_argument("input", help="XML file or tree snapshot (- for XML on stdin)")
+    parser.add_argument("outputs", nargs="+", metavar="output",
+                        help=f"file name or FORMAT:FILE (- = stdout); formats: {', '.join(EXPORTERS)}")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.input == "-":
+            nodes = iter_xml(sys.stdin.buffer)
+        elif is_snapshot(args.input):
+            nodes = CompactTree.from_snapshot(args.input).iter_nodes()
+        else:
+            nodes = iter_xml(args.input)
+        count = export_to(nodes, args.outputs)
+    except (OSError, ValueError, SyntaxError) as e:   # ET.ParseError is a SyntaxError
+        print(f"Export Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {count} nodes", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from TreeModel import TreeModel
+
+class TreeFilter:
+    """
+    Non-destructive filter view for a Treeview. Matching nodes and their
+    ancestors stay visible; everything else is hidden with Treeview.detach()
+    and later reattached at its original index. Nothing is deleted,
+    re-inserted or re-serialized.
+    """
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, treeview, model: TreeModel):
+        self.treeview = treeview
+        self.model = model
+        self.query = ""
+        self._detached = []   # (iid, parent_iid, index), ascending index per parent
+        self._opened = []     # ancestors opened to reveal matches
+
+    @property
+    def active(self) -> bool:
+        return bool(self.query)
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def apply(self, query: str) -> int:
+        """
+        Shows only nodes whose text contains query (case-insensitive) plus
+        their ancestors. Returns the number of matching nodes.
+        """
+        self.clear()
+        query = query.strip()
+        if not query:
+            return 0
+        keep, reveal, matches = self.select(query)
+
+        # hide only the top-most dropped nodes; their subtrees go with them
+        tv = self.treeview
+        stack = [self.model.root]
+        while stack:
+            parent = stack.pop()
+            if parent.iid and parent.iid in reveal and not tv.item(parent.iid, "open"):
+                tv.item(parent.iid, open=True)
+                self._opened.append(parent.iid)
+            for index, node in enumerate(parent.children):
+                if node.iid not in keep:
+                    self._detached.append((node.iid, parent.iid, index))
+                elif node.children:
+                    stack.append(node)
+        if self._detached:
+            tv.detach(*[iid for iid, _, _ in self._detached])
+        self.query = query
+        return matches
+
+    def select(self, query: str) -> tuple:
+        """
+        Model-only part of apply(): returns (keep, reveal, matches) where keep
+        holds the ids to stay visible and reveal the ids to open.
+        """
+        needle = query.strip().casefold()
+
+        # single bottom-up pass: a node is kept if it matches or a child is kept
+        keep = set()
+        reveal = set()
+        matches = 0
+        for node in reversed(list(self.model.walk())):
+            matched = needle in node.text.casefold()
+            matches += matched
+            if matched or node.iid in keep:
+                keep.add(node.iid)
+                keep.add(node.parent.iid)
+                reveal.add(node.parent.iid)
+        return keep, reveal, matches
+
+    def clear(self):
+        """Reattaches every hidden node at its original position."""
+        tv = self.treeview
+        # ascending indices guarantee all earlier siblings are back before each reattach
+        for iid, parent_iid, index in self._detached:
+            tv.reattach(iid, parent_iid, index)
+        for iid in self._opened:
+            if tv.exists(iid):
+                tv.item(iid, open=False)
+        self._detached = []
+        self._opened = []
+        self.query = ""
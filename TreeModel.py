@@ -0,0 +1,320 @@
+class TreeNode:
+    """
+    One node of a TreeModel. Slots keep per-node overhead low for big trees.
+    descendants, leaves and height describe the subtree below the node and
+    are maintained by TreeModel on every structural edit.
+    """
+    __slots__ = ("iid", "text", "parent", "children", "descendants", "leaves", "height")
+
+    def __init__(self, iid: str, text: str, parent: "TreeNode" = None):
+        self.iid = iid
+        self.text = text
+        self.parent = parent
+        self.children = []
+        self.descendants = 0   # nodes below this one
+        self.leaves = 1        # leaf nodes in the subtree (a leaf counts itself)
+        self.height = 0        # levels below this one
+
+
+class TreeModel:
+    """
+    Python-side mirror of the Treeview structure, keyed by Treeview item id.
+    The stores record every node they insert and the app records every edit,
+    so whole-tree questions (filtering, statistics, ...) can be answered
+    without walking the widget through get_children()/item().
+    version is bumped by every change, so snapshots can tell whether they
+    are stale; edits only by changes to the tree's content, not by
+    expanding a lazy clone (see below), so undo steps stay valid.
+
+    Pasted or duplicated subtrees are lazy clones: such a node only
+    records (CompactTree, index) in `lazy` and takes its aggregates from
+    there; its children become real nodes one level at a time when it is
+    opened (expand()).
+    A lazy node never has children in the model, so expand it before adding
+    or moving anything below it.
+    """
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self):
+        self.root = TreeNode("", "")
+        self.root.leaves = 0
+        self.nodes = {"": self.root}
+        self.lazy = {}   # iid -> (CompactTree, index) of not yet expanded clones
+        self.version = 0
+        self.edits = 0
+
+    def clear(self):
+        self.root = TreeNode("", "")
+        self.root.leaves = 0
+        self.nodes = {"": self.root}
+        self.lazy = {}
+        self.version += 1
+        self.edits += 1
+
+    # -------------------------------------------------
+    # Structure edits (mirror the Treeview calls)
+    # -------------------------------------------------
+    def add(self, iid: str, parent_iid: str, text: str, index="end", clone: tuple = None) -> TreeNode:
+        """
+        Records a new leaf; index follows Treeview.insert (int or "end").
+        clone=(CompactTree, index) records the whole subtree at that index
+        as a lazy clone instead.
+        """
+        parent = self.nodes[parent_iid]
+        node = self._clone_node(iid, text, parent, clone) if clone else TreeNode(iid, text, parent)
+        self._attached([node], parent)
+        if index == "end":
+            parent.children.append(node)
+        else:
+            parent.children.insert(index, node)
+        self.nodes[iid] = node
+        self.version += 1
+        self.edits += 1
+        return node
+
+    def remove(self, iid: str):
+        """Forgets a node together with its whole subtree."""
+        node = self.nodes[iid]
+        node.parent.children.remove(node)
+        self._detached([node], node.parent)
+        for n in self.walk(iid, include_self=True):
+            del self.nodes[n.iid]
+            self.lazy.pop(n.iid, None)
+        self.version += 1
+        self.edits += 1
+
+    def move(self, iid: str, parent_iid: str, index="end"):
+        """
+        Mirrors Treeview.move: index is counted among the new parent's children
+        while the node is still in place, exactly like Tk does.
+        """
+        node = self.nodes[iid]
+        parent = self.nodes[parent_iid]
+        siblings = parent.children
+        if index == "end":
+            index = len(siblings)
+        after = siblings[min(index, len(siblings)) - 1] if index > 0 and siblings else None
+        if after is node:
+            return
+        old_parent = node.parent
+        old_parent.children.remove(node)
+        self._detached([node], old_parent)
+        self._attached([node], parent)
+        siblings.insert(siblings.index(after) + 1 if after else 0, node)
+        node.parent = parent
+        self.version += 1
+        self.edits += 1
+
+    # -------------------------------------------------
+    # Bulk edits: every sibling list is rebuilt once, and the
+    # aggregates are updated once per parent instead of per node
+    # -------------------------------------------------
+    def remove_many(self, iids: list) -> tuple:
+        """
+        remove() for many nodes, none of them inside another one's subtree.
+        Returns what restore() needs to put them back.
+        """
+        positions = self._unlink(iids)
+        clones = {}
+        for node, _, _ in positions:
+            stack = [node]
+            while stack:
+                n = stack.pop()
+                del self.nodes[n.iid]
+                clone = self.lazy.pop(n.iid, None)
+                if clone is not None:
+                    clones[n.iid] = clone
+                stack.extend(n.children)
+        self.version += 1
+        self.edits += 1
+        return positions, clones
+
+    def restore(self, removed: tuple):
+        """Undoes remove_many(): the nodes return to their old places, subtrees and clones included."""
+        positions, clones = removed
+        for node, _, _ in positions:
+            stack = [node]
+            while stack:
+                n = stack.pop()
+                self.nodes[n.iid] = n
+                stack.extend(n.children)
+        self.lazy.update(clones)
+        self._relink(positions)
+        self.version += 1
+        self.edits += 1
+
+    def move_many(self, iids: list, parent_iid: str, before_iid: str = None) -> list:
+        """
+        Moves nodes (none inside another one's subtree, nor above parent_iid)
+        in the given order below parent_iid, in front of the child before_iid
+        (None = at the end). Returns their old positions for move_back().
+        """
+        parent = self.nodes[parent_iid]
+        positions = self._unlink(iids)
+        nodes = [self.nodes[iid] for iid in iids]
+        for node in nodes:
+            node.parent = parent
+        index = len(parent.children) if before_iid is None else parent.children.index(self.nodes[before_iid])
+        self._attached(nodes, parent)
+        parent.children[index:index] = nodes
+        self.version += 1
+        self.edits += 1
+        return positions
+
+    def move_back(self, positions: list):
+        """Undoes move_many()."""
+        self._unlink([node.iid for node, _, _ in positions])
+        for node, parent_iid, _ in positions:
+            node.parent = self.nodes[parent_iid]
+        self._relink(positions)
+        self.version += 1
+        self.edits += 1
+
+    def _unlink(self, iids: list) -> list:
+        """Takes nodes out of their sibling lists; returns (node, parent_iid, index) per node."""
+        groups = {}
+        for iid in iids:
+            node = self.nodes[iid]
+            groups.setdefault(node.parent, set()).add(node)
+        positions = []
+        for parent, nodes in groups.items():
+            kept = []
+            for index, child in enumerate(parent.children):
+                if child in nodes:
+                    positions.append((child, parent.iid, index))
+                else:
+                    kept.append(child)
+            parent.children = kept
+            self._detached(nodes, parent)
+        return positions
+
+    def _relink(self, positions: list):
+        """Puts unlinked nodes back at their indices (counted with all of them in place)."""
+        groups = {}
+        for node, parent_iid, index in positions:
+            groups.setdefault(parent_iid, []).append((index, node))
+        for parent_iid, entries in groups.items():
+            parent = self.nodes[parent_iid]
+            entries.sort(key=lambda entry: entry[0])
+            nodes = [node for _, node in entries]
+            self._attached(nodes, parent)
+            children, rest = [], iter(parent.children)
+            for index, node in entries:
+                while len(children) < index:
+                    children.append(next(rest))
+                children.append(node)
+            children.extend(rest)
+            parent.children = children
+
+    def rename(self, iid: str, text: str):
+        self.nodes[iid].text = text
+        self.version += 1
+        self.edits += 1
+
+    def expand(self, iid: str, child_iids: list) -> list:
+        """
+        Turns the children of the lazy clone iid into nodes (lazy clones
+        themselves); child_iids are the item ids inserted for them, in order.
+        The aggregates along the path do not change.
+        """
+        tree, index = self.lazy.pop(iid)
+        node = self.nodes[iid]
+        sizes = tree.aggregates()[0]
+        for k, child_iid in zip(tree.child_indices(index, sizes), child_iids):
+            child = self._clone_node(child_iid, tree.labels[k], node, (tree, k))
+            node.children.append(child)
+            self.nodes[child_iid] = child
+        self.version += 1
+        return node.children
+
+    def _clone_node(self, iid: str, text: str, parent: TreeNode, clone: tuple) -> TreeNode:
+        tree, index = clone
+        sizes, heights, leaves = tree.aggregates()
+        node = TreeNode(iid, text, parent)
+        node.descendants = sizes[index] - 1
+        node.height = heights[index]
+        node.leaves = leaves[index]
+        if node.descendants:
+            self.lazy[iid] = clone
+        return node
+
+    # -------------------------------------------------
+    # Subtree aggregates: O(depth) updates along the ancestor path
+    # -------------------------------------------------
+    def _attached(self, nodes, parent: TreeNode):
+        """Accounts for the subtrees of nodes becoming children of parent (call before linking)."""
+        was_leaf = not parent.children and parent is not self.root
+        count = leaves = height = 0
+        for node in nodes:
+            count += node.descendants + 1
+            leaves += node.leaves
+            if height <= node.height:
+                height = node.height + 1
+        leaves -= was_leaf
+        a = parent
+        while a is not None:
+            a.descendants += count
+            a.leaves += leaves
+            if a.height < height:
+                a.height = height
+            height = a.height + 1
+            a = a.parent
+
+    def _detached(self, nodes, parent: TreeNode):
+        """Accounts for the subtrees of nodes leaving parent (call after unlinking)."""
+        now_leaf = not parent.children and parent is not self.root
+        count = leaves = 0
+        shrink = False
+        for node in nodes:
+            count += node.descendants + 1
+            leaves += node.leaves
+            shrink = shrink or node.height + 1 == parent.height
+        leaves -= now_leaf
+        a = parent
+        while a is not None:
+            a.descendants -= count
+            a.leaves -= leaves
+            if shrink:
+                # only a node whose tallest branch was removed can get lower;
+                # the max over its direct children is all that needs looking at
+                height = max((c.height for c in a.children), default=-1) + 1
+                shrink = height != a.height
+                a.height = height
+            a = a.parent
+
+    # -------------------------------------------------
+    # Queries
+    # -------------------------------------------------
+    def stats(self, iid: str) -> tuple:
+        """(descendants, height, leaves) of the subtree below iid."""
+        node = self.nodes[iid]
+        return node.descendants, node.height, node.leaves
+
+    def path(self, iid: str):
+        """Yields iid and its ancestors up to (excluding) the invisible root."""
+        node = self.nodes[iid]
+        while node is not self.root:
+            yield node.iid
+            node = node.parent
+
+    def index(self, iid: str) -> int:
+        node = self.nodes[iid]
+        return node.parent.children.index(node)
+
+    def walk(self, iid: str = "", include_self: bool = False):
+        """Yields the nodes below iid in document (pre-)order, without recursion."""
+        start = self.nodes[iid]
+        stack = [start] if include_self else list(reversed(start.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(reversed(node.children))
+
+    def __len__(self) -> int:
+        return len(self.nodes) - 1
+
+    def __contains__(self, iid: str) -> bool:
+        return iid in self.nodes
@@ -1,33 +1,62 @@
 ﻿import re
-import urllib.request
 import urllib.error
 import json
 import xml.etree.ElementTree as ET
 from tkinter import messagebox
 from XmlSelectBoxDialog import XmlSelectBoxDialog
+from LabelInterner import LabelInterner
+from TreeModel import TreeModel
+from CompactTree import CompactTree
+from AsyncXmlServiceClient import AsyncXmlServiceClient, created_entry, read_request
+from RequestPolicy import RequestPolicy
+from TkAsyncRunner import TkAsyncRunner
 
 class WebServiceManagementStore:
     """
     Manages loading, saving, and save-as of a tkinter Treeview
-    against a remote XML web service.
+    against a remote XML web service. Every request, blocking or async,
+    runs under one RequestPolicy (deadlines, retries, hedged reads).
     """
 
     # -------------------------------------------------
     # Constructor
     # -------------------------------------------------
-    def __init__(self, treeview, webservice_url: str, show_message_boxes: bool = True):
+    def __init__(self, treeview, webservice_url: str, show_message_boxes: bool = True,
+                 labels: LabelInterner = None, model: TreeModel = None,
+                 async_runner: TkAsyncRunner = None, policy: RequestPolicy = None):
         self.treeview = treeview
         self.webservice_url = webservice_url.rstrip('/')
         self.show_message_boxes = show_message_boxes
+        self.labels = labels if labels is not None else LabelInterner()
+        self.model = model if model is not None else TreeModel()
+        # non-blocking requests (save here, list/delete/save-as in the dialog)
+        self._async_runner = async_runner
+        self.policy = policy if policy is not None else RequestPolicy()
+        self.client = AsyncXmlServiceClient(self.webservice_url, policy=self.policy)
+        self._saving = None   # future of the save in flight
+        self._waiting_saves = {}   # xml_id -> XML to send once it has finished
+        # owner of saves in the runner: cancel(self) stops reads only, saves finish and report
+        self._writes = object()
+        self.on_replace = None   # callable() right before populate_tree() replaces the tree
+        # previews shown by XmlSelectBoxDialog, keyed by XML ID (as string)
+        self.preview_cache = {}
+
+    @property
+    def async_runner(self) -> TkAsyncRunner:
+        """The runner given by the app, or one of our own created on first use."""
+        if self._async_runner is None:
+            self._async_runner = TkAsyncRunner(self.treeview)
+        return self._async_runner
 
     # -------------------------------------------------
     # Public interface: Load from service
     # -------------------------------------------------
-    def load_tree(self, parent) -> str | None:
+    def load_tree(self, parent, on_loaded=None):
         """
-        Opens XmlSelectBoxDialog to pick an ID,
-        fetches the XML, populates the Treeview,
-        and returns "Id: X Name: Y".
+        Opens XmlSelectBoxDialog to pick an ID and fetches the XML in the
+        background; when it arrives the Treeview is populated and
+        on_loaded("Id: X Name: Y") is called. The window stays responsive
+        meanwhile, and a failed fetch leaves the tree as it is.
         """
         dlg = XmlSelectBoxDialog(
             parent=parent,
@@ -37,37 +66,33 @@ class WebServiceManagementStore:
             tree_store=self
         )
         if dlg.selected_id is None or dlg.selected_name is None:
-            return None
-
-        xml_id = dlg.selected_id
-        try:
-            with urllib.request.urlopen(f"{self.webservice_url}/get_xml_by_id/{xml_id}") as resp:
-                xml_data = resp.read().decode('utf-8')
-        except Exception as e:
-            if self.show_message_boxes:
-                messagebox.showerror("Load Error", f"Could not load XML data:\n{e}")
-            else:
-                print(f"Load Error: Could not load XML data:\n{e}")
-            return None
+            return
 
-        # clear existing nodes
-        for iid in self.treeview.get_children():
-            self.treeview.delete(iid)
+        xml_id, name = dlg.selected_id, dlg.selected_name
 
-        # parse and populate
-        try:
-            root = ET.fromstring(xml_data)
-            self._read_nodes(root, '')
+        def fetched(xml_data):
+            # clear, parse and populate
+            try:
+                self.populate_tree(xml_data)
+            except ET.ParseError as e:
+                if self.show_message_boxes:
+                    messagebox.showerror("Parse Error", f"Failed to parse XML:\n{e}")
+                else:
+                    print(f"Parse Error: Failed to parse XML:\n{e}")
+                return
+            if on_loaded:
+                on_loaded(f"Id: {xml_id} Name: {name}")
             if self.show_message_boxes:
                 messagebox.showinfo("Load Successful", f"Loaded XML ID {xml_id}")
-        except ET.ParseError as e:
+
+        def failed(e):
             if self.show_message_boxes:
-                messagebox.showerror("Parse Error", f"Failed to parse XML:\n{e}")
+                messagebox.showerror("Load Error", f"Could not load XML data:\n{e}")
             else:
-                print(f"Parse Error: Failed to parse XML:\n{e}")
-            return None
+                print(f"Load Error: Could not load XML data:\n{e}")
 
-        return f"Id: {xml_id} Name: {dlg.selected_name}"
+        self.async_runner.submit(self.client.get_xml_by_id(xml_id),
+                                 on_done=fetched, on_error=failed, owner=self)
 
     # -------------------------------------------------
     # Public interface: Save existing XML
@@ -75,7 +100,9 @@ class WebServiceManagementStore:
     def save_tree(self, parent):
         """
         Reads the current data_source ID from parent.config_data,
-        serializes the Treeview to XML, and sends a PUT request.
+        serializes the Treeview to XML, and sends a PUT request
+        in the background (the result is reported when it arrives).
+        Saves are sent one at a time, so an older one can never land last.
         """
         # extract ID from parent.config_data.data_source
         ds = getattr(parent.config_data, "data_source", "") or ""
@@ -90,41 +117,61 @@ class WebServiceManagementStore:
         xml_id = int(match.group(1))
 
         xml_str = self._serialize_tree_to_xml()
-        payload = json.dumps({"id": xml_id, "xmlData": xml_str}).encode('utf-8')
+        if self._saving is not None:
+            # one save at a time: a PUT already sent cannot be stopped, so a newer
+            # save waits for it instead of racing it (and replaces an older waiting one)
+            self._waiting_saves[xml_id] = xml_str
+            return
+        self._send_save(xml_id, xml_str)
 
-        req = urllib.request.Request(
-            url=f"{self.webservice_url}/update_xml_by_id",
-            data=payload,
-            headers={'Content-Type': 'application/json'},
-            method='PUT'
-        )
-        try:
-            with urllib.request.urlopen(req):
-                pass
+    def _send_save(self, xml_id: int, xml_str: str):
+        def updated(_):
+            self.preview_cache.pop(str(xml_id), None)
             if self.show_message_boxes:
                 messagebox.showinfo("Update Successful", f"Updated XML ID {xml_id}")
-        except Exception as e:
+            self._save_finished()
+
+        def failed(e):
             if self.show_message_boxes:
                 messagebox.showerror("Save Error", f"Could not update XML:\n{e}")
             else:
                 print(f"Save Error: Could not update XML:\n{e}")
+            self._save_finished()
+
+        self._saving = self.async_runner.submit(self.client.update_xml_by_id(xml_id, xml_str),
+                                                on_done=updated, on_error=failed, owner=self._writes)
+
+    def _save_finished(self):
+        self._saving = None
+        if self._waiting_saves:
+            xml_id = next(iter(self._waiting_saves))
+            self._send_save(xml_id, self._waiting_saves.pop(xml_id))
 
     # -------------------------------------------------
     # Public interface: Save As (create new XML)
     # -------------------------------------------------
-    def save_as_tree(self, parent) -> str | None:
+    def save_as_tree(self, parent, on_saved=None) -> str | None:
         """
         Opens XmlSelectBoxDialog in save-as mode,
         lets the user enter a new name,
         POSTs the XML to create a new entry,
-        and returns "Id: X Name: Y".
+        and returns "Id: X Name: Y". If the dialog is closed before the
+        entry is created, None is returned and on_saved("Id: X Name: Y")
+        is called once it has been.
         """
+        def created_later(new_id, name):
+            if self.show_message_boxes:
+                messagebox.showinfo("Saved", f"Created new XML '{name}' (ID {new_id})")
+            if on_saved:
+                on_saved(f"Id: {new_id} Name: {name}")
+
         dlg = XmlSelectBoxDialog(
             parent=parent,
             webservice_url=self.webservice_url,
             show_message_boxes=self.show_message_boxes,
             save_as_mode=True,
-            tree_store=self
+            tree_store=self,
+            on_created_later=created_later
         )
         if dlg.selected_id is None or dlg.selected_name is None:
             return None
@@ -132,27 +179,91 @@ class WebServiceManagementStore:
         return f"Id: {dlg.selected_id} Name: {dlg.selected_name}"
 
     # -------------------------------------------------
-    # Internal: Serialize Treeview to XML string
+    # Synchronous requests and tree (de)serialization without any UI
+    # (used by the methods above and by the headless LoadGenerator)
     # -------------------------------------------------
-    def _serialize_tree_to_xml(self) -> str:
+    def list_xml(self) -> list:
+        """Returns [{"id": ..., "name": ...}, ...] from /get_all_xml_info."""
+        def attempt(timeout):
+            return json.loads(read_request(f"{self.webservice_url}/get_all_xml_info", timeout=timeout).decode('utf-8'))
+        return self.policy.call("get_all_xml_info", attempt)
+
+    def fetch_xml(self, xml_id) -> str:
+        def attempt(timeout):
+            return read_request(f"{self.webservice_url}/get_xml_by_id/{xml_id}", timeout=timeout).decode('utf-8')
+        return self.policy.call("get_xml_by_id", attempt)
+
+    def update_xml(self, xml_id, xml_str: str):
+        """Repeated after a failure only if the stored document is not already xml_str."""
+        payload = {"id": int(xml_id), "xmlData": xml_str}
+        self.policy.call("update_xml_by_id",
+                         lambda timeout: self._send_json("PUT", "update_xml_by_id", payload, timeout),
+                         reconcile=lambda: (self.fetch_xml(xml_id) == xml_str, None))
+
+    def create_xml(self, name: str, xml_str: str):
         """
-        Serializes the Treeview nodes into an XML string.
+        Returns the ID of the new entry. The IDs are listed first, so after a
+        failure a new entry with this name counts as created and is not duplicated.
         """
-        root = ET.Element("TreeView")
-        self._write_nodes('', root)
-        return ET.tostring(root, encoding='unicode')
+        payload = {"name": name, "xmlData": xml_str}
+        reconcile = None
+        if self.policy.endpoints["create_new_xml"].retries:
+            try:
+                before = {entry["id"] for entry in self.list_xml()}
+            except Exception:
+                before = None  # a failed create is then reported, not repeated
+
+            def reconcile():
+                if before is None:
+                    raise LookupError("entries before the request are unknown")
+                applied, new_id = created_entry(self.list_xml(), before, name)
+                return applied, {"id": new_id}
+
+        result = self.policy.call("create_new_xml",
+                                  lambda timeout: self._send_json("POST", "create_new_xml", payload, timeout),
+                                  reconcile)
+        return result.get("id") or result.get("nextId")
+
+    def delete_xml(self, xml_id):
+        attempts = 0
+
+        def attempt(timeout):
+            nonlocal attempts
+            attempts += 1
+            try:
+                read_request(f"{self.webservice_url}/delete_xml_by_id/{xml_id}", "DELETE", timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code != 404 or attempts == 1:
+                    raise  # 404 on a repeated request: an earlier attempt deleted it
+
+        self.policy.call("delete_xml_by_id", attempt)
+
+    def populate_tree(self, xml_data: str):
+        """Replaces the Treeview content with the parsed XML (raises ET.ParseError)."""
+        root = ET.fromstring(xml_data)
+        if self.on_replace:
+            self.on_replace()
+        for iid in self.treeview.get_children():
+            self.treeview.delete(iid)
+        self.model.clear()
+        self.labels.clear()
+        self._read_nodes(root, '')
+
+    def _send_json(self, method: str, endpoint: str, payload: dict, timeout: float = None) -> dict:
+        body = read_request(f"{self.webservice_url}/{endpoint}", method, payload, timeout).decode('utf-8')
+        return json.loads(body) if body.strip() else {}
 
     # -------------------------------------------------
-    # Internal helper: Write nodes recursively
+    # Internal: Serialize Treeview to XML string
     # -------------------------------------------------
-    def _write_nodes(self, parent_iid, parent_elem):
+    def _serialize_tree_to_xml(self) -> str:
         """
-        Recursively writes all child nodes into parent_elem.
+        Serializes the tree into an XML string. Reads the model, not the
+        widget, so nodes hidden by a filter and not yet expanded clones are included.
         """
-        for iid in self.treeview.get_children(parent_iid):
-            text = self.treeview.item(iid, 'text')
-            node_elem = ET.SubElement(parent_elem, 'Node', Text=text)
-            self._write_nodes(iid, node_elem)
+        root = ET.Element("TreeView")
+        CompactTree.from_model(self.model).write_nodes(root)
+        return ET.tostring(root, encoding='unicode')
 
     # -------------------------------------------------
     # Internal helper: Read nodes recursively
@@ -162,6 +273,7 @@ class WebServiceManagementStore:
         Recursively reads <Node> elements and inserts into the Treeview.
         """
         for node_elem in xml_parent.findall('Node'):
-            text = node_elem.get('Text', '')
+            text = self.labels.intern(node_elem.get('Text', ''))
             new_iid = self.treeview.insert(parent_iid, 'end', text=text)
+            self.model.add(new_iid, parent_iid, text)
             self._read_nodes(node_elem, new_iid)
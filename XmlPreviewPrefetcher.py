@@ -0,0 +1,161 @@
+import queue
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from AsyncXmlServiceClient import open_request
+from RequestPolicy import RequestPolicy
+
+class XmlPreviewPrefetcher:
+    """
+    Fetches /get_xml_by_id/<id> for a handful of entries in background threads
+    and reduces each document to a small preview (node count, depth, size and
+    top-level node names). Results are handed back through a queue so that the
+    Tk thread can pick them up with after() polling. Fetches run under the
+    store's RequestPolicy (endpoint get_xml_by_id, with FETCH_TIMEOUT per
+    attempt), with retries but without hedged requests.
+    """
+
+    CHUNK_SIZE     = 64 * 1024
+    MAX_TOP_LEVEL  = 20
+    FETCH_TIMEOUT  = 10
+
+    # -------------------------------------------------
+    # Initialization
+    # -------------------------------------------------
+    def __init__(self, webservice_url: str, cache: dict = None, max_workers: int = 4,
+                 policy: RequestPolicy = None):
+        self.webservice_url = webservice_url.rstrip('/')
+        self.cache = cache if cache is not None else {}
+        self.policy = policy if policy is not None else RequestPolicy()
+        self.results = queue.Queue()
+        self._pending = {}
+        self._failed = set()
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="xml-preview")
+
+    # -------------------------------------------------
+    # Public interface
+    # -------------------------------------------------
+    def request(self, xml_id):
+        """
+        Schedules a preview fetch for xml_id unless it is cached, in flight
+        or has already failed. Returns the cached preview if there is one, else None.
+        """
+        key = str(xml_id)
+        if key in self.cache:
+            return self.cache[key]
+        if self._closed or key in self._pending or key in self._failed:
+            return None
+        self._pending[key] = self._pool.submit(self._fetch, key)
+        return None
+
+    def poll(self) -> list:
+        """
+        Drains finished previews (call from the Tk thread).
+        Returns a list of (xml_id, preview) tuples; preview is None on failure.
+        """
+        done = []
+        while True:
+            try:
+                key, preview = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.pop(key, None)
+            if preview is not None:
+                self.cache[key] = preview
+            else:
+                self._failed.add(key)
+            done.append((key, preview))
+        return done
+
+    def failed(self, xml_id) -> bool:
+        return str(xml_id) in self._failed
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._pending)
+
+    def invalidate(self, xml_id=None):
+        """Drops one cached preview, or all of them if xml_id is None."""
+        if xml_id is None:
+            self.cache.clear()
+            self._failed.clear()
+        else:
+            self.cache.pop(str(xml_id), None)
+            self._failed.discard(str(xml_id))
+
+    def close(self):
+        """Cancels queued fetches and stops accepting new ones."""
+        self._closed = True
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------
+    # Worker side
+    # -------------------------------------------------
+    def _fetch(self, key: str):
+        url = f"{self.webservice_url}/get_xml_by_id/{key}"
+
+        def attempt(timeout):
+            if self._closed:
+                raise CancelledError()   # no further retries once the dialog is gone
+            with open_request(url, timeout=timeout) as resp:
+                return self.summarize(resp, self.CHUNK_SIZE, self.MAX_TOP_LEVEL)
+
+        preview = None
+        try:
+            # not hedged: every attempt runs on a pool thread, at most max_workers at once
+            preview = self.policy.call("get_xml_by_id", attempt, timeout=self.FETCH_TIMEOUT, hedge=False)
+        except Exception as e:
+            if not self._closed:
+                print(f"[Debug] Preview of XML ID {key} failed: {e}")
+        if not self._closed:
+            self.results.put((key, preview))
+
+    @staticmethod
+    def summarize(stream, chunk_size: int = CHUNK_SIZE, max_top_level: int = MAX_TOP_LEVEL) -> dict:
+        """
+        Streams an XML document from a binary file-like object and counts
+        its <Node> elements without building the element tree.
+        """
+        parser = ET.XMLPullParser(events=("start", "end"))
+        nodes = 0
+        depth = 0
+        max_depth = 0
+        size = 0
+        top_level = []
+        root = None
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if root is None:
+                    root = elem
+                if elem.tag != "Node":
+                    continue
+                if event == "start":
+                    nodes += 1
+                    depth += 1
+                    max_depth = max(max_depth, depth)
+                    if depth == 1 and len(top_level) < max_top_level:
+                        top_level.append(elem.get("Text", ""))
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        root.clear()
+        parser.close()
+        return {"nodes": nodes, "depth": max_depth, "size": size, "top_level": top_level}
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        if size < 1024:
+            return f"{size} B"
+        for unit in ("KB", "MB", "GB"):
+            size /= 1024
+            if size < 1024 or unit == "GB":
+                return f"{size:.1f} {unit}"
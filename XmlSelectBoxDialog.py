@@ -1,9 +1,10 @@
 ﻿# -*- coding: utf-8 -*-
 import tkinter as tk
 from tkinter import ttk, messagebox
-import urllib.request
 import urllib.error
-import json
+from XmlPreviewPrefetcher import XmlPreviewPrefetcher
+from AsyncXmlServiceClient import AsyncXmlServiceClient
+from TkAsyncRunner import TkAsyncRunner
 
 class XmlSelectBoxDialog(tk.Toplevel):
     """
@@ -19,19 +20,39 @@ class XmlSelectBoxDialog(tk.Toplevel):
                  webservice_url: str,
                  show_message_boxes: bool = True,
                  save_as_mode: bool = False,
-                 tree_store=None):
+                 tree_store=None,
+                 on_created_later=None):
         super().__init__(parent)
         self.parent = parent
         self.webservice_url = webservice_url.rstrip('/')
         self.show_message_boxes = show_message_boxes
         self.save_as_mode = save_as_mode
         self.tree_store = tree_store
+        # callable(new_id, name) for a Save As entry created after the dialog was closed
+        self.on_created_later = on_created_later
         self.selected_id = None
         self.selected_name = None
 
+        # Background preview fetching (cache lives on the store if there is one)
+        cache = getattr(tree_store, "preview_cache", None)
+        self.prefetcher = XmlPreviewPrefetcher(self.webservice_url, cache=cache,
+                                               policy=getattr(tree_store, "policy", None))
+        self._prefetch_job = None
+        self._poll_job = None
+
+        # Non-blocking requests (list, delete, save-as) share the store's loop and client.
+        # Reads are cancelled with the dialog, writes (owner _writes) are not.
+        self._writes = object()
+        self._closed = False
+        self.runner = getattr(tree_store, "async_runner", None)
+        self._own_runner = self.runner is None
+        if self._own_runner:
+            self.runner = TkAsyncRunner(self)
+        self.client = getattr(tree_store, "client", None) or AsyncXmlServiceClient(self.webservice_url)
+
         # Window size & position (top-right of parent)
         self.title("Select XML")
-        self.geometry("340x300")
+        self.geometry("600x300")
         self.update_idletasks()
         px = parent.winfo_rootx()
         py = parent.winfo_rooty()
@@ -43,6 +64,8 @@ class XmlSelectBoxDialog(tk.Toplevel):
         self._build_ui()
         # Initial load of list
         self._load_list()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.bind("<Destroy>", self._on_destroy)
 
         # Make modal
         self.transient(parent)
@@ -70,16 +93,21 @@ class XmlSelectBoxDialog(tk.Toplevel):
         mid.pack(fill=tk.BOTH, expand=True, padx=5, pady=2)
 
         # TreeView itself
-        cols = ("ID", "Name")
+        cols = ("ID", "Name", "Preview")
         self.tree = ttk.Treeview(mid, columns=cols, show="headings", selectmode="browse", height=10)
-        self.tree.heading("ID", text="ID");     self.tree.column("ID", width=50, anchor="center")
-        self.tree.heading("Name", text="Name"); self.tree.column("Name", width=200, anchor="w")
+        self.tree.heading("ID", text="ID");           self.tree.column("ID", width=50, anchor="center")
+        self.tree.heading("Name", text="Name");       self.tree.column("Name", width=200, anchor="w")
+        self.tree.heading("Preview", text="Preview"); self.tree.column("Preview", width=90, anchor="e")
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        # Vertical scrollbar
+        # Vertical scrollbar (scrolling also prefetches the rows that come into view)
         vsb = ttk.Scrollbar(mid, orient="vertical", command=self.tree.yview)
         vsb.pack(side=tk.LEFT, fill=tk.Y)
-        self.tree.configure(yscrollcommand=vsb.set)
+
+        def on_scroll(first, last):
+            vsb.set(first, last)
+            self._schedule_prefetch()
+        self.tree.configure(yscrollcommand=on_scroll)
 
         # Buttons panel: anchored bottom-right of mid
         btn_side = tk.Frame(mid)
@@ -101,53 +129,73 @@ class XmlSelectBoxDialog(tk.Toplevel):
         tk.Button(btn_side, text="Delete", width=10, command=self._delete_entry)\
             .pack(side=tk.BOTTOM, pady=2)
         # 4) Reload (topmost)
-        tk.Button(btn_side, text="Reload", width=10, command=self._load_list)\
+        tk.Button(btn_side, text="Reload", width=10, command=self._reload_list)\
             .pack(side=tk.BOTTOM, pady=2)
 
         # Highlight the Save/As button if in save-as mode
         if self.save_as_mode:
             self.btn_saveas.config(font=("TkDefaultFont", 10, "bold"))
 
+        # Bottom: preview pane for the selected entry
+        self.preview_var = tk.StringVar(value="Select an entry to see a preview.")
+        tk.Label(self,
+                 textvariable=self.preview_var,
+                 justify="left",
+                 anchor="nw",
+                 wraplength=580,
+                 relief=tk.SUNKEN,
+                 bd=1,
+                 height=4)\
+            .pack(fill=tk.X, padx=5, pady=(2,5))
+
         # Double-click binds
         self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self._show_preview())
 
     # -------------------------------------------------
     # Load & Delete Logic
     # -------------------------------------------------
     def _load_list(self):
-        """Fetch /get_all_xml_info and populate tree."""
-        try:
-            with urllib.request.urlopen(f"{self.webservice_url}/get_all_xml_info") as resp:
-                files = json.loads(resp.read().decode('utf-8'))
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not load file list:\n{e}")
-            return
+        """Fetch /get_all_xml_info in the background and populate tree."""
+        self.runner.submit(
+            self.client.get_all_xml_info(),
+            on_done=self._fill_list,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not load file list:\n{e}", parent=self),
+            owner=self
+        )
 
+    def _fill_list(self, files):
         self.tree.delete(*self.tree.get_children())
         for f in files:
-            self.tree.insert("", tk.END, values=(f["id"], f["name"]))
+            self.tree.insert("", tk.END, iid=str(f["id"]), values=(f["id"], f["name"], "..."))
+        self._schedule_prefetch()
+
+    def _reload_list(self):
+        """Reload the list and drop all cached previews."""
+        self.prefetcher.invalidate()
+        self._load_list()
 
     def _delete_entry(self):
         """Delete selected XML entry via DELETE."""
         sel = self.tree.selection()
         if not sel:
             return
-        id_, name = self.tree.item(sel[0], "values")
+        id_, name = self.tree.item(sel[0], "values")[:2]
         if self.show_message_boxes and not messagebox.askyesno(
                "Confirm Delete", f"Delete entry {id_}: {name}?"):
             return
-        try:
-            req = urllib.request.Request(
-                f"{self.webservice_url}/delete_xml_by_id/{id_}",
-                method="DELETE"
-            )
-            with urllib.request.urlopen(req):
-                pass
+
+        def deleted(_):
+            self.prefetcher.invalidate(id_)
             self._load_list()
-        except urllib.error.HTTPError as e:
-            messagebox.showerror("Error", f"Delete failed:\nHTTP {e.code}: {e.reason}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Delete failed:\n{e}")
+
+        def failed(e):
+            if isinstance(e, urllib.error.HTTPError):
+                messagebox.showerror("Error", f"Delete failed:\nHTTP {e.code}: {e.reason}", parent=self)
+            else:
+                messagebox.showerror("Error", f"Delete failed:\n{e}", parent=self)
+
+        self._submit_write(self.client.delete_xml_by_id(id_), deleted, failed, "Delete")
 
     # -------------------------------------------------
     # Load & Close Actions
@@ -157,13 +205,112 @@ class XmlSelectBoxDialog(tk.Toplevel):
         sel = self.tree.selection()
         if not sel:
             return
-        self.selected_id, self.selected_name = self.tree.item(sel[0], "values")
+        self.selected_id, self.selected_name = self.tree.item(sel[0], "values")[:2]
         self.destroy()
 
     def _on_close(self):
         """Close dialog without selection."""
         self.destroy()
 
+    def _on_destroy(self, event):
+        """
+        Stop background prefetching and the list request once the dialog
+        itself goes away. Renames, deletes and creates already sent are
+        left to finish (an own runner waits for them).
+        """
+        if event.widget is not self:
+            return
+        self._closed = True
+        for job in (self._prefetch_job, self._poll_job):
+            if job:
+                self.after_cancel(job)
+        self._prefetch_job = self._poll_job = None
+        self.prefetcher.close()
+        self.runner.cancel(self)
+        if self._own_runner:
+            self.runner.close()
+
+    def _submit_write(self, coro, on_done, on_error, action: str, on_done_later=None):
+        """
+        Submits a request that changes the service. Its callbacks only run
+        while the dialog exists; after it was closed, success goes to
+        on_done_later (if given) and a failure is reported on the parent window.
+        """
+        def done(result):
+            if not self._closed:
+                on_done(result)
+            elif on_done_later:
+                on_done_later(result)
+
+        def failed(e):
+            if not self._closed:
+                on_error(e)
+            else:
+                messagebox.showerror("Error", f"{action} failed:\n{e}", parent=self.parent)
+
+        self.runner.submit(coro, on_done=done, on_error=failed, owner=self._writes)
+
+    # -------------------------------------------------
+    # Preview prefetching
+    # -------------------------------------------------
+    def _schedule_prefetch(self):
+        """Coalesce scroll/reload bursts into one prefetch pass once the UI is idle."""
+        if self._prefetch_job is None:
+            self._prefetch_job = self.after(100, self._prefetch_visible)
+
+    def _prefetch_visible(self):
+        """Request previews for the rows currently scrolled into view."""
+        self._prefetch_job = None
+        rows = self.tree.get_children()
+        if not rows:
+            return
+        first, last = self.tree.yview()
+        start = int(first * len(rows))
+        stop = min(len(rows), int(last * len(rows)) + 1)
+        for row in rows[start:stop]:
+            preview = self.prefetcher.request(row)
+            if preview is not None:
+                self._apply_preview(row, preview)
+        if self._poll_job is None:
+            self._poll_job = self.after(50, self._poll_previews)
+
+    def _poll_previews(self):
+        """Move finished previews from the worker queue into the list."""
+        self._poll_job = None
+        for row, preview in self.prefetcher.poll():
+            if self.tree.exists(row):
+                self._apply_preview(row, preview)
+        if self.prefetcher.busy:
+            self._poll_job = self.after(50, self._poll_previews)
+
+    def _apply_preview(self, row, preview):
+        text = f"{preview['nodes']} nodes" if preview else "n/a"
+        self.tree.set(row, column="Preview", value=text)
+        if row in self.tree.selection():
+            self._show_preview()
+
+    def _show_preview(self):
+        """Fill the preview pane for the selected row (fetching it first if needed)."""
+        sel = self.tree.selection()
+        if not sel:
+            self.preview_var.set("Select an entry to see a preview.")
+            return
+        preview = self.prefetcher.request(sel[0])
+        if preview is None and self.prefetcher.failed(sel[0]):
+            self.preview_var.set("Preview not available.")
+            return
+        if preview is None:
+            self.preview_var.set("Loading preview...")
+            if self._poll_job is None:
+                self._poll_job = self.after(50, self._poll_previews)
+            return
+        top = ", ".join(preview["top_level"])
+        self.preview_var.set(
+            f"Nodes: {preview['nodes']}   Depth: {preview['depth']}   "
+            f"Size: {XmlPreviewPrefetcher.format_size(preview['size'])}\n"
+            f"Top-level nodes: {top or '-'}"
+        )
+
     # -------------------------------------------------
     # Inline Rename & Double-Click
     # -------------------------------------------------
@@ -179,7 +326,7 @@ class XmlSelectBoxDialog(tk.Toplevel):
             self._edit_name(row)
 
     def _edit_name(self, row):
-        """Inline-edit 'Name' and PUT to update_xml_name_by_id."""
+        """Inline-edit 'Name' and PUT to update_xml_name_by_id (in the background)."""
         x, y, w, h = self.tree.bbox(row, "#2")
         old = self.tree.item(row, "values")[1]
         ent = tk.Entry(self.tree)
@@ -192,22 +339,19 @@ class XmlSelectBoxDialog(tk.Toplevel):
             ent.destroy()
             if not new or new == old:
                 return
-            id_, _ = self.tree.item(row, "values")
-            payload = json.dumps({"id": int(id_), "name": new}).encode('utf-8')
-            req = urllib.request.Request(
-                f"{self.webservice_url}/update_xml_name_by_id",
-                data=payload,
-                headers={"Content-Type":"application/json"},
-                method="PUT"
-            )
-            try:
-                with urllib.request.urlopen(req):
-                    pass
-                self.tree.set(row, column="Name", value=new)
-            except urllib.error.HTTPError as e:
-                messagebox.showerror("Error", f"Rename failed:\nHTTP {e.code}: {e.reason}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Rename failed:\n{e}")
+            id_ = self.tree.item(row, "values")[0]
+
+            def renamed(_):
+                if self.tree.exists(row):
+                    self.tree.set(row, column="Name", value=new)
+
+            def failed(e):
+                if isinstance(e, urllib.error.HTTPError):
+                    messagebox.showerror("Error", f"Rename failed:\nHTTP {e.code}: {e.reason}", parent=self)
+                else:
+                    messagebox.showerror("Error", f"Rename failed:\n{e}", parent=self)
+
+            self._submit_write(self.client.update_xml_name_by_id(id_, new), renamed, failed, "Rename")
 
         ent.bind("<Return>", save)
         ent.bind("<FocusOut>", save)
@@ -226,26 +370,26 @@ class XmlSelectBoxDialog(tk.Toplevel):
             return
 
         xml_data = self.tree_store._serialize_tree_to_xml()
-        payload = json.dumps({"name": name, "xmlData": xml_data}).encode('utf-8')
-        req = urllib.request.Request(
-            f"{self.webservice_url}/create_new_xml",
-            data=payload,
-            headers={"Content-Type":"application/json"},
-            method="POST"
-        )
-        try:
-            with urllib.request.urlopen(req) as resp:
-                result = json.loads(resp.read().decode('utf-8'))
-                new_id = result.get("id") or result.get("nextId")
-        except Exception as e:
-            messagebox.showerror("Error", f"Save As failed:\n{e}")
-            return
 
-        if self.show_message_boxes:
-            messagebox.showinfo("Saved", f"Created new XML '{name}' (ID {new_id})")
+        def created(new_id):
+            if self.show_message_boxes:
+                messagebox.showinfo("Saved", f"Created new XML '{name}' (ID {new_id})", parent=self)
+            # Set and close
+            self.selected_id = new_id
+            self.selected_name = name
+            self.destroy()
 
-        # Refresh, set and close
-        self._load_list()
-        self.selected_id = new_id
-        self.selected_name = name
-        self.destroy()
+        def failed(e):
+            self.btn_saveas.config(state="normal")
+            messagebox.showerror("Error", f"Save As failed:\n{e}", parent=self)
+
+        # the button stays disabled while the request is in flight
+        self.btn_saveas.config(state="disabled")
+        def created_later(new_id):
+            if self.on_created_later:
+                self.on_created_later(new_id, name)
+            else:
+                messagebox.showinfo("Saved", f"Created new XML '{name}' (ID {new_id})", parent=self.parent)
+
+        self._submit_write(self.client.create_new_xml(name, xml_data), created, failed, "Save As",
+                           created_later)
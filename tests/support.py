@@ -0,0 +1,273 @@
+"""
+Helpers shared by the tests: a Treeview stand-in that needs no display,
+a local web service, random trees and comparisons of widget, model and
+CompactTree.
+"""
+import io
+import itertools
+import random
+import time
+from unittest import mock
+from xml.sax.saxutils import quoteattr
+from CompactTree import CompactTree
+from LocalXmlService import LocalXmlService
+from TreeDocument import TreeDocument
+from TreeModel import TreeModel
+
+# -------------------------------------------------
+# Treeview stand-in
+# -------------------------------------------------
+class FakeTreeview:
+    """
+    The part of ttk.Treeview the app's helpers use, kept in dicts, with Tk's
+    semantics for move()/reattach() indices. after() and after_idle() only
+    queue their callbacks; run() calls them in order, as the event loop would.
+    Unknown items raise KeyError where Tk raises TclError.
+    """
+
+    def __init__(self):
+        self.children = {"": []}
+        self.parents = {}      # iid -> parent iid, None while detached
+        self.texts = {}
+        self.opened = {}
+        self.selected = ()
+        self._ids = itertools.count(1)
+        self._jobs = {}        # after id -> callback
+        self._job_ids = itertools.count(1)
+
+    # items
+    def insert(self, parent: str, index, iid: str = None, text: str = "", open: bool = False, **kw) -> str:
+        iid = iid or f"I{next(self._ids):03X}"
+        siblings = self.children[parent]
+        if index == "end":
+            siblings.append(iid)
+        else:
+            siblings.insert(int(index), iid)
+        self.children[iid] = []
+        self.parents[iid] = parent
+        self.texts[iid] = text
+        self.opened[iid] = bool(open)
+        return iid
+
+    def get_children(self, item: str = "") -> tuple:
+        return tuple(self.children[item])
+
+    def parent(self, item: str) -> str:
+        return self.parents[item]
+
+    def index(self, item: str) -> int:
+        return self.children[self.parents[item]].index(item)
+
+    def exists(self, item: str) -> bool:
+        return item in self.texts
+
+    def item(self, item: str, option: str = None, **kw):
+        if item not in self.texts:
+            raise KeyError(item)
+        if "text" in kw:
+            self.texts[item] = kw["text"]
+        if "open" in kw:
+            self.opened[item] = bool(kw["open"])
+        if option == "text":
+            return self.texts[item]
+        if option == "open":
+            return self.opened[item]
+        if option is None and not kw:
+            return {"text": self.texts[item], "open": self.opened[item]}
+
+    def delete(self, *items):
+        for item in items:
+            parent = self.parents[item]
+            if parent is not None:
+                self.children[parent].remove(item)
+            stack = [item]
+            while stack:
+                iid = stack.pop()
+                stack.extend(self.children.pop(iid))
+                del self.parents[iid], self.texts[iid], self.opened[iid]
+
+    def detach(self, *items):
+        for item in items:
+            self.children[self.parents[item]].remove(item)
+            self.parents[item] = None
+
+    def move(self, item: str, parent: str, index):
+        """Like Tk: the item goes after the sibling at index - 1, counted while it is still in place."""
+        siblings = self.children[parent]
+        index = len(siblings) if index == "end" else int(index)
+        after = siblings[min(index, len(siblings)) - 1] if index > 0 and siblings else None
+        if after == item:
+            return
+        if self.parents[item] is not None:
+            self.children[self.parents[item]].remove(item)
+        siblings.insert(siblings.index(after) + 1 if after else 0, item)
+        self.parents[item] = parent
+
+    reattach = move
+
+    def selection_set(self, items):
+        self.selected = tuple(items)
+
+    # event loop
+    def after(self, ms: int, callback) -> str:
+        job = f"after#{next(self._job_ids)}"
+        self._jobs[job] = callback
+        return job
+
+    def after_idle(self, callback) -> str:
+        return self.after(0, callback)
+
+    def after_cancel(self, job: str):
+        self._jobs.pop(job, None)
+
+    def run(self, limit: int = 100000) -> int:
+        """Calls queued callbacks (and those they queue) until none is left; returns how many ran."""
+        calls = 0
+        while self._jobs and calls < limit:
+            job = next(iter(self._jobs))
+            self._jobs.pop(job)()
+            calls += 1
+        return calls
+
+    def run_once(self) -> bool:
+        """Calls the oldest queued callback; False if there was none."""
+        if not self._jobs:
+            return False
+        job = next(iter(self._jobs))
+        self._jobs.pop(job)()
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+class DocumentTreeview(FakeTreeview):
+    """FakeTreeview that also takes the constructor and layout calls TreeDocument makes."""
+
+    def __init__(self, master=None, **kw):
+        super().__init__()
+
+    def heading(self, column, **kw):
+        pass
+
+    def column(self, column, **kw):
+        pass
+
+    def pack(self, **kw):
+        pass
+
+def document(testcase, **kw):
+    """A TreeDocument on a DocumentTreeview (its frame is a mock), with message boxes off."""
+    with mock.patch("TreeDocument.tk.Frame"), mock.patch("TreeDocument.ttk.Treeview", DocumentTreeview):
+        doc = TreeDocument(None, ("Nodes",), kw.pop("webservice_url", "http://127.0.0.1:9/api"),
+                           show_message_boxes=False, **kw)
+    testcase.addCleanup(doc.file_store.unwatch)
+    return doc
+
+def pump(widget: FakeTreeview, condition, timeout: float = 10.0) -> bool:
+    """
+    Runs widget's after() callbacks until condition() holds, waiting for
+    background threads (TkAsyncRunner, reload workers) in between; False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        if not widget.run_once():
+            time.sleep(0.005)
+    return True
+
+# -------------------------------------------------
+# Web service
+# -------------------------------------------------
+def local_service(testcase, **faults) -> LocalXmlService:
+    """A LocalXmlService on a free port, stopped when testcase ends."""
+    service = LocalXmlService(port=0, **faults).start()
+    testcase.addCleanup(service.stop)
+    return service
+
+# -------------------------------------------------
+# Trees
+# -------------------------------------------------
+def random_spec(rng: random.Random, nodes: int, labels=("A", "B", "C", "D", "E")) -> list:
+    """A random forest of nodes nodes as nested [text, children] lists; labels repeat."""
+    top = []
+    all_lists = [top]
+    for k in range(nodes):
+        node = [f"{rng.choice(labels)}{k % 7}", []]
+        rng.choice(all_lists).append(node)
+        all_lists.append(node[1])
+    return top
+
+def spec_xml(spec: list) -> str:
+    """<TreeView> document for a spec."""
+    out = ["<?xml version='1.0' encoding='utf-8'?>\n<TreeView>"]
+
+    def write(nodes):
+        for text, children in nodes:
+            if children:
+                out.append(f"<Node Text={quoteattr(text)}>")
+                write(children)
+                out.append("</Node>")
+            else:
+                out.append(f"<Node Text={quoteattr(text)} />")
+
+    write(spec)
+    out.append("</TreeView>")
+    return "".join(out)
+
+def compact(spec: list) -> CompactTree:
+    return CompactTree.from_xml(io.BytesIO(spec_xml(spec).encode("utf-8")))
+
+def loaded(spec: list) -> tuple:
+    """(FakeTreeview, TreeModel) holding spec, inserted the way the stores do it."""
+    tv, model = FakeTreeview(), TreeModel()
+    compact(spec).insert(tv, model)
+    return tv, model
+
+# -------------------------------------------------
+# Comparisons
+# -------------------------------------------------
+def widget_spec(tv: FakeTreeview, iid: str = "") -> list:
+    """What the Treeview shows below iid (detached items excluded) as a spec."""
+    return [[tv.texts[c], widget_spec(tv, c)] for c in tv.children[iid]]
+
+def model_spec(model: TreeModel, iid: str = "") -> list:
+    """The model below iid as a spec; lazy clones are read from their CompactTree."""
+    result = []
+    for node in model.nodes[iid].children:
+        clone = model.lazy.get(node.iid)
+        if clone is not None:
+            tree, index = clone
+            result.append([node.text, compact_spec(tree, index)])
+        else:
+            result.append([node.text, model_spec(model, node.iid)])
+    return result
+
+def compact_spec(tree: CompactTree, index: int = -1) -> list:
+    """The children of index (-1 = the top level) of a CompactTree as a spec."""
+    sizes = tree.aggregates()[0]
+    return [[tree.labels[k], compact_spec(tree, k)] for k in tree.child_indices(index, sizes)]
+
+def aggregate_errors(model: TreeModel) -> list:
+    """Nodes whose (descendants, height, leaves) differ from a recount from scratch; [] if all agree."""
+    errors = []
+
+    def recount(node):
+        clone = model.lazy.get(node.iid)
+        if clone is not None:
+            tree, index = clone
+            sizes, heights, leaves = tree.aggregates()
+            expected = sizes[index] - 1, heights[index], leaves[index]
+        elif node.children:
+            counts = [recount(child) for child in node.children]
+            expected = (sum(c[0] + 1 for c in counts), max(c[1] for c in counts) + 1,
+                        sum(c[2] for c in counts))
+        else:
+            expected = 0, 0, 0 if node is model.root else 1
+        if (node.descendants, node.height, node.leaves) != expected:
+            errors.append((node.iid, (node.descendants, node.height, node.leaves), expected))
+        return expected
+
+    recount(model.root)
+    return errors
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import unittest
+import urllib.error
+from unittest import mock
+from AsyncXmlServiceClient import AsyncXmlServiceClient, read_request
+from TkAsyncRunner import TkAsyncRunner
+from WebServiceManagementStore import WebServiceManagementStore
+from tests.support import FakeTreeview, local_service, pump, spec_xml, widget_spec
+
+SPEC = [["a", [["a1", []]]], ["b", []]]
+
+class AsyncClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = local_service(self)
+        self.client = AsyncXmlServiceClient(self.service.url)
+
+    def test_endpoints_round_trip(self):
+        async def scenario():
+            new_id = await self.client.create_new_xml("first", "<TreeView />")
+            self.assertIn({"id": new_id, "name": "first"}, await self.client.get_all_xml_info())
+            await self.client.update_xml_by_id(new_id, spec_xml(SPEC))
+            self.assertEqual(await self.client.get_xml_by_id(new_id), spec_xml(SPEC))
+            await self.client.update_xml_name_by_id(new_id, "renamed")
+            self.assertEqual(await self.client.get_all_xml_info(), [{"id": new_id, "name": "renamed"}])
+            await self.client.delete_xml_by_id(new_id)
+            with self.assertRaises(urllib.error.HTTPError) as caught:
+                await self.client.get_xml_by_id(new_id)
+            self.assertEqual(caught.exception.code, 404)
+
+        asyncio.run(scenario())
+
+    def test_deleting_a_missing_entry_is_reported(self):
+        with self.assertRaises(urllib.error.HTTPError):
+            asyncio.run(self.client.delete_xml_by_id(42))
+
+    def test_requests_in_flight_are_limited(self):
+        self.service.latency = 0.05
+        client = AsyncXmlServiceClient(self.service.url, max_concurrency=2)
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def counted(*args):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                return read_request(*args)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        async def scenario():
+            return await asyncio.gather(*(client.get_all_xml_info() for _ in range(6)))
+
+        with mock.patch("AsyncXmlServiceClient.read_request", counted):
+            self.assertEqual(len(asyncio.run(scenario())), 6)
+        self.assertEqual(peak[0], 2)
+
+
+class TkAsyncRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.widget = FakeTreeview()
+        self.runner = TkAsyncRunner(self.widget)
+        self.addCleanup(self.runner.close)
+
+    def test_callbacks_run_on_the_calling_thread(self):
+        results = []
+
+        async def work():
+            return threading.current_thread()
+
+        self.runner.submit(work(), on_done=lambda thread: results.append((thread, threading.current_thread())))
+        self.assertTrue(pump(self.widget, lambda: results))
+        worker, caller = results[0]
+        self.assertIsNot(worker, threading.main_thread())
+        self.assertIs(caller, threading.main_thread())
+        self.assertFalse(self.runner.busy)
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+
+        async def work():
+            raise LookupError("gone")
+
+        self.runner.submit(work(), on_done=self.fail, on_error=errors.append)
+        self.assertTrue(pump(self.widget, lambda: errors))
+        self.assertIsInstance(errors[0], LookupError)
+
+    def test_cancelled_owner_gets_no_callbacks(self):
+        owner, other, done = object(), object(), []
+        gate = asyncio.Event()
+
+        async def wait():
+            await gate.wait()
+            return "late"
+
+        async def quick():
+            return "quick"
+
+        self.runner.submit(wait(), on_done=done.append, owner=owner)
+        self.runner.submit(quick(), on_done=done.append, owner=other)
+        self.runner.cancel(owner)
+        self.assertTrue(pump(self.widget, lambda: not self.runner.busy))
+        self.assertEqual(done, ["quick"])
+
+
+class FakeDialog:
+    """XmlSelectBoxDialog after the user picked an entry."""
+    selected = (None, None)
+
+    def __init__(self, **kw):
+        self.selected_id, self.selected_name = self.selected
+
+
+class StoreLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = local_service(self)
+        self.tv = FakeTreeview()
+        self.runner = TkAsyncRunner(self.tv)
+        self.addCleanup(self.runner.close)
+        self.store = WebServiceManagementStore(self.tv, self.service.url, show_message_boxes=False,
+                                               async_runner=self.runner)
+        self.tv.insert("", "end", text="current")
+        self.store.model.add(self.tv.get_children()[0], "", "current")
+        patcher = mock.patch("WebServiceManagementStore.XmlSelectBoxDialog", FakeDialog)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, xml_id, name):
+        FakeDialog.selected = (xml_id, name)
+        loaded = []
+        self.store.load_tree(None, on_loaded=loaded.append)
+        return loaded
+
+    def test_load_fills_the_tree_in_the_background(self):
+        xml_id = self.service.add_entry("sample", spec_xml(SPEC))
+        replaced = []
+        self.store.on_replace = lambda: replaced.append(widget_spec(self.tv))
+        loaded = self.load(xml_id, "sample")
+        # nothing changes until the response has arrived
+        self.assertEqual(widget_spec(self.tv), [["current", []]])
+        self.assertTrue(pump(self.tv, lambda: loaded))
+        self.assertEqual(loaded, [f"Id: {xml_id} Name: sample"])
+        self.assertEqual(replaced, [[["current", []]]])
+        self.assertEqual(widget_spec(self.tv), SPEC)
+        self.assertEqual(len(self.store.model), 3)
+
+    def test_failed_load_keeps_the_tree(self):
+        loaded = self.load(99, "missing")
+        with mock.patch("builtins.print"):
+            self.assertTrue(pump(self.tv, lambda: not self.runner.busy))
+        self.assertEqual(loaded, [])
+        self.assertEqual(widget_spec(self.tv), [["current", []]])
+
+    def test_cancelled_dialog_loads_nothing(self):
+        self.load(None, None)
+        self.assertFalse(self.runner.busy)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,318 @@
+import random
+import unittest
+from BulkOperations import renamer
+from tests.support import aggregate_errors, compact, document, model_spec, random_spec, widget_spec
+
+def shown(tv, iid: str = "") -> list:
+    """What the Treeview shows below iid, without the placeholders of unexpanded clones."""
+    return [[tv.texts[c], shown(tv, c)] for c in tv.children[iid] if not c.endswith(".clone")]
+
+def without(spec: list, paths: set, path: tuple = ()) -> list:
+    """spec without the subtrees at the given index paths."""
+    return [[text, without(children, paths, path + (k,))]
+            for k, (text, children) in enumerate(spec) if path + (k,) not in paths]
+
+
+class BulkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document(self)
+        rng = random.Random(40)
+        self.spec = [[f"{'ABCDE'[k % 5]}{k % 7}", random_spec(rng, 8)] for k in range(25)]
+        self.doc.populate(compact(self.spec))
+        self.doc.tree.run()
+        self.tv, self.model, self.bulk = self.doc.tree, self.doc.model, self.doc.bulk
+        self.top = [node.iid for node in self.model.root.children]
+        self.changed = []
+        self.bulk.on_changed = self.changed.extend
+
+    def run_slices(self, bulk_batch: int = 2):
+        """Makes every step yield after each node and every batch hold bulk_batch nodes."""
+        self.bulk.BATCH = bulk_batch
+        self.doc.expander.SLICE_MS = 0
+        self.doc.expander.CHECK_EVERY = 1
+
+    def assert_consistent(self, expected: list = None):
+        self.assertFalse(self.doc.expander.running)
+        self.assertEqual(widget_spec(self.tv), model_spec(self.model))
+        self.assertEqual(aggregate_errors(self.model), [])
+        if expected is not None:
+            self.assertEqual(model_spec(self.model), expected)
+
+
+class BulkOperationsTest(BulkTestCase):
+
+    def test_delete_and_undo(self):
+        first = self.model.nodes[self.top[0]]
+        selection = [first.children[0].iid, self.top[0], self.top[2], "unknown", self.top[2]]
+        self.assertEqual(self.bulk.delete(selection), 2)   # the child goes with its parent
+        self.tv.run()
+        self.assert_consistent(without(self.spec, {(0,), (2,)}))
+        self.assertTrue(self.tv.exists(self.top[0]))   # only detached
+        self.assertEqual(set(self.changed), {""})
+        self.assertTrue(self.bulk.undo())
+        self.tv.run()
+        self.assert_consistent(self.spec)
+        self.assertEqual(list(self.tv.selected), [self.top[0], self.top[2]])
+        self.assertFalse(self.bulk.can_undo)
+
+    def test_move_and_undo(self):
+        target = self.model.nodes[self.top[-1]]
+        before = target.children[0].iid if target.children else None
+        self.assertEqual(self.bulk.move([self.top[1], self.top[0]], target.iid, before), 2)
+        self.tv.run()
+        expected = without(self.spec, {(0,), (1,)})
+        expected[-1][1][0:0] = [self.spec[1], self.spec[0]]
+        self.assert_consistent(expected)
+        self.assertTrue(self.bulk.undo())
+        self.tv.run()
+        self.assert_consistent(self.spec)
+
+    def test_move_in_front_of_a_moved_node(self):
+        self.bulk.move([self.top[0], self.top[1]], "", self.top[1])
+        self.tv.run()
+        self.assert_consistent(self.spec)   # both stay in front of the next one
+
+    def test_move_into_own_subtree_is_refused(self):
+        inner = next(n.iid for n in self.model.walk(self.top[0]) if n.iid != self.top[0])
+        with self.assertRaises(ValueError):
+            self.bulk.move([self.top[0]], inner)
+        self.assertFalse(self.doc.expander.running)
+        self.assertFalse(self.bulk.can_undo)
+
+    def test_rename_and_undo(self):
+        iids = [node.iid for node in self.model.walk()][:30]
+        texts = [self.model.nodes[iid].text for iid in iids]
+        self.assertEqual(self.bulk.rename(iids, r"^([A-E])(\d)$", r"\2-\1"), 30)
+        self.tv.run()
+        self.assert_consistent()
+        self.assertEqual([self.model.nodes[iid].text for iid in iids], [t[1] + "-" + t[0] for t in texts])
+        self.bulk.undo()
+        self.tv.run()
+        self.assert_consistent(self.spec)
+        self.bulk.rename(self.top[:3], "", "{n:03} {text}")
+        self.tv.run()
+        self.assertEqual([self.model.nodes[iid].text for iid in self.top[:3]],
+                         [f"{n:03} {self.spec[n - 1][0]}" for n in (1, 2, 3)])
+
+    def test_renamer(self):
+        self.assertEqual(renamer(r"(\w)(\d)", r"\2\1")("B3 C4", 1), "3B 4C")
+        self.assertEqual(renamer(r"(?P<x>a)", r"[\g<x>]")("banana", 1), "b[a]n[a]n[a]")
+        self.assertEqual(renamer("", "{n:03} {text}")("old", 7), "007 old")
+        for pattern, template in (("(", "x"), ("a", r"\2"), ("", "{name}"), ("", "{text.foo}"), ("", "{")):
+            with self.assertRaises(ValueError, msg=(pattern, template)):
+                renamer(pattern, template)
+        rename = renamer("", "{text[5]}")
+        self.assertEqual(rename("abcdefg", 1), "f")
+        with self.assertRaises(IndexError):
+            rename("abc", 1)
+
+    def test_labels_a_template_cannot_handle_are_kept(self):
+        self.bulk.rename(self.top[:2], "", "{text[1]}")
+        self.tv.run()
+        self.assertEqual([self.model.nodes[iid].text for iid in self.top[:2]], [t[1] for t, _ in self.spec[:2]])
+        self.bulk.rename(self.top[:2], "", "{text[1]}")   # one character: nothing at index 1
+        self.tv.run()
+        self.assertEqual([self.model.nodes[iid].text for iid in self.top[:2]], [t[1] for t, _ in self.spec[:2]])
+        self.assert_consistent()
+
+    def test_cancelled_step_can_be_undone(self):
+        self.run_slices()
+        self.bulk.delete(self.top)
+        for _ in range(5):
+            self.tv.run_once()
+        self.doc.expander.cancel()
+        self.assertLess(len(self.model.root.children), len(self.top))
+        self.assertGreater(len(self.model.root.children), 0)
+        self.assert_consistent()
+        self.assertTrue(self.bulk.can_undo)
+        self.bulk.undo()
+        self.tv.run()
+        self.assert_consistent(self.spec)
+
+    def test_cancelled_undo_keeps_the_rest(self):
+        self.run_slices()
+        self.bulk.delete(self.top)
+        self.tv.run()
+        self.bulk.undo()
+        for _ in range(5):
+            self.tv.run_once()
+        self.doc.expander.cancel()
+        self.assertLess(0, len(self.model.root.children))
+        self.assertLess(len(self.model.root.children), len(self.top))
+        self.assert_consistent()
+        self.assertTrue(self.bulk.can_undo)
+        self.bulk.undo()
+        self.tv.run()
+        self.assert_consistent(self.spec)
+
+    def test_other_edits_end_the_undo_history(self):
+        self.bulk.delete(self.top[:1])
+        self.tv.run()
+        self.tv.item(self.top[1], text="edited")
+        self.model.rename(self.top[1], "edited")
+        self.assertFalse(self.bulk.can_undo)
+        self.assertFalse(self.bulk.undo())
+        self.assertFalse(self.tv.exists(self.top[0]))   # no longer kept for an undo
+        self.assertNotIn(self.top[0], self.model)
+
+    def test_undo_limit(self):
+        self.bulk.UNDO_LIMIT = 3
+        for iid in self.top[:5]:
+            self.bulk.delete([iid])
+            self.tv.run()
+        self.assertEqual([self.tv.exists(iid) for iid in self.top[:5]], [False, False, True, True, True])
+        for _ in range(3):
+            self.assertTrue(self.bulk.undo())
+            self.tv.run()
+        self.assertFalse(self.bulk.undo())
+        self.assert_consistent(self.spec[2:])
+
+    def test_clear_undo_deletes_detached_items(self):
+        self.bulk.delete(self.top[:3])
+        self.tv.run()
+        self.bulk.clear_undo()
+        self.assertFalse(any(self.tv.exists(iid) for iid in self.top[:3]))
+        self.assertFalse(self.bulk.can_undo)
+
+    def test_failing_step_ends_the_operation(self):
+        done = []
+        self.doc.expander.on_done = done.append
+
+        def broken(*items):
+            raise RuntimeError("widget gone")
+
+        self.tv.detach = broken
+        self.bulk.delete(self.top[:2])
+        with self.assertRaises(RuntimeError):
+            self.tv.run()
+        self.assertEqual(done, [True])
+        self.assertFalse(self.doc.expander.running)
+        self.assertEqual(self.tv.pending, 0)
+
+
+class BulkRaceTest(BulkTestCase):
+    """Edits made while a bulk step runs in slices (regressions: KeyError, stale undo)."""
+
+    def test_nodes_deleted_while_a_delete_runs(self):
+        self.run_slices()
+        self.bulk.delete(self.top)
+        self.tv.run_once()
+        self.tv.run_once()
+        for iid in self.top[1::3]:
+            if iid in self.model:
+                self.tv.delete(iid)
+                self.model.remove(iid)
+        self.tv.run()   # raised KeyError for the nodes gone
+        self.assert_consistent([])
+        # the positions it recorded are stale: it cannot be undone
+        self.assertFalse(self.bulk.can_undo)
+        self.assertFalse(any(self.tv.exists(iid) for iid in self.top))
+
+    def test_siblings_deleted_while_a_delete_runs(self):
+        self.run_slices()
+        self.bulk.delete(self.top[0::2])
+        self.tv.run_once()
+        self.tv.run_once()
+        for iid in self.top[1:8:2]:
+            self.tv.delete(iid)
+            self.model.remove(iid)
+        self.tv.run()
+        self.assertFalse(self.bulk.can_undo)
+        self.assertFalse(self.bulk.undo())   # used to put the nodes back in the wrong order
+        self.tv.run()
+        self.assert_consistent([node for k, node in enumerate(self.spec) if k % 2 and k > 8])
+
+    def test_target_deleted_while_a_move_runs(self):
+        self.run_slices()
+        target = self.top[-1]
+        self.bulk.move(self.top[:-1], target)
+        self.tv.run_once()
+        self.tv.run_once()
+        self.tv.delete(target)
+        self.model.remove(target)
+        self.tv.run()
+        self.assert_consistent()
+        self.assertNotIn(target, self.model)
+        self.assertFalse(self.bulk.can_undo)
+
+    def test_nodes_moved_while_a_move_runs(self):
+        self.run_slices()
+        self.bulk.move(self.top[:-1], self.top[-1])
+        self.tv.run_once()
+        self.tv.run_once()
+        iid = self.top[-2]
+        self.tv.move(iid, self.top[0], 0)
+        self.model.move(iid, self.top[0], 0)
+        self.tv.run()
+        self.assert_consistent()
+        self.assertFalse(self.bulk.can_undo)
+
+    def test_edit_while_an_undo_runs(self):
+        self.run_slices()
+        self.bulk.delete(self.top[:20])
+        self.tv.run()
+        self.bulk.undo()
+        self.tv.run_once()
+        self.tv.run_once()
+        self.tv.item(self.top[-1], text="edited")
+        self.model.rename(self.top[-1], "edited")
+        self.tv.run_once()
+        self.doc.expander.cancel()
+        self.assert_consistent()
+        # the batches not reverted yet are dropped, not kept with stale positions
+        self.assertFalse(self.bulk.can_undo)
+        restored = [iid for iid in self.top[:20] if iid in self.model]
+        self.assertTrue(0 < len(restored) < 20)
+        self.assertEqual([iid for iid in self.top[:20] if self.tv.exists(iid)], restored)
+
+    def test_document_replaced_while_a_step_runs(self):
+        self.run_slices()
+        self.bulk.delete(self.top)
+        self.tv.run_once()
+        spec = random_spec(random.Random(1), 50)
+        self.doc.populate(compact(spec))   # cancels the step and drops the undo history
+        self.tv.run()
+        self.assert_consistent(spec)
+        self.assertFalse(self.bulk.can_undo)
+        self.assertFalse(any(self.tv.exists(iid) for iid in self.top))
+
+
+class BulkCloneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document(self)
+        self.spec = [["a", [["a1", [["a11", []]]], ["a2", []]]], ["b", []], ["c", []]]
+        self.doc.populate(compact(self.spec))
+        self.doc.tree.run()
+        a, self.b, self.c = (node.iid for node in self.doc.model.root.children)
+        [self.clone] = self.doc.paste(self.doc.copy([a]), "")
+
+    def test_move_into_a_clone_expands_it(self):
+        self.doc.bulk.move([self.b, self.c], self.clone)
+        self.doc.tree.run()
+        self.assertNotIn(self.clone, self.doc.model.lazy)
+        expected = [self.spec[0], ["a", self.spec[0][1] + self.spec[1:]]]
+        self.assertEqual(model_spec(self.doc.model), expected)
+        self.doc.expand_all()   # not an edit: the move can still be undone
+        self.assertEqual(shown(self.doc.tree), expected)
+        self.doc.bulk.undo()
+        self.doc.tree.run()
+        self.assertEqual(model_spec(self.doc.model), self.spec + [self.spec[0]])
+        self.assertEqual(aggregate_errors(self.doc.model), [])
+
+    def test_deleted_clone_comes_back_unexpanded(self):
+        self.doc.bulk.delete([self.clone])
+        self.doc.tree.run()
+        self.assertEqual(model_spec(self.doc.model), self.spec)
+        self.doc.bulk.undo()
+        self.doc.tree.run()
+        self.assertIn(self.clone, self.doc.model.lazy)
+        self.assertEqual(model_spec(self.doc.model), self.spec + [self.spec[0]])
+        self.doc.expand_all()
+        self.assertEqual(shown(self.doc.tree), self.spec + [self.spec[0]])
+        self.assertEqual(aggregate_errors(self.doc.model), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import copy
+import os
+import random
+import tempfile
+import unittest
+from CompactTree import CompactTree
+from tests.support import aggregate_errors, compact, compact_spec, document, model_spec, random_spec
+
+def shown(tv, iid: str = "") -> list:
+    """What the Treeview shows below iid, without the placeholders of unexpanded clones."""
+    return [[tv.texts[c], shown(tv, c)] for c in tv.children[iid] if not c.endswith(".clone")]
+
+
+class CloneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document(self)
+        self.spec = random_spec(random.Random(34), 120)
+        self.doc.populate(compact(self.spec))
+        self.doc.tree.run()
+        self.top = [node.iid for node in self.doc.model.root.children]
+
+    def test_paste_inserts_one_item_per_top_node(self):
+        items = len(self.doc.tree.texts)
+        pasted = self.doc.paste(self.doc.copy(self.top[:2]), self.top[-1], 0)
+        self.assertEqual(len(pasted), 2)
+        lazy = [iid for iid in pasted if iid in self.doc.model.lazy]
+        # one item per pasted node plus a placeholder for each that has children
+        self.assertEqual(len(self.doc.tree.texts), items + len(pasted) + len(lazy))
+        expected = copy.deepcopy(self.spec)
+        expected[-1][1][0:0] = copy.deepcopy(self.spec[:2])
+        self.assertEqual(model_spec(self.doc.model), expected)
+        self.assertEqual(aggregate_errors(self.doc.model), [])
+        self.assertEqual(self.doc.model.stats("")[0], 120 + sum(self.doc.model.stats(iid)[0] + 1 for iid in pasted))
+
+    def test_expanding_inserts_one_level(self):
+        first = self.doc.model.root.children[0]
+        [clone] = self.doc.paste(self.doc.copy([first.iid]), "")
+        self.assertTrue(self.doc.expand(clone))
+        self.assertFalse(self.doc.expand(clone))
+        children = self.doc.model.nodes[clone].children
+        self.assertEqual([n.text for n in children], [n.text for n in first.children])
+        self.assertEqual([n.iid in self.doc.model.lazy for n in children], [bool(n.children) for n in first.children])
+        self.assertEqual(aggregate_errors(self.doc.model), [])
+
+    def test_expand_all_matches_the_model(self):
+        tree = self.doc.copy(self.top)
+        self.doc.paste(tree, self.top[0])
+        self.doc.paste(tree, "", 1)
+        expected = model_spec(self.doc.model)
+        self.doc.expand_all()
+        self.assertEqual(self.doc.model.lazy, {})
+        self.assertEqual(model_spec(self.doc.model), expected)
+        self.assertEqual(shown(self.doc.tree), expected)
+        self.assertEqual(aggregate_errors(self.doc.model), [])
+
+    def test_clones_are_independent_of_the_original(self):
+        tree = self.doc.copy(self.top[:1])
+        [clone] = self.doc.paste(tree, "")
+        [other] = self.doc.paste(tree, "")
+        # the pasted nodes share the copied CompactTree instead of copying it
+        self.assertIs(self.doc.model.lazy[clone][0], self.doc.model.lazy[other][0])
+        source = self.doc.model.nodes[self.top[0]]
+        for node in self.doc.model.walk(source.iid, include_self=True):
+            self.doc.tree.item(node.iid, text="changed")
+            self.doc.model.rename(node.iid, "changed")
+        self.doc.expand_all(clone)
+        self.assertEqual(model_spec(self.doc.model)[-2:], [self.spec[0], self.spec[0]])
+        self.assertIn(other, self.doc.model.lazy)
+
+    def test_copy_of_a_tree_with_clones(self):
+        self.doc.paste(self.doc.copy(self.top[:2]), self.top[0])
+        tree = self.doc.copy(self.top[:1])
+        self.assertEqual(len(tree), self.doc.model.stats(self.top[0])[0] + 1)
+        # nodes still inside a clone have no item yet
+        self.assertIn(None, tree.iids)
+        self.assertEqual(compact_spec(tree), model_spec(self.doc.model)[:1])
+
+    def test_saving_writes_unexpanded_clones(self):
+        self.doc.paste(self.doc.copy(self.top), "")
+        expected = model_spec(self.doc.model)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("tree.xml", "tree.tsnap"):
+                filename = os.path.join(tmp, name)
+                self.doc.file_store.save_tree(filename)
+                self.doc.file_store.unwatch()
+                self.assertEqual(compact_spec(CompactTree.from_snapshot(filename) if name.endswith("tsnap")
+                                              else CompactTree.from_xml(filename)), expected)
+        self.assertNotEqual(self.doc.model.lazy, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
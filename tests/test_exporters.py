@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from contextlib import redirect_stderr
+from CompactTree import CompactTree, iter_xml
+from TreeExporter import (EXPORTERS, CsvExporter, Exporter, JsonExporter, SnapshotExporter, TextExporter,
+                          XmlExporter, export, iter_model, main, open_output)
+from tests.support import compact, compact_spec, loaded, random_spec, spec_xml
+
+SPEC = [["a & <b>", [["tab\there", []], ['quote " and newline\n', [["deep", []]]]]], ["", []], ["ü €", []]]
+
+def exported(exporter_class, spec: list):
+    out = io.BytesIO() if exporter_class.binary else io.StringIO()
+    export(compact(spec).iter_nodes(), [exporter_class(out)])
+    return out.getvalue()
+
+def store_xml(spec: list) -> str:
+    """The document FilesManagementStore writes for spec."""
+    root = ET.Element("TreeView")
+    compact(spec).write_nodes(root)
+    out = io.BytesIO()
+    ET.ElementTree(root).write(out, encoding="utf-8", xml_declaration=True)
+    return out.getvalue().decode("utf-8")
+
+def as_json(spec: list) -> list:
+    return [{"text": text, "children": as_json(children)} for text, children in spec]
+
+
+class ExporterTest(unittest.TestCase):
+
+    def test_json(self):
+        for spec in (SPEC, [], random_spec(random.Random(35), 200)):
+            self.assertEqual(json.loads(exported(JsonExporter, spec)), as_json(spec))
+
+    def test_csv_outline(self):
+        rows = list(csv.reader(io.StringIO(exported(CsvExporter, SPEC), newline="")))
+        self.assertEqual(rows[0], ["id", "parent_id", "depth", "text", "path"])
+        self.assertEqual(rows[1:4], [["1", "", "0", "a & <b>", "a & <b>"],
+                                     ["2", "1", "1", "tab\there", "a & <b> / tab\there"],
+                                     ["3", "1", "1", 'quote " and newline\n', 'a & <b> / quote " and newline\n']])
+        self.assertEqual(rows[4][:3], ["4", "3", "2"])
+        self.assertEqual(len(rows), 7)
+
+    def test_indented_text(self):
+        self.assertEqual(exported(TextExporter, [["a", [["b", [["c", []]]]]], ["d", []]]), "a\n  b\n    c\nd\n")
+
+    def test_xml_is_what_the_store_writes(self):
+        for spec in (SPEC, [], [["leaf", []]], random_spec(random.Random(35), 200)):
+            self.assertEqual(exported(XmlExporter, spec), store_xml(spec))
+        self.assertTrue(exported(XmlExporter, []).endswith("<TreeView />"))
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "tree.tsnap")
+            with open(filename, "wb") as f:
+                f.write(exported(SnapshotExporter, SPEC))
+            self.assertEqual(compact_spec(CompactTree.from_snapshot(filename)), SPEC)
+
+    def test_all_formats_in_one_pass(self):
+        outputs = [cls(io.BytesIO() if cls.binary else io.StringIO()) for cls in EXPORTERS.values()]
+        self.assertEqual(export(compact(SPEC).iter_nodes(), outputs), 6)
+        for exporter in outputs:
+            self.assertEqual(exporter.out.getvalue(), exported(type(exporter), SPEC))
+
+    def test_exporters_must_implement_node(self):
+        class Incomplete(Exporter):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(io.StringIO())
+
+
+class TraversalTest(unittest.TestCase):
+
+    def test_iter_model_includes_lazy_clones(self):
+        spec = random_spec(random.Random(5), 60)
+        tv, model = loaded(spec)
+        tree = compact(spec)
+        model.add("clone", "", "clone", clone=(tree, 0))
+        expected = spec + [["clone", spec[0][1]]]
+        self.assertEqual(list(iter_model(model)), list(compact(expected).iter_nodes()))
+
+    def test_iter_xml_skips_foreign_elements(self):
+        xml = b"<TreeView><Meta><Node Text='not a node' /></Meta><Node Text='a'><Other /><Node /></Node></TreeView>"
+        self.assertEqual(list(iter_xml(io.BytesIO(xml))), [(0, "a"), (1, "")])
+
+    def test_output_specs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fmt, stream, close = open_output("txt:" + os.path.join(tmp, "outline.out"))
+            self.assertEqual((fmt, close), ("txt", True))
+            stream.close()
+            fmt, stream, close = open_output(os.path.join(tmp, "tree.JSON"))
+            self.assertEqual(fmt, "json")
+            stream.close()
+        self.assertEqual(open_output("csv:-")[::2], ("csv", False))
+        with self.assertRaises(ValueError):
+            open_output("tree.unknown")
+
+    def test_command_line_round_trip(self):
+        spec = random_spec(random.Random(7), 150)
+        with tempfile.TemporaryDirectory() as tmp, redirect_stderr(io.StringIO()) as err:
+            names = {ext: os.path.join(tmp, f"tree.{ext}") for ext in ("xml", "tsnap", "json", "copy.xml")}
+            with open(names["xml"], "w", encoding="utf-8") as f:
+                f.write(spec_xml(spec))
+            self.assertEqual(main([names["xml"], names["tsnap"], "json:" + names["json"]]), 0)
+            self.assertEqual(main([names["tsnap"], names["copy.xml"]]), 0)
+            self.assertEqual(compact_spec(CompactTree.from_xml(names["copy.xml"])), spec)
+            with open(names["json"], encoding="utf-8") as f:
+                self.assertEqual(json.load(f), as_json(spec))
+            self.assertEqual(main([os.path.join(tmp, "missing.xml"), names["json"]]), 1)
+        self.assertIn("Export Error", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import io
+import os
+import tempfile
+import unittest
+from array import array
+from CompactTree import CompactTree, parse_file
+from FilesManagementStore import FilesManagementStore
+from LabelInterner import LabelInterner
+from tests.support import FakeTreeview, spec_xml
+
+SPEC = [["New Node", [["New Node", []], ["Folder", [["New Node", []]]]]], ["Folder", []]]
+
+def distinct_objects(labels) -> int:
+    return len({id(label) for label in labels})
+
+
+class LabelInternerTest(unittest.TestCase):
+
+    def test_equal_labels_share_one_object(self):
+        labels = LabelInterner()
+        first = labels.intern("".join(["New ", "Node"]))
+        second = labels.intern("".join(["New", " Node"]))
+        self.assertIsNot(first, "".join(["New", " Node"]))
+        self.assertIs(first, second)
+        self.assertIn("New Node", labels)
+        self.assertEqual(len(labels), 1)
+        labels.clear()
+        self.assertEqual(len(labels), 0)
+        self.assertNotIn("New Node", labels)
+
+    def test_parsed_labels_are_shared(self):
+        labels = LabelInterner()
+        tree = CompactTree.from_xml(io.BytesIO(spec_xml(SPEC).encode("utf-8")), labels)
+        self.assertEqual(tree.labels, ["New Node", "New Node", "Folder", "New Node", "Folder"])
+        self.assertEqual(distinct_objects(tree.labels), 2)
+        # a second parse with the same table reuses its objects
+        again = CompactTree.from_xml(io.BytesIO(spec_xml(SPEC).encode("utf-8")), labels)
+        self.assertEqual(distinct_objects(tree.labels + again.labels), 2)
+
+    def test_snapshot_stores_and_loads_each_label_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "tree.tsnap")
+            tree = CompactTree(["x" * 1000] * 50, array("I", [0]) * 50, 50)
+            tree.write_snapshot(filename)
+            self.assertLess(os.path.getsize(filename), 2000)
+            loaded = CompactTree.from_snapshot(filename, LabelInterner())
+            self.assertEqual(loaded.labels, tree.labels)
+            self.assertEqual(distinct_objects(loaded.labels), 1)
+            # the worker entry point interns per file as well
+            self.assertEqual(distinct_objects(parse_file(filename).labels), 1)
+
+    def test_store_loads_interned_labels(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "tree.xml")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(spec_xml(SPEC))
+            store = FilesManagementStore(FakeTreeview(), show_message_boxes=False)
+            store._load_from_file(filename)
+            store.unwatch()
+            texts = [node.text for node in store.model.walk()]
+            self.assertEqual(len(texts), 5)
+            self.assertEqual(distinct_objects(texts), 2)
+            self.assertEqual(len(store.labels), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import time
+import unittest
+import urllib.error
+from AsyncXmlServiceClient import read_request
+from LoadGenerator import HeadlessTreeview, LoadGenerator
+from RequestPolicy import RequestPolicy
+from WebServiceManagementStore import WebServiceManagementStore
+from tests.support import local_service, spec_xml
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class LocalXmlServiceTest(unittest.TestCase):
+
+    def test_serves_the_sample_files(self):
+        service = local_service(self)
+        xml_id = service.add_file(os.path.join(HERE, "Nodes01.xml"))
+        info = json.loads(read_request(f"{service.url}/get_all_xml_info"))
+        self.assertEqual(info, [{"id": xml_id, "name": "Nodes01"}])
+        with open(os.path.join(HERE, "Nodes01.xml"), "rb") as f:
+            self.assertEqual(read_request(f"{service.url}/get_xml_by_id/{xml_id}"), f.read())
+
+    def test_unknown_paths_and_bad_requests(self):
+        service = local_service(self)
+        for path, method, payload, status in (("/nothing_here", "GET", None, 404),
+                                              ("/get_xml_by_id/x", "GET", None, 400),
+                                              ("/create_new_xml", "POST", {"xmlData": ""}, 400),
+                                              ("/update_xml_by_id", "PUT", {"id": 5}, 404)):
+            with self.assertRaises(urllib.error.HTTPError) as caught:
+                read_request(service.url + path, method, payload)
+            self.assertEqual(caught.exception.code, status, path)
+
+    def test_injected_errors_and_latency(self):
+        service = local_service(self, error_rate=1.0, seed=1)
+        with self.assertRaises(urllib.error.HTTPError) as caught:
+            read_request(f"{service.url}/get_all_xml_info")
+        self.assertIn(caught.exception.code, (500, 503))
+        service.error_rate, service.latency = 0.0, 0.2
+        start = time.monotonic()
+        read_request(f"{service.url}/get_all_xml_info")
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+
+class LoadGeneratorTest(unittest.TestCase):
+
+    def test_headless_store_round_trip(self):
+        service = local_service(self)
+        store = WebServiceManagementStore(HeadlessTreeview(), service.url, show_message_boxes=False)
+        xml = spec_xml([["a", [["b", []]]], ["c & d", []]])
+        xml_id = store.create_xml("tree", xml)
+        store.populate_tree(store.fetch_xml(xml_id))
+        self.assertEqual(len(store.model), 3)
+        store.update_xml(xml_id, store._serialize_tree_to_xml())
+        store.populate_tree(store.fetch_xml(xml_id))
+        self.assertEqual([node.text for node in store.model.walk()], ["a", "b", "c & d"])
+        store.delete_xml(xml_id)
+        self.assertEqual(store.list_xml(), [])
+
+    def test_run_records_every_operation(self):
+        service = local_service(self, error_rate=0.1, seed=3)
+        service.add_file(os.path.join(HERE, "Nodes02.xml"))
+        generator = LoadGenerator(service.url, clients=3, duration=0.5, seed=3, policy=RequestPolicy(seed=3)).run()
+        for op in generator.mix:
+            self.assertTrue(generator.latencies[op] or generator.errors[op], op)
+        report = generator.report()
+        self.assertIn("create_delete", report)
+        self.assertIn("requests: attempts", report)
+        # the short-lived entries of create/delete cycles are all gone again
+        service.error_rate = 0.0
+        self.assertEqual([e["name"] for e in json.loads(read_request(f"{service.url}/get_all_xml_info"))],
+                         ["Nodes02"])
+
+    def test_percentile(self):
+        values = sorted(range(1, 101))
+        self.assertEqual(LoadGenerator.percentile(values, 50), 50)
+        self.assertEqual(LoadGenerator.percentile(values, 99), 99)
+        self.assertEqual(LoadGenerator.percentile(values, 100), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import random
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from CompactTree import parse_file
+from ParallelTreeParser import ParallelTreeParser, merge, parse_range, scan_body
+from TreeBenchmark import generate_tree
+from tests.support import compact_spec, random_spec, spec_xml
+
+def chain(depth: int) -> list:
+    spec = []
+    for k in reversed(range(depth)):
+        spec = [[f"level {k}", spec]]
+    return spec
+
+
+class ParallelTreeParserTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def write(self, content, name: str = "tree.xml") -> str:
+        filename = os.path.join(self.tmp, name)
+        with open(filename, "wb") as f:
+            f.write(content.encode("utf-8") if isinstance(content, str) else content)
+        return filename
+
+    def parser(self, workers: int = 4) -> ParallelTreeParser:
+        """Splits every file, however small (in this process)."""
+        parser = ParallelTreeParser(None, workers)
+        parser.MIN_BYTES = parser.MIN_RANGE_BYTES = 1
+        return parser
+
+    def ranges_merge_to_the_serial_parse(self, filename: str, ranges: list):
+        expected = parse_file(filename)
+        tree = merge([parse_range(filename, start, end) for start, end in ranges])
+        self.assertEqual((tree.labels, list(tree.counts), tree.top),
+                         (expected.labels, list(expected.counts), expected.top), ranges)
+
+    def test_cut_at_every_tag(self):
+        spec = [["a", [["a1", []], ["a2", [["a21", []]]]]], ["b", []], ["c", [["c1", []]]]]
+        filename = self.write(spec_xml(spec))
+        with open(filename, "rb") as f:
+            buf = f.read()
+        start, end = scan_body(buf)
+        cuts = [pos for pos in range(start + 1, end) if buf[pos:pos + 1] == b"<"]
+        for cut in cuts:
+            self.ranges_merge_to_the_serial_parse(filename, [(start, cut), (cut, end)])
+        self.ranges_merge_to_the_serial_parse(filename, list(zip([start] + cuts, cuts + [end])))
+
+    def test_random_trees_in_many_ranges(self):
+        rng = random.Random(37)
+        for k in range(10):
+            filename = self.write(spec_xml(random_spec(rng, 400)), f"tree{k}.xml")
+            for parts in (2, 3, 7, 16):
+                ranges = self.parser().split(filename, parts)
+                self.assertEqual(len(ranges), parts)
+                self.ranges_merge_to_the_serial_parse(filename, ranges)
+
+    def test_deeper_than_the_assumed_nesting(self):
+        filename = self.write(spec_xml(chain(600)))
+        self.ranges_merge_to_the_serial_parse(filename, self.parser().split(filename, 5))
+
+    def test_generated_file_with_whitespace_and_escapes(self):
+        filename = os.path.join(self.tmp, "generated.xml")
+        generate_tree(filename, 3000, fanout=5)
+        with open(filename, encoding="utf-8") as f:
+            pretty = f.read().replace("><", ">\n  <").replace('Text="', 'Other="&lt;x&gt;" Text="&amp;')
+        filename = self.write(pretty, "pretty.xml")
+        tree = self.parser().parse(filename)
+        self.assertEqual(compact_spec(tree), compact_spec(parse_file(filename)))
+        self.assertTrue(tree.labels[0].startswith("&"))
+
+    def test_documents_that_cannot_be_cut(self):
+        for xml in ("<TreeView />",
+                    "<TreeView><!-- note --><Node Text='a' /></TreeView>",
+                    "<TreeView><Node Text='a'><![CDATA[x]]></Node></TreeView>",
+                    "<?xml version='1.0' encoding='latin-1'?><TreeView><Node Text='a' /></TreeView>",
+                    "<!DOCTYPE TreeView><TreeView><Node Text='a' /></TreeView>"):
+            self.assertIsNone(scan_body(xml.encode("latin-1")), xml)
+            filename = self.write(xml)
+            # parsed in one piece instead
+            self.assertEqual(compact_spec(self.parser().parse(filename)), compact_spec(parse_file(filename)))
+
+    def test_other_elements_in_the_body_fall_back_to_the_serial_parse(self):
+        spec = random_spec(random.Random(2), 100)
+        xml = spec_xml(spec).replace("<TreeView>", "<TreeView><Meta><Node Text='hidden' /></Meta>")
+        filename = self.write(xml)
+        self.assertEqual(compact_spec(self.parser().parse(filename)), spec)
+
+    def test_malformed_file_reports_the_parse_error(self):
+        filename = self.write(spec_xml(random_spec(random.Random(3), 100)).replace("</Node>", "</Nod>", 1))
+        with self.assertRaises(ET.ParseError):
+            self.parser().parse(filename)
+
+    def test_small_files_are_not_split(self):
+        filename = self.write(spec_xml(random_spec(random.Random(4), 50)))
+        parser = ParallelTreeParser(None, 4)
+        self.assertFalse(parser._worth_splitting(filename))
+        self.assertEqual(compact_spec(parser.submit(filename).result(timeout=10)),
+                         compact_spec(parse_file(filename)))
+
+
+if __name__ == "__main__":
+    unittest.main()
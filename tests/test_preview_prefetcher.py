@@ -0,0 +1,136 @@
+import io
+import random
+import threading
+import time
+import unittest
+import urllib.error
+import xml.etree.ElementTree as ET
+from unittest import mock
+from RequestPolicy import RequestPolicy
+from XmlPreviewPrefetcher import XmlPreviewPrefetcher
+from tests.support import random_spec, spec_xml
+
+class FakeService:
+    """Stands in for open_request(): answers from a dict, slowly, and counts requests in flight."""
+
+    def __init__(self, documents: dict, delay: float = 0.0):
+        self.documents = documents
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def open_request(self, url, method="GET", payload=None, timeout=None):
+        key = url.rsplit("/", 1)[1]
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if key not in self.documents:
+                raise urllib.error.HTTPError(url, 404, "Not Found", {}, None)
+            return io.BytesIO(self.documents[key].encode("utf-8"))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def depth(elem) -> int:
+    return 1 + max(map(depth, elem), default=0)
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def test_counts_nodes_depth_and_top_level(self):
+        xml = spec_xml(random_spec(random.Random(3), 300))
+        root = ET.fromstring(xml)
+        # a small chunk size cuts tags in the middle
+        preview = XmlPreviewPrefetcher.summarize(io.BytesIO(xml.encode("utf-8")), chunk_size=7, max_top_level=5)
+        self.assertEqual(preview["nodes"], len(root.findall(".//Node")))
+        self.assertEqual(preview["depth"], depth(root) - 1)
+        self.assertEqual(preview["size"], len(xml.encode("utf-8")))
+        self.assertEqual(preview["top_level"], [n.get("Text") for n in root.findall("Node")][:5])
+
+    def test_empty_tree(self):
+        preview = XmlPreviewPrefetcher.summarize(io.BytesIO(b"<TreeView />"))
+        self.assertEqual((preview["nodes"], preview["depth"], preview["top_level"]), (0, 0, []))
+
+    def test_format_size(self):
+        self.assertEqual(XmlPreviewPrefetcher.format_size(512), "512 B")
+        self.assertEqual(XmlPreviewPrefetcher.format_size(1536), "1.5 KB")
+        self.assertEqual(XmlPreviewPrefetcher.format_size(3 * 1024 ** 3), "3.0 GB")
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def prefetcher(self, service, **kw):
+        patcher = mock.patch("XmlPreviewPrefetcher.open_request", service.open_request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        prefetcher = XmlPreviewPrefetcher("http://service/api/", **kw)
+        self.addCleanup(prefetcher.close)
+        return prefetcher
+
+    def wait(self, prefetcher, count: int) -> dict:
+        results = {}
+        deadline = time.monotonic() + 10
+        while len(results) < count and time.monotonic() < deadline:
+            results.update(prefetcher.poll())
+            time.sleep(0.01)
+        return results
+
+    def test_previews_are_cached(self):
+        service = FakeService({"1": "<TreeView><Node Text='a'><Node Text='b' /></Node></TreeView>"})
+        prefetcher = self.prefetcher(service)
+        self.assertIsNone(prefetcher.request(1))
+        self.assertIsNone(prefetcher.request(1))   # in flight: not sent twice
+        results = self.wait(prefetcher, 1)
+        self.assertEqual(results["1"]["nodes"], 2)
+        self.assertEqual(prefetcher.request(1), results["1"])
+        self.assertEqual(service.requests, 1)
+        self.assertFalse(prefetcher.busy)
+
+    def test_failures_are_not_retried_until_invalidated(self):
+        service = FakeService({})
+        prefetcher = self.prefetcher(service)
+        prefetcher.request(7)
+        self.assertEqual(self.wait(prefetcher, 1), {"7": None})
+        self.assertTrue(prefetcher.failed(7))
+        self.assertEqual(service.requests, 1)   # 404 is final
+        prefetcher.request(7)
+        self.assertEqual(service.requests, 1)
+        prefetcher.invalidate(7)
+        self.assertFalse(prefetcher.failed(7))
+        prefetcher.request(7)
+        self.wait(prefetcher, 1)
+        self.assertEqual(service.requests, 2)
+
+    def test_slow_fetches_stay_within_the_pool(self):
+        # slower than the hedge delay: hedged requests would exceed max_workers
+        policy = RequestPolicy()
+        policy.HEDGE_DEFAULT_DELAY = 0.02
+        service = FakeService({str(k): "<TreeView />" for k in range(6)}, delay=0.1)
+        prefetcher = self.prefetcher(service, max_workers=2, policy=policy)
+        for k in range(6):
+            prefetcher.request(k)
+        self.assertEqual(len(self.wait(prefetcher, 6)), 6)
+        self.assertLessEqual(service.max_in_flight, 2)
+        self.assertEqual(service.requests, 6)
+        self.assertEqual(policy.stats["hedges"], 0)
+
+    def test_close_drops_queued_fetches(self):
+        service = FakeService({str(k): "<TreeView />" for k in range(20)}, delay=0.05)
+        prefetcher = self.prefetcher(service, max_workers=1)
+        for k in range(20):
+            prefetcher.request(k)
+        prefetcher.close()
+        time.sleep(0.2)
+        self.assertLess(service.requests, 20)
+        self.assertEqual(prefetcher.poll(), [])
+        self.assertIsNone(prefetcher.request(99))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import copy
+import os
+import random
+import tempfile
+import unittest
+from CompactTree import diff_trees
+from FilesManagementStore import FilesManagementStore
+from tests.support import (FakeTreeview, aggregate_errors, compact, loaded, model_spec, pump, random_spec,
+                           spec_xml, widget_spec)
+
+def mutated(rng: random.Random, spec: list, edits: int) -> list:
+    """A copy of spec with random renames, deletions and inserted subtrees."""
+    spec = copy.deepcopy(spec)
+    for step in range(edits):
+        lists = [spec]
+        stack = list(spec)
+        while stack:
+            text, children = stack.pop()
+            lists.append(children)
+            stack.extend(children)
+        siblings = rng.choice(lists)
+        action = rng.random()
+        if action < 0.4 or not siblings:
+            siblings.insert(rng.randint(0, len(siblings)), [f"new {step}", random_spec(rng, rng.randint(0, 4))])
+        elif action < 0.7:
+            del siblings[rng.randrange(len(siblings))]
+        else:
+            siblings[rng.randrange(len(siblings))][0] = f"renamed {step}"
+    return spec
+
+
+class DiffTreesTest(unittest.TestCase):
+
+    def patch(self, old_spec: list, new_spec: list) -> tuple:
+        tv, model = loaded(old_spec)
+        old, new = compact(old_spec), compact(new_spec)
+        old.iids = [node.iid for node in model.walk()]
+        ops, match = diff_trees(old, new)
+        store = FilesManagementStore(tv, show_message_boxes=False, model=model)
+        touched = store._apply_patch(old, new, ops, match)
+        self.assertEqual(widget_spec(tv), new_spec)
+        self.assertEqual(model_spec(model), new_spec)
+        self.assertEqual(aggregate_errors(model), [])
+        # every node of the new tree has its item, matched nodes keep theirs
+        self.assertEqual(new.iids, [node.iid for node in model.walk()])
+        for j, i in enumerate(match):
+            if i >= 0:
+                self.assertEqual(new.iids[j], old.iids[i])
+        return ops, touched
+
+    def test_identical_trees_need_no_patch(self):
+        spec = random_spec(random.Random(1), 100)
+        ops, match = diff_trees(compact(spec), compact(spec))
+        self.assertEqual(ops, [])
+        self.assertEqual(list(match), list(range(100)))
+
+    def test_rename_delete_and_insert(self):
+        old = [["a", [["a1", []], ["a2", []]]], ["b", []], ["c", []]]
+        new = [["a", [["a1", []], ["x", [["x1", []]]], ["a2 renamed", []]]], ["c", []]]
+        ops, touched = self.patch(old, new)
+        self.assertEqual({op[0] for op in ops}, {"delete", "insert", "rename"})
+        self.assertLess(touched, 6)   # a, a1 and c are left alone
+
+    def test_random_changes(self):
+        rng = random.Random(32)
+        for _ in range(40):
+            old = random_spec(rng, rng.randint(0, 60))
+            self.patch(old, mutated(rng, old, rng.randint(1, 8)))
+
+    def test_top_level_replaced_entirely(self):
+        self.patch([["a", []], ["b", [["b1", []]]]], [["c", [["c1", [["c11", []]]]]]])
+
+
+class FileWatchTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.filename = os.path.join(tmp.name, "tree.xml")
+        self.spec = random_spec(random.Random(5), 80)
+        self.writes = 0
+        self.write(self.spec)
+        self.tv = FakeTreeview()
+        self.store = FilesManagementStore(self.tv, show_message_boxes=False)
+        self.addCleanup(self.store.unwatch)
+        self.store._load_from_file(self.filename)
+        self.reloads = []
+        self.store.on_reloaded = lambda filename, touched: self.reloads.append(touched)
+
+    def write(self, spec: list):
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write(spec_xml(spec))
+        # a new signature even within the file system's timestamp resolution
+        self.writes += 1
+        st = os.stat(self.filename)
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9 * self.writes))
+
+    def test_external_change_is_patched_in(self):
+        before = [node.iid for node in self.store.model.walk()]
+        new_spec = copy.deepcopy(self.spec)
+        new_spec[0][0] = "changed"
+        new_spec.append(["appended", []])
+        self.write(new_spec)
+        self.assertTrue(pump(self.tv, lambda: self.reloads))
+        self.assertEqual(self.reloads, [2])
+        self.assertEqual(widget_spec(self.tv), new_spec)
+        self.assertEqual(model_spec(self.store.model), new_spec)
+        # untouched nodes keep their items (and with them selection and open state)
+        self.assertEqual([node.iid for node in self.store.model.walk()][:-1], before)
+
+    def test_edits_before_the_change_are_diffed_against_the_model(self):
+        first = self.store.model.root.children[0]
+        self.tv.item(first.iid, text="edited here")
+        self.store.model.rename(first.iid, "edited here")
+        new_spec = copy.deepcopy(self.spec)
+        new_spec.insert(0, ["inserted", []])
+        self.write(new_spec)
+        self.assertTrue(pump(self.tv, lambda: self.reloads))
+        self.assertEqual(widget_spec(self.tv), new_spec)
+        self.assertEqual(aggregate_errors(self.store.model), [])
+
+    def test_own_save_is_not_an_external_change(self):
+        self.store.save_tree(self.filename)
+        for _ in range(5):
+            self.tv.run_once()
+        self.assertEqual(self.reloads, [])
+        self.assertEqual(self.store.watched, self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
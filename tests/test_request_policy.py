@@ -0,0 +1,247 @@
+import asyncio
+import threading
+import time
+import unittest
+import urllib.error
+from types import SimpleNamespace
+from unittest import mock
+from AsyncXmlServiceClient import read_request
+from RequestPolicy import EndpointPolicy, RequestNotSent, RequestPolicy, not_sent
+from TkAsyncRunner import TkAsyncRunner
+from WebServiceManagementStore import WebServiceManagementStore
+from tests.support import FakeTreeview, local_service, pump
+
+def http_error(code: int) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError("http://service/api", code, "error", {}, None)
+
+def fast_policy(**endpoints) -> RequestPolicy:
+    """A policy with (almost) no backoff, so retries do not slow the tests down."""
+    policy = RequestPolicy(endpoints, seed=1)
+    policy.BACKOFF_BASE = 0.001
+    return policy
+
+class Attempts:
+    """Callable attempt that raises the given errors in turn, then returns result."""
+
+    def __init__(self, *errors, result="ok", delays=()):
+        self.errors = list(errors)
+        self.result = result
+        self.delays = list(delays)
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            self.timeouts.append(timeout)
+            error = self.errors.pop(0) if self.errors else None
+            delay = self.delays.pop(0) if self.delays else 0
+        time.sleep(delay)
+        if error:
+            raise error
+        return self.result
+
+    @property
+    def calls(self) -> int:
+        return len(self.timeouts)
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_idempotent_calls_are_retried(self):
+        policy = fast_policy()
+        attempt = Attempts(http_error(503), ConnectionResetError(), TimeoutError())
+        self.assertEqual(policy.call("get_all_xml_info", attempt), "ok")
+        self.assertEqual(attempt.calls, 4)
+        self.assertEqual(policy.stats["retries"], 3)
+        self.assertEqual(attempt.timeouts[0], RequestPolicy.ENDPOINTS["get_all_xml_info"].timeout)
+
+    def test_final_errors_and_exhausted_retries_are_raised(self):
+        policy = fast_policy()
+        attempt = Attempts(http_error(404))
+        with self.assertRaises(urllib.error.HTTPError):
+            policy.call("get_all_xml_info", attempt)
+        self.assertEqual(attempt.calls, 1)
+        attempt = Attempts(*[http_error(500)] * 10)
+        with self.assertRaises(urllib.error.HTTPError):
+            policy.call("get_all_xml_info", attempt)
+        self.assertEqual(attempt.calls, 4)
+
+    def test_deadline_ends_the_retries(self):
+        policy = fast_policy(get_all_xml_info=EndpointPolicy(timeout=1, deadline=0.2, retries=100, idempotent=True))
+        attempt = Attempts(*[ConnectionResetError()] * 1000, delays=[0.05] * 1000)
+        start = time.monotonic()
+        with self.assertRaises(ConnectionResetError):
+            policy.call("get_all_xml_info", attempt)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertLess(max(attempt.timeouts), 0.21)
+
+    def test_saves_are_repeated_only_when_safe(self):
+        policy = fast_policy()
+        # the server may have applied it: no retry without reconcile
+        attempt = Attempts(http_error(503))
+        with self.assertRaises(urllib.error.HTTPError):
+            policy.call("update_xml_by_id", attempt)
+        self.assertEqual(attempt.calls, 1)
+        # provably not sent: repeated
+        attempt = Attempts(RequestNotSent("refused"))
+        self.assertEqual(policy.call("update_xml_by_id", attempt), "ok")
+        self.assertEqual(attempt.calls, 2)
+
+    def test_reconcile_decides_after_an_ambiguous_failure(self):
+        policy = fast_policy()
+        attempt = Attempts(ConnectionResetError())
+        self.assertEqual(policy.call("create_new_xml", attempt, reconcile=lambda: (True, "found")), "found")
+        self.assertEqual((attempt.calls, policy.stats["reconciled"]), (1, 1))
+        attempt = Attempts(ConnectionResetError())
+        self.assertEqual(policy.call("create_new_xml", attempt, reconcile=lambda: (False, None)), "ok")
+        self.assertEqual(attempt.calls, 2)
+
+        def unknown():
+            raise LookupError("cannot tell")
+
+        with self.assertRaises(ConnectionResetError):
+            policy.call("create_new_xml", Attempts(ConnectionResetError()), reconcile=unknown)
+
+    def test_not_sent(self):
+        self.assertTrue(not_sent(RequestNotSent()))
+        self.assertTrue(not_sent(urllib.error.URLError(ConnectionRefusedError())))
+        self.assertFalse(not_sent(urllib.error.URLError(TimeoutError())))
+        self.assertFalse(not_sent(http_error(503)))
+
+    def test_plain_policy_makes_one_attempt(self):
+        policy = RequestPolicy.plain()
+        attempt = Attempts(http_error(503))
+        with self.assertRaises(urllib.error.HTTPError):
+            policy.call("get_xml_by_id", attempt)
+        self.assertEqual(attempt.calls, 1)
+
+
+class HedgeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = fast_policy()
+        self.policy.HEDGE_DEFAULT_DELAY = 0.05
+
+    def test_slow_read_is_hedged(self):
+        attempt = Attempts(delays=[1.0, 0.0])
+        start = time.monotonic()
+        self.assertEqual(self.policy.call("get_xml_by_id", attempt), "ok")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((self.policy.stats["hedges"], self.policy.stats["hedge_wins"]), (1, 1))
+
+    def test_hedging_can_be_turned_off_per_call(self):
+        attempt = Attempts(delays=[0.2])
+        self.assertEqual(self.policy.call("get_xml_by_id", attempt, hedge=False), "ok")
+        self.assertEqual((attempt.calls, self.policy.stats["hedges"]), (1, 0))
+
+    def test_only_reads_are_hedged(self):
+        attempt = Attempts(delays=[0.2])
+        self.policy.call("update_xml_by_id", attempt)
+        self.assertEqual(self.policy.stats["hedges"], 0)
+
+    def test_hedge_delay_follows_the_p95(self):
+        self.assertEqual(self.policy.hedge_delay("get_xml_by_id"), 0.05)
+        for k in range(100):
+            self.policy._record("get_xml_by_id", k / 100)
+        self.assertEqual(self.policy.hedge_delay("get_xml_by_id"), 0.94)
+
+    def test_async_retry_and_hedge(self):
+        async def scenario():
+            calls = []
+
+            async def attempt(timeout):
+                calls.append(timeout)
+                if len(calls) == 1:
+                    raise ConnectionResetError()
+                if len(calls) == 2:
+                    await asyncio.sleep(1.0)
+                return len(calls)
+
+            result = await self.policy.call_async("get_xml_by_id", attempt)
+            return result, len(calls)
+
+        self.assertEqual(asyncio.run(scenario()), (3, 3))
+        self.assertEqual((self.policy.stats["retries"], self.policy.stats["hedge_wins"]), (1, 1))
+
+
+class StoreRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = local_service(self)
+        self.store = WebServiceManagementStore(FakeTreeview(), self.service.url, show_message_boxes=False,
+                                               policy=fast_policy())
+
+    def test_create_applied_before_the_connection_failed_is_not_repeated(self):
+        failed = []
+
+        def lost_response(url, method="GET", payload=None, timeout=None):
+            body = read_request(url, method, payload, timeout)
+            if method == "POST" and not failed:
+                failed.append(url)
+                raise ConnectionResetError("response lost")
+            return body
+
+        with mock.patch("WebServiceManagementStore.read_request", lost_response):
+            new_id = self.store.create_xml("once", "<TreeView />")
+        self.assertEqual(failed and self.store.policy.stats["reconciled"], 1)
+        self.assertEqual(self.store.list_xml(), [{"id": new_id, "name": "once"}])
+
+    def test_update_is_repeated_only_if_it_did_not_arrive(self):
+        xml_id = self.service.add_entry("doc", "<TreeView />")
+        sent = []
+
+        def failing_put(url, method="GET", payload=None, timeout=None):
+            if method == "PUT":
+                sent.append(payload["xmlData"])
+                if len(sent) == 1:
+                    read_request(url, method, payload, timeout)
+                    raise ConnectionResetError("response lost")
+                if len(sent) == 2:
+                    raise ConnectionResetError("lost before it arrived")
+            return read_request(url, method, payload, timeout)
+
+        with mock.patch("WebServiceManagementStore.read_request", failing_put):
+            self.store.update_xml(xml_id, "<TreeView><Node Text=\"a\" /></TreeView>")
+            self.assertEqual(len(sent), 1)
+            self.store.update_xml(xml_id, "<TreeView><Node Text=\"b\" /></TreeView>")
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(self.store.policy.stats["reconciled"], 1)
+        self.assertEqual(self.store.fetch_xml(xml_id), "<TreeView><Node Text=\"b\" /></TreeView>")
+
+
+class SerializedSaveTest(unittest.TestCase):
+
+    def test_saves_are_sent_one_at_a_time_and_the_last_wins(self):
+        service = local_service(self, latency=0.1)
+        xml_id = service.add_entry("doc", "<TreeView />")
+        tv = FakeTreeview()
+        runner = TkAsyncRunner(tv)
+        self.addCleanup(runner.close)
+        store = WebServiceManagementStore(tv, service.url, show_message_boxes=False, async_runner=runner)
+        parent = SimpleNamespace(config_data=SimpleNamespace(data_source=f"Id: {xml_id} Name: doc"))
+        puts, in_flight, peak = [], [0], [0]
+
+        def counted(url, method="GET", payload=None, timeout=None):
+            if method == "PUT":
+                puts.append(payload["xmlData"])
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            try:
+                return read_request(url, method, payload, timeout)
+            finally:
+                if method == "PUT":
+                    in_flight[0] -= 1
+
+        with mock.patch("AsyncXmlServiceClient.read_request", counted):
+            for k in range(4):
+                tv.insert("", "end", text=f"v{k}")
+                store.model.add(tv.get_children()[-1], "", f"v{k}")
+                store.save_tree(parent)
+            self.assertTrue(pump(tv, lambda: store._saving is None and not runner.busy))
+        self.assertEqual(peak[0], 1)
+        self.assertEqual(len(puts), 2)   # the first, then only the newest of those that waited
+        self.assertEqual(service.get_xml_by_id(xml_id)[1], store._serialize_tree_to_xml())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import random
+import tempfile
+import unittest
+from array import array
+from CompactTree import (SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, CompactTree, LabelInterner,
+                         is_snapshot, read_file)
+from FilesManagementStore import FilesManagementStore
+from tests.support import FakeTreeview, compact, compact_spec, model_spec, random_spec, spec_xml, widget_spec
+
+def header(filename: str) -> tuple:
+    with open(filename, "rb") as f:
+        return SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+
+def raw_snapshot(counts: list, top: int, index: list, strings: list, version: int = SNAPSHOT_VERSION) -> bytes:
+    """A snapshot with 4-byte arrays as given, consistent or not."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("Q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return (SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, 4, 4, 0, len(counts), top, len(encoded), offsets[-1])
+            + array("I", counts).tobytes() + array("I", index).tobytes() + offsets.tobytes() + b"".join(encoded))
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def path(self, name: str = "tree.tsnap") -> str:
+        return os.path.join(self.tmp, name)
+
+    def round_trip(self, tree: CompactTree, labels=None) -> CompactTree:
+        tree.write_snapshot(self.path())
+        return CompactTree.from_snapshot(self.path(), labels)
+
+    def write(self, data: bytes, name: str = "tree.tsnap") -> str:
+        with open(self.path(name), "wb") as f:
+            f.write(data)
+        return self.path(name)
+
+    def test_round_trip(self):
+        rng = random.Random(39)
+        for spec in ([], [["", []]], [["ü € \U0001F333", [["a\n\"b\"", []]]]], random_spec(rng, 1000)):
+            copy = self.round_trip(compact(spec))
+            self.assertEqual(compact_spec(copy), spec)
+            self.assertEqual(copy.counts.typecode, "I")
+
+    def test_arrays_use_the_narrowest_width(self):
+        spec = random_spec(random.Random(1), 200)
+        compact(spec).write_snapshot(self.path())
+        self.assertEqual(header(self.path())[2:4], (1, 1))   # 5 distinct labels, small counts
+        wide = [["parent", [[f"child {k}", []] for k in range(300)]]]
+        self.assertEqual(compact_spec(self.round_trip(compact(wide))), wide)
+        self.assertEqual(header(self.path())[2:4], (2, 2))
+        n = 70000
+        tree = CompactTree(["parent"] + [str(k) for k in range(n)], array("I", [n] + [0] * n), 1)
+        copy = self.round_trip(tree)
+        self.assertEqual(header(self.path())[2:4], (4, 4))
+        self.assertEqual((copy.labels, list(copy.counts), copy.top), (tree.labels, list(tree.counts), 1))
+
+    def test_labels_are_stored_once_and_interned(self):
+        spec = [["same", [["same", []]]], ["same", []]]
+        labels = LabelInterner()
+        copy = self.round_trip(compact(spec), labels)
+        self.assertEqual(header(self.path())[7], 1)
+        self.assertTrue(all(label is labels.intern("same") for label in copy.labels))
+
+    def test_read_file_tells_the_formats_apart(self):
+        spec = random_spec(random.Random(2), 50)
+        xml = self.write(spec_xml(spec).encode("utf-8"), "tree.xml")
+        snapshot = self.path("snapshot.xml")   # the header counts, not the extension
+        compact(spec).write_snapshot(snapshot)
+        self.assertFalse(is_snapshot(xml))
+        self.assertTrue(is_snapshot(snapshot))
+        self.assertFalse(is_snapshot(self.path("missing.tsnap")))
+        self.assertEqual(compact_spec(read_file(xml)), spec)
+        self.assertEqual(compact_spec(read_file(snapshot)), spec)
+
+    def assert_rejected(self, data: bytes, message: str):
+        filename = self.write(data, "bad.tsnap")
+        with self.assertRaisesRegex(ValueError, message):
+            CompactTree.from_snapshot(filename)
+
+    def test_unknown_and_damaged_files_are_rejected(self):
+        compact(random_spec(random.Random(3), 100)).write_snapshot(self.path())
+        with open(self.path(), "rb") as f:
+            good = f.read()
+        self.assert_rejected(b"", "not a tree snapshot")
+        self.assert_rejected(b"<TreeView />".ljust(SNAPSHOT_HEADER.size), "not a tree snapshot")
+        self.assert_rejected(raw_snapshot([0], 1, [0], ["a"], SNAPSHOT_VERSION + 1), "newer")
+        self.assert_rejected(good[:-1], "truncated")
+        self.assert_rejected(good + b"\0", "truncated")
+        self.assert_rejected(good[:8] + b"\1\0\3" + good[11:], "damaged")   # count width 3
+        self.assert_rejected(raw_snapshot([0], 1, [1], ["a"]), "damaged")   # label index out of range
+        self.assert_rejected(raw_snapshot([1, 0], 2, [0, 0], ["a"]), "damaged")   # counts do not add up
+        self.assertEqual(compact_spec(CompactTree.from_snapshot(self.write(raw_snapshot([1, 0], 1, [0, 0], ["a"])))),
+                         [["a", [["a", []]]]])
+
+    def test_broken_preorder_is_rejected(self):
+        # the totals add up, but the first node ends the tree before the second
+        self.assert_rejected(raw_snapshot([0, 1], 1, [0, 0], ["a"]), "damaged")
+        self.assert_rejected(raw_snapshot([0, 0, 2, 0], 2, [0] * 4, ["a"]), "damaged")
+        self.assert_rejected(raw_snapshot([0], 0, [0], ["a"]), "damaged")
+        self.assert_rejected(raw_snapshot([], 1, [], []), "damaged")
+        empty = self.write(raw_snapshot([], 0, [], []), "empty.tsnap")
+        self.assertEqual(compact_spec(CompactTree.from_snapshot(empty)), [])
+
+
+class FileStoreSnapshotTest(unittest.TestCase):
+
+    def test_store_saves_and_loads_snapshots(self):
+        spec = random_spec(random.Random(4), 300)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = FilesManagementStore(FakeTreeview(), show_message_boxes=False)
+            compact(spec).insert(source.treeview, source.model)
+            filename = os.path.join(tmp, "tree.tsnap")
+            source.save_tree(filename)
+            source.unwatch()
+            self.assertTrue(is_snapshot(filename))
+            target = FilesManagementStore(FakeTreeview(), show_message_boxes=False)
+            target._load_from_file(filename)
+            target.unwatch()
+            self.assertEqual(widget_spec(target.treeview), spec)
+            self.assertEqual(model_spec(target.model), spec)
+            # an existing snapshot stays one, whatever its name
+            renamed = os.path.join(tmp, "tree.xml")
+            os.replace(filename, renamed)
+            target.save_tree(renamed)
+            target.unwatch()
+            self.assertTrue(is_snapshot(renamed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from CompactTree import CompactTree, parse_file
+from ParallelTreeParser import ParallelTreeParser
+from TkAsyncRunner import TkAsyncRunner
+from tests.support import (compact, compact_spec, document, local_service, model_spec, pump, random_spec,
+                           spec_xml, widget_spec)
+
+class PopulateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document(self)
+        self.doc.BATCH = 50
+        self.spec = random_spec(random.Random(33), 260)
+
+    def test_fills_in_slices(self):
+        progress, done = [], []
+        self.doc.on_progress = lambda doc, inserted, total: progress.append((inserted, total))
+        self.doc.populate(compact(self.spec), on_done=done.append)
+        self.assertTrue(self.doc.loading)
+        self.assertEqual(widget_spec(self.doc.tree), [])
+        self.doc.tree.run()
+        self.assertEqual(progress, [(k, 260) for k in range(50, 260, 50)])
+        self.assertEqual(done, [self.doc])
+        self.assertFalse(self.doc.loading)
+        self.assertEqual(widget_spec(self.doc.tree), self.spec)
+        self.assertEqual(model_spec(self.doc.model), self.spec)
+        # labels go through the document's table
+        self.assertEqual(len(self.doc.labels), len({node.text for node in self.doc.model.walk()}))
+
+    def test_a_new_populate_replaces_a_running_one(self):
+        self.doc.populate(compact(self.spec))
+        self.doc.tree.run_once()
+        other = [["other", [["tree", []]]]]
+        self.doc.populate(compact(other))
+        self.doc.tree.run()
+        self.assertEqual(widget_spec(self.doc.tree), other)
+        self.assertEqual(len(self.doc.model), 2)
+
+    def test_unload_and_restore(self):
+        self.doc.populate(compact(self.spec))
+        self.doc.tree.run()
+        for k, node in enumerate(self.doc.model.walk()):
+            if node.children and k % 2:
+                self.doc.tree.item(node.iid, open=True)
+        open_paths = self.open_paths()
+        self.doc.unload()
+        self.assertTrue(self.doc.unloaded)
+        self.assertEqual(self.doc.tree.texts, {})
+        self.assertEqual(len(self.doc.model), 0)
+        self.doc.restore()
+        self.doc.tree.run()
+        self.assertFalse(self.doc.unloaded)
+        self.assertEqual(widget_spec(self.doc.tree), self.spec)
+        self.assertEqual(self.open_paths(), open_paths)
+
+    def open_paths(self) -> list:
+        """Preorder positions of the open items."""
+        return [k for k, node in enumerate(self.doc.model.walk()) if self.doc.tree.opened[node.iid]]
+
+    def test_file_changed_while_unloaded_is_patched_in_after_restore(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "tree.xml")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(spec_xml(self.spec))
+            signature = self.doc.file_store._stat(filename)
+            self.doc.populate(parse_file(filename), filename=filename, signature=signature)
+            while self.doc.loading:
+                self.doc.tree.run_once()
+            self.doc.unload()
+            changed = self.spec + [["added while unloaded", []]]
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(spec_xml(changed))
+            os.utime(filename, ns=(signature[0], signature[0] + 10 ** 9))
+            reloads = []
+            self.doc.file_store.on_reloaded = lambda name, touched: reloads.append(touched)
+            self.doc.restore()
+            self.assertTrue(pump(self.doc.tree, lambda: reloads))
+            self.assertEqual(widget_spec(self.doc.tree), changed)
+            self.doc.file_store.unwatch()
+
+
+class ProcessPoolParseTest(unittest.TestCase):
+
+    def test_trees_parsed_in_worker_processes(self):
+        specs = [random_spec(random.Random(k), 150) for k in range(3)]
+        with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(2) as pool:
+            parser = ParallelTreeParser(pool, 2)
+            futures = []
+            for k, spec in enumerate(specs):
+                filename = os.path.join(tmp, f"tree{k}.xml")
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write(spec_xml(spec))
+                futures.append(parser.submit(filename))
+            trees = [future.result() for future in futures]
+        for tree, spec in zip(trees, specs):
+            self.assertIsInstance(tree, CompactTree)
+            self.assertEqual(compact_spec(tree), spec)
+            # interned per file, so every distinct label crossed the process boundary once
+            self.assertEqual(len({id(label) for label in tree.labels}), len(set(tree.labels)))
+
+
+class CloseTest(unittest.TestCase):
+
+    def test_close_keeps_a_running_save(self):
+        service = local_service(self, latency=0.2)
+        xml_id = service.add_entry("doc", "<TreeView />")
+        doc = document(self, webservice_url=service.url)
+        runner = TkAsyncRunner(doc.tree)
+        self.addCleanup(runner.close)
+        doc.async_runner = doc.ws_store._async_runner = runner
+        doc.populate(compact([["saved", []]]))
+        doc.tree.run()
+        doc.ws_store.save_tree(SimpleNamespace(config_data=SimpleNamespace(data_source=f"Id: {xml_id} Name: doc")))
+        doc.close()
+        self.assertTrue(pump(doc.tree, lambda: not runner.busy))
+        _, saved = service.get_xml_by_id(xml_id)
+        self.assertEqual(compact_spec(CompactTree.from_xml(io.BytesIO(saved.encode("utf-8")))), [["saved", []]])
+
+
+if __name__ == "__main__":
+    unittest.main()
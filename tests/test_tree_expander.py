@@ -0,0 +1,104 @@
+import random
+import unittest
+from TreeExpander import TreeExpander
+from tests.support import compact, document, loaded, random_spec
+
+def depth(model, node) -> int:
+    return len(list(model.path(node.iid))) - 1
+
+
+class TreeExpanderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tv, self.model = loaded(random_spec(random.Random(36), 500))
+        self.expander = TreeExpander(self.tv, self.model)
+        self.done, self.progress = [], []
+        self.expander.on_done = self.done.append
+        self.expander.on_progress = lambda done, total: self.progress.append((done, total))
+
+    def parents(self):
+        return [node for node in self.model.walk() if node.children]
+
+    def test_expand_all_and_collapse_all(self):
+        self.expander.expand_all()
+        self.assertTrue(self.expander.running)
+        self.tv.run()
+        self.assertFalse(self.expander.running)
+        self.assertEqual(self.done, [False])
+        self.assertEqual(self.progress[-1], (500, 500))
+        self.assertTrue(all(self.tv.opened[node.iid] for node in self.parents()))
+        self.expander.collapse_all()
+        self.tv.run()
+        self.assertFalse(any(self.tv.opened.values()))
+
+    def test_expand_to_depth(self):
+        self.expander.expand_all()
+        self.tv.run()
+        self.expander.expand_to_depth(2)
+        self.tv.run()
+        # levels 0 and 1 open, level 2 closed; deeper nodes are not visited
+        for node in self.parents():
+            if depth(self.model, node) <= 2:
+                self.assertEqual(self.tv.opened[node.iid], depth(self.model, node) < 2, node.iid)
+
+    def test_runs_in_slices_and_can_be_cancelled(self):
+        self.expander.SLICE_MS = 0
+        self.expander.CHECK_EVERY = 10
+        self.expander.expand_all()
+        for _ in range(3):
+            self.tv.run_once()
+        self.assertEqual(self.progress, [(10, 500), (20, 500), (30, 500)])
+        self.expander.cancel()
+        self.assertEqual(self.done, [True])
+        self.assertFalse(self.expander.running)
+        self.assertEqual(self.tv.pending, 0)
+        # a step yields before it touches its node: 29 nodes were handled
+        handled = list(self.model.walk())[:29]
+        self.assertEqual(sum(self.tv.opened.values()), len([n for n in handled if n.children]))
+
+    def test_a_new_operation_replaces_the_running_one(self):
+        self.expander.SLICE_MS = 0
+        self.expander.CHECK_EVERY = 10
+        self.expander.expand_all()
+        self.tv.run_once()
+        self.expander.collapse_all()
+        self.assertEqual(self.done, [True])
+        self.tv.run()
+        self.assertEqual(self.done, [True, False])
+        self.assertFalse(any(self.tv.opened.values()))
+
+    def test_nodes_deleted_meanwhile_are_skipped(self):
+        self.expander.SLICE_MS = 0
+        self.expander.CHECK_EVERY = 1
+        self.expander.expand_all()
+        self.tv.run_once()
+        for node in list(self.model.root.children[1:]):
+            self.tv.delete(node.iid)
+            self.model.remove(node.iid)
+        self.tv.run()
+        self.assertEqual(self.done, [False])
+        self.assertTrue(all(self.tv.opened[node.iid] for node in self.parents()))
+
+
+class LazyCloneExpandTest(unittest.TestCase):
+
+    def test_clones_are_expanded_down_to_the_depth_only(self):
+        doc = document(self)
+        spec = [["a", [["b", [["c", [["d", []]]]]]]]]
+        doc.populate(compact(spec))
+        doc.tree.run()
+        [clone] = doc.paste(doc.copy([doc.model.root.children[0].iid]), "")
+        doc.expander.expand_to_depth(2)
+        doc.tree.run()
+        lazy = [doc.model.nodes[iid].text for iid in doc.model.lazy]
+        self.assertEqual(lazy, ["c"])   # opened down to b, c stays a closed clone
+        c = doc.model.nodes[clone].children[0].children[0]
+        self.assertFalse(doc.tree.opened[c.iid])
+        doc.expander.expand_all()
+        doc.tree.run()
+        self.assertEqual(doc.model.lazy, {})
+        self.assertEqual(len(doc.model), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import random
+import tempfile
+import unittest
+from CompactTree import CompactTree
+from FilesManagementStore import FilesManagementStore
+from TreeFilter import TreeFilter
+from tests.support import compact_spec, loaded, random_spec, widget_spec
+
+def visible(spec: list, needle: str) -> list:
+    """spec reduced to the nodes containing needle and their ancestors."""
+    result = []
+    for text, children in spec:
+        kept = visible(children, needle)
+        if kept or needle in text.casefold():
+            result.append([text, kept])
+    return result
+
+
+class TreeFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = random_spec(random.Random(28), 400)
+        self.tv, self.model = loaded(self.spec)
+        self.filter = TreeFilter(self.tv, self.model)
+
+    def test_shows_matches_and_their_ancestors(self):
+        matches = self.filter.apply(" b3 ")
+        self.assertTrue(self.filter.active)
+        self.assertGreater(matches, 0)
+        self.assertEqual(matches, sum(node.text == "B3" for node in self.model.walk()))
+        self.assertEqual(widget_spec(self.tv), visible(self.spec, "b3"))
+        # the ancestors of every match are opened to reveal it
+        for node in self.model.walk():
+            if node.text == "B3":
+                self.assertTrue(all(self.tv.opened[iid] for iid in list(self.model.path(node.iid))[1:]))
+
+    def test_clear_restores_order_and_open_state(self):
+        opened = dict(self.tv.opened)
+        for query in ("a1", "e", "no such node"):
+            self.filter.apply(query)
+        self.assertEqual(widget_spec(self.tv), [])
+        self.filter.clear()
+        self.assertFalse(self.filter.active)
+        self.assertEqual(widget_spec(self.tv), self.spec)
+        self.assertEqual(self.tv.opened, opened)
+        # nothing was deleted or re-inserted
+        self.assertEqual(len(self.tv.texts), len(self.model))
+
+    def test_empty_query_shows_everything(self):
+        self.filter.apply("c")
+        self.assertEqual(self.filter.apply("   "), 0)
+        self.assertEqual(widget_spec(self.tv), self.spec)
+
+    def test_saving_while_filtered_keeps_hidden_nodes(self):
+        self.filter.apply("d2")
+        store = FilesManagementStore(self.tv, show_message_boxes=False, model=self.model)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "tree.xml")
+            store.save_tree(filename)
+            store.unwatch()
+            self.assertEqual(compact_spec(CompactTree.from_xml(filename)), self.spec)
+
+
+if __name__ == "__main__":
+    unittest.main()
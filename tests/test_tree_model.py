@@ -0,0 +1,144 @@
+import random
+import unittest
+from TreeModel import TreeModel
+from tests.support import aggregate_errors, compact, loaded, model_spec, random_spec, widget_spec
+
+def independent(model: TreeModel, rng: random.Random, k: int) -> list:
+    """Up to k random nodes, none inside another one's subtree."""
+    chosen = []
+    for iid in rng.sample(list(model.nodes)[1:], k):
+        if not any(i in chosen for i in model.path(iid)) and \
+                not any(iid in model.path(other) for other in chosen):
+            chosen.append(iid)
+    return chosen
+
+class AggregatesTest(unittest.TestCase):
+
+    def test_chain_and_leaves(self):
+        model = TreeModel()
+        model.add("a", "", "a")
+        model.add("b", "a", "b")
+        model.add("c", "b", "c")
+        model.add("d", "a", "d")
+        self.assertEqual(model.stats("a"), (3, 2, 2))
+        self.assertEqual(model.stats(""), (4, 3, 2))
+        model.remove("b")
+        self.assertEqual(model.stats("a"), (1, 1, 1))
+        model.remove("d")
+        self.assertEqual(model.stats("a"), (0, 0, 1))   # a leaf counts itself
+        self.assertEqual(model.stats(""), (1, 1, 1))
+        self.assertEqual(aggregate_errors(model), [])
+
+    def test_random_edits_keep_aggregates_and_mirror_the_treeview(self):
+        rng = random.Random(29)
+        tv, model = loaded(random_spec(rng, 200))
+        for step in range(1500):
+            iids = list(model.nodes)[1:]
+            action = rng.random()
+            if action < 0.35 or not iids:
+                parent = rng.choice([""] + iids)
+                index = rng.choice(["end", rng.randint(0, len(model.nodes[parent].children))])
+                iid = tv.insert(parent, index, text=f"new {step}")
+                model.add(iid, parent, f"new {step}", index)
+            elif action < 0.55:
+                iid = rng.choice(iids)
+                tv.delete(iid)
+                model.remove(iid)
+            elif action < 0.9:
+                iid = rng.choice(iids)
+                below = {node.iid for node in model.walk(iid, include_self=True)}
+                parent = rng.choice([""] + [i for i in iids if i not in below])
+                index = rng.randint(0, len(model.nodes[parent].children) + 1)
+                tv.move(iid, parent, index)
+                model.move(iid, parent, index)
+            else:
+                iid = rng.choice(iids)
+                tv.item(iid, text=f"renamed {step}")
+                model.rename(iid, f"renamed {step}")
+            if step % 50 == 0:
+                self.assertEqual(aggregate_errors(model), [])
+        self.assertEqual(aggregate_errors(model), [])
+        self.assertEqual(model_spec(model), widget_spec(tv))
+        self.assertEqual(len(model), len(tv.texts))
+
+    def test_move_in_front_of_itself_changes_nothing(self):
+        tv, model = loaded([["a", []], ["b", []], ["c", []]])
+        b = tv.get_children()[1]
+        edits = model.edits
+        model.move(b, "", 2)   # Tk: after the item at index 1, which is b itself
+        self.assertEqual([n.text for n in model.root.children], ["a", "b", "c"])
+        self.assertEqual(model.edits, edits)
+
+
+class BulkEditsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(40)
+        self.spec = random_spec(self.rng, 300)
+        self.tv, self.model = loaded(self.spec)
+
+    def test_remove_many_and_restore(self):
+        tree = compact(self.spec)
+        self.model.add("clone", self.model.root.children[-1].iid, "clone", clone=(tree, 0))
+        expected = model_spec(self.model)
+        for _ in range(20):
+            iids = independent(self.model, self.rng, 15)
+            removed = self.model.remove_many(iids)
+            self.assertTrue(all(iid not in self.model for iid in iids))
+            self.assertEqual(aggregate_errors(self.model), [])
+            self.model.restore(removed)
+            self.assertEqual(model_spec(self.model), expected)
+            self.assertEqual(aggregate_errors(self.model), [])
+        self.assertEqual(len(self.model), 301)
+        self.assertIn("clone", self.model.lazy)
+
+    def test_move_many_and_move_back(self):
+        expected = model_spec(self.model)
+        for _ in range(20):
+            iids = independent(self.model, self.rng, 10)
+            below = {n.iid for iid in iids for n in self.model.walk(iid, include_self=True)}
+            parent = self.rng.choice([""] + [iid for iid in list(self.model.nodes)[1:] if iid not in below])
+            siblings = [n.iid for n in self.model.nodes[parent].children if n.iid not in iids]
+            before = self.rng.choice(siblings + [None])
+            edits = self.model.edits
+            positions = self.model.move_many(iids, parent, before)
+            moved = [n.iid for n in self.model.nodes[parent].children]
+            start = moved.index(iids[0])
+            self.assertEqual(moved[start:start + len(iids)], iids)
+            self.assertEqual(moved[start + len(iids)] if before else None, before)
+            self.assertEqual(aggregate_errors(self.model), [])
+            self.model.move_back(positions)
+            self.assertEqual(self.model.edits, edits + 2)
+            self.assertEqual(model_spec(self.model), expected)
+            self.assertEqual(aggregate_errors(self.model), [])
+
+
+class QueriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tv, self.model = loaded([["a", [["a1", []], ["a2", [["a21", []]]]]], ["b", []]])
+        self.iid = {node.text: node.iid for node in self.model.walk()}
+
+    def test_walk_is_preorder(self):
+        self.assertEqual([n.text for n in self.model.walk()], ["a", "a1", "a2", "a21", "b"])
+        self.assertEqual([n.text for n in self.model.walk(self.iid["a2"], include_self=True)], ["a2", "a21"])
+
+    def test_path_index_and_membership(self):
+        self.assertEqual(list(self.model.path(self.iid["a21"])), [self.iid["a21"], self.iid["a2"], self.iid["a"]])
+        self.assertEqual(self.model.index(self.iid["a2"]), 1)
+        self.assertEqual(len(self.model), 5)
+        self.assertIn(self.iid["b"], self.model)
+        self.model.remove(self.iid["a"])
+        self.assertNotIn(self.iid["a21"], self.model)
+        self.assertEqual(len(self.model), 1)
+
+    def test_clear(self):
+        edits = self.model.edits
+        self.model.clear()
+        self.assertEqual(len(self.model), 0)
+        self.assertEqual(self.model.stats(""), (0, 0, 0))
+        self.assertGreater(self.model.edits, edits)
+
+
+if __name__ == "__main__":
+    unittest.main()